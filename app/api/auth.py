@@ -5,8 +5,8 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
 from app.core.schema import ErrorResponse, RegisterEmailRequest
-from app.models.user import get_user, update_user_email
-from app.models.app_session import parse_bearer, validate
+from app.models.user import get_user_async, update_user_email_async
+from app.models.app_session import parse_bearer, validate_async
 
 router = APIRouter()
 
@@ -23,7 +23,7 @@ fake_users_db = {
     }
 }
 
-def require_session(
+async def require_session(
     authorization: str = Header(..., alias="Authorization"),
     device_id: str = Header(..., alias="X-Device-Id"),
     platform: str = Header(..., alias="X-Platform"),
@@ -31,7 +31,7 @@ def require_session(
     os_version: str = Header(..., alias="X-OS-Version"),
 ):
     token = parse_bearer(authorization)
-    rec = validate(token, device_id=device_id)
+    rec = await validate_async(token, device_id=device_id)
     return rec
 
 # verify password
@@ -87,9 +87,9 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 
 @router.post("/register-email", status_code=204, responses={401: {"model": ErrorResponse}})
 async def register_email(payload: RegisterEmailRequest, session=Depends(require_session)) -> Response:
-    user = get_user(session.app_user_id)
+    user = await get_user_async(session.app_user_id)
     if not user:
         raise HTTPException(status_code=400, detail="user_not_found")
 
-    update_user_email(session.app_user_id, payload.email)
+    await update_user_email_async(session.app_user_id, payload.email)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
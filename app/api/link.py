@@ -3,22 +3,26 @@ from fastapi import APIRouter, HTTPException, Depends, Header, Request, Response
 from pydantic import BaseModel
 from app.core.config import settings
 from app.core.database import redis_client
-from app.models.task import create_task, get_task_status
+from app.models.task import create_task_async, get_task_status_async
 from app.core.schema import LinkStartResponse, ErrorResponse, RedirectResponse, CodeResponse, FinalizeResponse, FinalizeRequest, VerifyRegionResponse, WrappedRequest, WaitlistRequest,WrappedStatusResponse, WrappedEnqueueResponse
 from app.core.archive_client import ArchiveClient
-from app.models.user import get_user
+from app.core.status_cache import fill_status, get_status_version, get_user_task_id, initial_status, set_user_task_id
+from app.core.etag import conditional, content_etag, etag_matches, not_modified, version_etag, with_etag
+from app.core.wrapped_cache import get_wrapped, invalidate_wrapped, load_wrapped, materialize_wrapped, wrapped_response
+from app.models.task_payload import get_task_payload_async
+from app.models.user import get_user_async
 from uuid import uuid4
 from app.core.verify import verify_user_region
-from app.models.task import update_task_status_user_id, get_task_by_user_id
-from app.models.user import update_user,update_user_waitlist
-from app.models.app_session import create_or_rotate,parse_bearer, validate
+from app.models.task import update_task_status_user_id_async, get_task_by_user_id_async
+from app.models.user import update_user_async, update_user_waitlist_async
+from app.models.app_session import create_or_rotate_async, parse_bearer, revoke_async, validate_async
 import datetime
 
 
 router = APIRouter()
 archive_client = ArchiveClient()
 
-def require_session(
+async def require_session(
     authorization: str = Header(..., alias="Authorization"),
     device_id: str = Header(..., alias="X-Device-Id"),
     platform: str = Header(..., alias="X-Platform"),
@@ -26,7 +30,7 @@ def require_session(
     os_version: str = Header(..., alias="X-OS-Version"),
 ):
     token = parse_bearer(authorization)
-    rec = validate(token, device_id=device_id)
+    rec = await validate_async(token, device_id=device_id)
     return rec
 
 def require_device(
@@ -45,7 +49,7 @@ def require_device(
 async def link_tiktok_start(device=Depends(require_device)) -> LinkStartResponse:
     resp, status_code= await archive_client.start_xordi_auth(anchor_token=None)
     device_id = device.get('device_id')
-    task_id = create_task(resp.get("archive_job_id"), device_id)
+    task_id = await create_task_async(resp.get("archive_job_id"), device_id)
     # add task to verify queue
     task_data = {
         "task_id": task_id,
@@ -54,18 +58,7 @@ async def link_tiktok_start(device=Depends(require_device)) -> LinkStartResponse
     redis_client.lpush(settings.TASK_QUEUE_VERIFY, json.dumps(task_data))
 
     # initialize task status in Redis
-    redis_key = settings.TASK_STATUS_KEY.format(task_id=task_id)
-    redis_client.hset(redis_key, mapping={
-        "task_id": task_id,
-        "status": "pending",
-        "region_retry_count": 0,
-        "collect_total": 0,
-        "collect_completed": 0,
-        "collect_page": 0,
-        "collect_progress": "0%",
-        "collect_status": "not_started",
-        "analysis_status": "not_executed"
-    })
+    fill_status(task_id, initial_status(task_id, device_id=device_id))
 
     return LinkStartResponse(
         archive_job_id=resp.get("archive_job_id", ""),
@@ -78,26 +71,29 @@ async def link_tiktok_start(device=Depends(require_device)) -> LinkStartResponse
     response_model=RedirectResponse,
     responses={401: {"model": ErrorResponse}},
 )
-async def link_tiktok_redirect(job_id: str, device=Depends(require_device)) -> RedirectResponse:
-    job = get_task_status(job_id)
+async def link_tiktok_redirect(job_id: str, request: Request, device=Depends(require_device)) -> RedirectResponse:
+    job = await get_task_status_async(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="job_not_found")
     if job.get('device_id') and job.get('device_id') != device.get("device_id"):
         raise HTTPException(status_code=401, detail="invalid_device")
     resp, status_code = await archive_client.get_redirect(job_id)
+    # the archive owns this state, so the ETag is a hash of the body; it still saves the transfer
     if status_code == 200:
-        return RedirectResponse(
+        result = RedirectResponse(
             status="ready",
             redirect_url=resp.get("redirect_url"),
             queue_position=resp.get("queue_position"),
             qr_data=resp.get("qr_data"),
         )
+        return conditional(request, result, content_etag(result))
     if status_code == 202:
-        return RedirectResponse(
+        result = RedirectResponse(
             status="pending",
             queue_position=resp.get("queue_position"),
             qr_data=resp.get("qr_data"),
         )
+        return conditional(request, result, content_etag(result))
     if resp.status_code == 410:
         return RedirectResponse(status="expired")
     raise HTTPException(status_code=resp.status_code, detail=resp.text)
@@ -108,9 +104,9 @@ async def link_tiktok_redirect(job_id: str, device=Depends(require_device)) -> R
     response_model=CodeResponse,
     responses={401: {"model": ErrorResponse}},
 )
-async def link_tiktok_code(job_id: str, device=Depends(require_device)) -> CodeResponse:
+async def link_tiktok_code(job_id: str, request: Request, device=Depends(require_device)) -> CodeResponse:
     device_id = device.get('device_id')
-    job = get_task_status(job_id)
+    job = await get_task_status_async(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="job_not_found")
     if job.get('device_id') and job.get('device_id') != device_id:
@@ -123,10 +119,11 @@ async def link_tiktok_code(job_id: str, device=Depends(require_device)) -> CodeR
             expires_at=resp.get("expires_at"),
         )
     if status_code == 202:
-        return CodeResponse(
+        result = CodeResponse(
             status="pending",
             queue_position=resp.get("queue_position"),
         )
+        return conditional(request, result, content_etag(result))
     if status_code == 410:
         return CodeResponse(status="expired")
     raise HTTPException(status_code=status_code, detail=resp)
@@ -140,7 +137,7 @@ async def link_tiktok_code(job_id: str, device=Depends(require_device)) -> CodeR
 async def link_tiktok_finalize(
     payload: FinalizeRequest, device=Depends(require_device)
 ) -> FinalizeResponse:
-    job = get_task_status(payload.archive_job_id)
+    job = await get_task_status_async(payload.archive_job_id)
     device_id = job.get('device_id')
     app_user_id = job.get('app_user_id')
     if not job:
@@ -149,7 +146,7 @@ async def link_tiktok_finalize(
         raise HTTPException(status_code=401, detail="invalid_device")
     anchor_token = None
     if app_user_id:
-        existing_user = get_user(app_user_id)
+        existing_user = await get_user_async(app_user_id)
         anchor_token = existing_user.get('latest_anchor_token') if existing_user else None
     data, status_code = await archive_client.finalize_xordi(
         archive_job_id=payload.archive_job_id,
@@ -159,9 +156,9 @@ async def link_tiktok_finalize(
     print('data',data)
     # Bind to canonical app_user_id derived from archive_user_id
     final_app_user_id = data.get("archive_user_id") or (job.get('app_user_id') or str(uuid4()))
-    canonical_user = get_user(final_app_user_id)
+    canonical_user = await get_user_async(final_app_user_id)
     if not canonical_user:
-        canonical_user = get_user(job.get("app_user_id"))
+        canonical_user = await get_user_async(job.get("app_user_id"))
     previous_sec_user_id = canonical_user.get('latest_sec_user_id')
 
     # archive_user_id
@@ -178,14 +175,14 @@ async def link_tiktok_finalize(
         canonical_user['latest_anchor_token'] = new_anchor or anchor_token
     if previous_sec_user_id != canonical_user['latest_sec_user_id']:
         canonical_user['is_watch_history_available'] = "unknown"
-    update_user(canonical_user.get('app_user_id'), data.get("archive_user_id"), data.get("provider_unique_id"), platform_username, payload.time_zone, canonical_user['latest_anchor_token'], canonical_user['is_watch_history_available'])
+    await update_user_async(canonical_user.get('app_user_id'), data.get("archive_user_id"), data.get("provider_unique_id"), platform_username, payload.time_zone, canonical_user['latest_anchor_token'], canonical_user['is_watch_history_available'])
 
 
     # Rebind auth job to canonical user if it exists
     if job:
-        update_task_status_user_id(job.get('task_id'), "finalized", canonical_user.get('app_user_id'))
+        await update_task_status_user_id_async(job.get('task_id'), "finalized", canonical_user.get('app_user_id'))
 
-    token, expires_at = create_or_rotate(
+    token, expires_at = await create_or_rotate_async(
         app_user_id=canonical_user.get('app_user_id'),
         device_id=device.get("device_id"),
         platform=device.get("platform"),
@@ -211,12 +208,18 @@ async def link_tiktok_finalize(
     responses={401: {"model": ErrorResponse}},
 )
 async def link_tiktok_verify_region(session=Depends(require_session)) -> VerifyRegionResponse:
-    user = get_user(session.get("app_user_id"))
+    user = await get_user_async(session.get("app_user_id"))
     if not user:
         raise HTTPException(status_code=400, detail="user_not_found")
     status_value, attempts, last_error = await verify_user_region(user, auto_enqueue=True)
     return VerifyRegionResponse(is_watch_history_available=status_value, attempts=attempts, last_error=last_error)
 
+# revoke the calling session; its cached validation is purged, so the token stops working at once
+@router.post("/logout", status_code=204, responses={401: {"model": ErrorResponse}})
+async def logout(session=Depends(require_session)) -> Response:
+    await revoke_async(session["session_id"])
+    return Response(status_code=204)
+
 # test
 @router.get("/test")
 async def test_api(request: Request):
@@ -228,12 +231,12 @@ async def test_api(request: Request):
 
 @router.post("/waitlist", status_code=204)
 async def join_waitlist(payload: WaitlistRequest) -> Response:
-    user = get_user(payload.app_user_id)
+    user = await get_user_async(payload.app_user_id)
     if not user:
         raise HTTPException(status_code=404, detail="not_found")
     new_waitlist_opt_in = not bool(user.get('waitlist_opt_in'))
     new_waitlist_opt_in_at = datetime.utcnow() if user.get('waitlist_opt_in') else None
-    update_user_waitlist(payload.app_user_id, waitlist_opt_in=new_waitlist_opt_in,waitlist_opt_in_at=new_waitlist_opt_in_at)
+    await update_user_waitlist_async(payload.app_user_id, waitlist_opt_in=new_waitlist_opt_in,waitlist_opt_in_at=new_waitlist_opt_in_at)
     return Response(status_code=204)
 
 @router.get(
@@ -241,22 +244,56 @@ async def join_waitlist(payload: WaitlistRequest) -> Response:
     response_model=WrappedStatusResponse,
 )
 async def wrapped_status(
-    app_user_id: str
+    app_user_id: str, request: Request
 ) -> WrappedStatusResponse:
-    task = get_task_by_user_id(app_user_id)
+    # a finished run is served as stored at completion, without MySQL or serialization
+    cached = get_wrapped(app_user_id)
+    if cached:
+        body, etag = cached
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return wrapped_response(request, body, etag)
+
+    # the ETag follows the user's task version, so an unchanged run is a 304 without MySQL
+    task_id = get_user_task_id(app_user_id) if request.headers.get("if-none-match") else None
+    if task_id:
+        version = get_status_version(task_id)
+        etag = version_etag("wrapped", task_id, version) if version else None
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+    task = await get_task_by_user_id_async(app_user_id)
  
     if not task:
         raise HTTPException(status_code=404, detail="not_found")
-    if task.get('status') != "ready" or not task.payload:
-        return WrappedStatusResponse(
-            status="pending",
-            wrapped_run_id=task.get('task_id'),
-            wrapped=None,
-            queue_position=None,
-            queue_eta_seconds=None,
-            queue_status="pending",
-        )
-    return WrappedStatusResponse(status="ready", wrapped_run_id=task.get('task_id'), wrapped=task)
+    set_user_task_id(app_user_id, task.get('task_id'))
+    if task.get('status') == "completed" and task.get('analysis_result'):
+        # completed before the document was stored, or it expired: materialize it now
+        cached = await _materialize_wrapped(task, app_user_id)
+        if cached:
+            return wrapped_response(request, *cached)
+    version = get_status_version(task.get('task_id')) or fill_status(task.get('task_id'), task)
+    etag = version_etag("wrapped", task.get('task_id'), version) if version else None
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return with_etag(WrappedStatusResponse(
+        status="pending",
+        wrapped_run_id=task.get('task_id'),
+        wrapped=None,
+        queue_position=None,
+        queue_eta_seconds=None,
+        queue_status="pending",
+    ), etag)
+
+
+async def _materialize_wrapped(task: dict, app_user_id: str):
+    task_payload = await get_task_payload_async(task.get('task_id'))
+    if not task_payload:
+        return None
+    analysis_result = task.get('analysis_result')
+    if isinstance(analysis_result, str):
+        analysis_result = json.loads(analysis_result)
+    return materialize_wrapped(task.get('task_id'), app_user_id, task_payload['payload'], analysis_result)
 
 
 @router.post(
@@ -269,7 +306,7 @@ async def wrapped_request(
 ) -> WrappedEnqueueResponse:
     
     app_user_id = session.get("app_user_id")
-    user = get_user(app_user_id)
+    user = await get_user_async(app_user_id)
     if not user or not user.get('latest_sec_user_id'):
         raise HTTPException(status_code=400, detail="sec_user_id_required")
     user['time_zone'] = payload.time_zone
@@ -286,17 +323,22 @@ async def wrapped_request(
         raise HTTPException(status_code=400, detail="watch_history_unknown")
 
 
-    task = get_task_by_user_id(app_user_id)
+    task = await get_task_by_user_id_async(app_user_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="not_found")
+    document = load_wrapped(app_user_id) if task.get('status') == "completed" else None
+    # a new run starts: the stored document is dropped before the job can complete and store its own
+    invalidate_wrapped(app_user_id)
     redis_client.lpush(settings.TASK_QUEUE_RETRY, json.dumps({
         "task_id": task.get('task_id'), "retry_type": "collect"
     }))
 
-    if task.get('status') == "ready":
+    if document:
         return WrappedEnqueueResponse(
             status="ready",
-            wrapped_run_id=task.task_id,
-            existing_run_id=task.task_id,
-            wrapped=task,
+            wrapped_run_id=task.get('task_id'),
+            existing_run_id=task.get('task_id'),
+            wrapped=document.get('wrapped'),
             queue_position=0,
             queue_eta_seconds=0,
             queue_status="ready",
@@ -1,11 +1,26 @@
 import json
-from fastapi import APIRouter, HTTPException, Depends, Header
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from app.core.config import settings
 from app.core.database import redis_client
-from app.models.task import create_task, get_task_status, get_task_user
-from app.models.api_log import get_task_api_logs
-from app.core.utils import update_task_status, get_retry_strategy
+from app.models.task import (
+    create_task_async, create_tasks_async, delete_pending_tasks_async, get_task_status_async, get_tasks_status_async,
+    get_task_user_async, get_task_users_async,
+)
+from app.models.api_log import get_task_api_logs_async, API_LOG_FIELDS, API_LOG_BODY_FIELDS, API_LOG_DEFAULT_FIELDS
+from app.core.utils import update_task_status, get_retry_strategies_async
+from app.core.state_writer import state_writer
+from app.core.status_cache import (
+    fill_status, get_status, get_status_version, get_statuses, initial_status, normalize_status,
+)
+from app.core.etag import etag_matches, not_modified, version_etag, with_etag
+from app.core.responses import dumps, json_response
+from app.core.wrapped_cache import invalidate_wrapped
+from app.core.task_events import task_event_hub
+from app.core.analysis_checkpoint import clear_checkpoint
 from app.api.auth import get_current_user
 from app.core.schema import LinkStartResponse, ErrorResponse, RedirectResponse
 from app.core.archive_client import ArchiveClient
@@ -23,6 +38,19 @@ class TaskInterveneRequest(BaseModel):
     task_id: str
     action: str  # pause/cancel/retry_verify/retry_collect/retry_analyze/rerun
 
+class TaskCreateBatchRequest(BaseModel):
+    tasks: List[TaskCreateRequest]
+
+class TaskInterveneBatchRequest(BaseModel):
+    items: List[TaskInterveneRequest]
+
+class TaskStatusBatchRequest(BaseModel):
+    task_ids: List[str]
+
+VALID_ACTIONS = ["pause", "cancel", "retry_verify", "retry_collect", "retry_analyze", "rerun"]
+# actions checked against a retry strategy, by api_type
+ACTION_RETRY_STRATEGIES = {"retry_verify": "region_verify"}
+
 def require_device(
     device_id: str = Header(..., alias="X-Device-Id"),
     platform: str = Header(..., alias="X-Platform"),
@@ -37,11 +65,17 @@ def require_device(
     }
 
 
+def _check_batch_size(items: list) -> None:
+    if not items:
+        raise HTTPException(status_code=400, detail="batch is empty")
+    if len(items) > settings.TASK_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"batch exceeds {settings.TASK_BATCH_MAX_ITEMS} items")
+
 # create task
 @router.post("/create")
 async def create_task_api(request: TaskCreateRequest):
     try:
-        task_id = create_task(request.user_id, request.ip_address)
+        task_id = await create_task_async(request.user_id, request.ip_address)
         print(f"task created: {task_id}")
         # add task to verify queue
         task_data = {
@@ -52,42 +86,245 @@ async def create_task_api(request: TaskCreateRequest):
         redis_client.lpush(settings.TASK_QUEUE_VERIFY, json.dumps(task_data))
 
         # initialize task status in Redis
-        redis_key = settings.TASK_STATUS_KEY.format(task_id=task_id)
-        redis_client.hset(redis_key, mapping={
-            "task_id": task_id,
-            "user_id": request.user_id,
-            "status": "pending",
-            "region_retry_count": 0,
-            "collect_total": 0,
-            "collect_completed": 0,
-            "collect_page": 0,
-            "collect_progress": "0%",
-            "collect_status": "not_started",
-            "analysis_status": "not_executed"
-        })
+        fill_status(task_id, initial_status(task_id, user_id=request.user_id))
         return {"code": 200, "msg": "task created successfully", "data": {"task_id": task_id}}
     except Exception as e:
         print(f"failed to create task: {e}")
         raise HTTPException(status_code=500, detail=f"failed to create task: {e}")
 
+# create many tasks: one multi-row INSERT and one Redis pipeline, results follow the request order
+@router.post("/create-batch")
+async def create_task_batch_api(request: TaskCreateBatchRequest):
+    _check_batch_size(request.tasks)
+    try:
+        # task ids repeated in the batch are created once, by their first item
+        first = {}
+        for item in request.tasks:
+            first.setdefault(item.user_id, item)
+        created = set(await create_tasks_async(
+            (item.user_id, item.ip_address) for item in first.values()
+        ))
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for task_id in created:
+                item = first[task_id]
+                pipe.lpush(settings.TASK_QUEUE_VERIFY, json.dumps({
+                    "task_id": task_id,
+                    "user_id": item.user_id,
+                    "ip_address": item.ip_address
+                }))
+                fill_status(task_id, initial_status(task_id, user_id=item.user_id), pipe=pipe)
+            pipe.execute()
+        except Exception:
+            # nothing was queued: drop the rows so a retry creates and queues them again
+            await delete_pending_tasks_async(created)
+            raise
+    except Exception as e:
+        print(f"failed to create tasks: {e}")
+        raise HTTPException(status_code=500, detail=f"failed to create tasks: {e}")
+
+    results = []
+    for item in request.tasks:
+        task_id = item.user_id
+        if task_id in created and first[task_id] is item:
+            results.append({"task_id": task_id, "code": 200, "msg": "task created successfully"})
+        elif task_id in created:
+            results.append({"task_id": task_id, "code": 409, "msg": "duplicate task in batch"})
+        else:
+            results.append({"task_id": task_id, "code": 409, "msg": "task already exists"})
+    print(f"tasks created: {len(created)}/{len(request.tasks)}")
+    return {"code": 200, "msg": f"{len(created)} tasks created", "data": results}
+
+# status from Redis, else from MySQL; version is 0 when the cache could not be filled
+async def _load_task_status(task_id: str):
+    # Check Redis first
+    task_status, version = get_status(task_id)
+    if task_status:
+        return task_status, version
+
+    # Fallback to MySQL
+    task = await get_task_status_async(task_id)
+    if not task:
+        return None, 0
+
+    # Sync to Redis, unless a newer write landed while MySQL was read
+    version = fill_status(task_id, task, version)
+    return normalize_status(task), version
+
 # get task status
 @router.get("/status/{task_id}")
-async def get_task_status_api(task_id: str):
+async def get_task_status_api(task_id: str, request: Request):
     try:
-        # Check Redis first
-        redis_key = settings.TASK_STATUS_KEY.format(task_id=task_id)
-        task_status = redis_client.hgetall(redis_key)
-        if task_status:
-            return {"code": 200, "msg": "success", "data": task_status}
-        
-        # Fallback to MySQL
-        task = get_task_status(task_id)
-        if not task:
+        # an unchanged version is answered from one HMGET, before reading or serializing the status
+        if request.headers.get("if-none-match"):
+            version = get_status_version(task_id)
+            etag = version_etag("task", task_id, version) if version else None
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+        task_status, version = await _load_task_status(task_id)
+        if not task_status:
             raise HTTPException(status_code=404, detail="task not found")
-        
-        # Sync to Redis
-        redis_client.hset(redis_key, mapping=task)
-        return {"code": 200, "msg": "success", "data": task}
+        etag = version_etag("task", task_id, version) if version else None
+        return with_etag({"code": 200, "msg": "success", "data": task_status}, etag)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"failed to get task status: {e}")
+
+def _sse_event(version: int, status: dict) -> str:
+    return f"id: {version}\nevent: status\ndata: {dumps(status)}\n\n"
+
+# push task status as server-sent events; Last-Event-ID (or since=) resumes after that version
+@router.get("/stream/{task_id}")
+async def stream_task_status_api(
+    task_id: str,
+    since: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    task_status, _ = await _load_task_status(task_id)
+    if not task_status:
+        raise HTTPException(status_code=404, detail="task not found")
+
+    async def events():
+        yield f"retry: {int(settings.TASK_STREAM_HEARTBEAT * 1000)}\n\n"
+        async for event in task_event_hub.stream(task_id, _load_task_status, since):
+            yield ": ping\n\n" if event is None else _sse_event(*event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# WebSocket equivalent of /stream: {"event": "status", "version", "data"} and {"event": "ping"} frames
+@router.websocket("/ws/{task_id}")
+async def task_status_ws(websocket: WebSocket, task_id: str, since: Optional[int] = None):
+    await websocket.accept()
+    try:
+        task_status, _ = await _load_task_status(task_id)
+        if not task_status:
+            await websocket.send_json({"event": "error", "detail": "task not found"})
+            await websocket.close(code=4404)
+            return
+        async for event in task_event_hub.stream(task_id, _load_task_status, since):
+            if event is None:
+                await websocket.send_json({"event": "ping"})
+            else:
+                version, status = event
+                await websocket.send_text(dumps({"event": "status", "version": version, "data": status}))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+# check an intervention against the task and return what applying it takes;
+# raises HTTPException when the action is not allowed
+def _plan_intervention(task: dict, action: str, strategies: dict, task_user: dict = None) -> dict:
+    task_id = task["task_id"]
+    # archived rows are read-only: status updates and worker jobs only look at tasks
+    if task.get("archived_at"):
+        raise HTTPException(status_code=409, detail="task is archived")
+    plan = {
+        "task_id": task_id, "app_user_id": task.get("app_user_id"),
+        "queue": None, "job": None, "clear_checkpoint": False,
+    }
+    if action == "pause":
+        plan.update(fields={"status": "paused"}, msg="task paused")
+    elif action == "cancel":
+        plan.update(fields={"status": "cancelled", "error_msg": "user manually cancelled"}, msg="task cancelled")
+    elif action == "retry_verify":
+        region_strategy = strategies[ACTION_RETRY_STRATEGIES[action]]
+        if task["region_verify_status"] not in ["failed", "timeout"]:
+            raise HTTPException(status_code=400, detail="only region verification failed/timeout can be retried")
+        if task["region_retry_count"] >= region_strategy["max_retry_count"]:
+            raise HTTPException(status_code=400, detail=f"已达最大重试次数({region_strategy['max_retry_count']}次)")
+        plan.update(
+            queue=settings.TASK_QUEUE_RETRY,
+            job={"task_id": task_id, "retry_type": "verify"},
+            fields={"status": "pending", "region_retry_count": task["region_retry_count"] + 1},
+            msg="region verification task added to retry queue",
+        )
+    elif action == "retry_collect":
+        if task["collect_status"] not in ["failed"]:
+            raise HTTPException(status_code=400, detail="only collection failed can be retried")
+        if task["region_verify_status"] != "success":
+            raise HTTPException(status_code=400, detail="region verification not successful, cannot retry collection")
+        plan.update(
+            queue=settings.TASK_QUEUE_RETRY,
+            job={"task_id": task_id, "retry_type": "collect"},
+            fields={"status": "pending"},
+            msg="collection task added to retry queue",
+        )
+    elif action == "retry_analyze":
+        if task["analysis_status"] not in ["failed", "timeout"]:
+            raise HTTPException(status_code=400, detail="only analysis failed/timeout can be retried")
+        if task["collect_status"] != "completed":
+            raise HTTPException(status_code=400, detail="collection not completed, cannot retry analysis")
+        plan.update(
+            queue=settings.TASK_QUEUE_RETRY,
+            job={"task_id": task_id, "retry_type": "analyze"},
+            fields={"status": "pending"},
+            msg="analysis task added to retry queue",
+        )
+    elif action == "rerun":
+        if not task_user:
+            raise HTTPException(status_code=404, detail="task user not found")
+        plan.update(
+            queue=settings.TASK_QUEUE_VERIFY,
+            job={
+                "task_id": task_id,
+                "user_id": task_user["user_id"],
+                "ip_address": task_user["ip_address"]
+            },
+            fields={"status": "pending", "region_retry_count": 0, "error_msg": ""},
+            clear_checkpoint=True,
+            msg="task rerunned from verification queue",
+        )
+    return plan
+
+# queue jobs in one pipeline, then hand the status updates to the state writer;
+# blocking (terminal statuses and flush write MySQL), so handlers run it in the threadpool
+def _apply_interventions(plans: list, flush: bool = False) -> None:
+    jobs = [plan for plan in plans if plan["queue"]]
+    if jobs:
+        # a rerun replaces the task's wrapped document; dropped before the job can store the new one
+        for plan in jobs:
+            invalidate_wrapped(plan["app_user_id"], plan["task_id"])
+        pipe = redis_client.pipeline(transaction=False)
+        for plan in jobs:
+            pipe.lpush(plan["queue"], json.dumps(plan["job"]))
+        pipe.execute()
+    for plan in plans:
+        if plan["clear_checkpoint"]:
+            clear_checkpoint(plan["task_id"])
+        update_task_status(plan["task_id"], **plan["fields"])
+    if flush:
+        state_writer.flush()
+
+# get many task statuses: one HGETALL pipeline, one IN query for the misses, one back-fill pipeline
+@router.post("/status:batch")
+async def get_task_status_batch_api(request: TaskStatusBatchRequest):
+    task_ids = list(dict.fromkeys(request.task_ids))
+    _check_batch_size(task_ids)
+    try:
+        cached = get_statuses(task_ids)
+        statuses = {task_id: status for task_id, (status, _) in cached.items() if status}
+
+        misses = [task_id for task_id in task_ids if task_id not in statuses]
+        tasks = await get_tasks_status_async(misses, readonly=True) if misses else {}
+        if tasks:
+            pipe = redis_client.pipeline(transaction=False)
+            for task_id, task in tasks.items():
+                fill_status(task_id, task, cached[task_id][1], pipe=pipe)
+            pipe.execute()
+        statuses.update((task_id, normalize_status(task)) for task_id, task in tasks.items())
+
+        data = {task_id: statuses[task_id] for task_id in task_ids if task_id in statuses}
+        missing = [task_id for task_id in task_ids if task_id not in statuses]
+        return json_response({"code": 200, "msg": "success", "data": data, "missing": missing})
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -99,78 +336,111 @@ async def intervene_task_api(request: TaskInterveneRequest):
     try:
         action = request.action.lower()
         task_id = request.task_id
-        valid_actions = ["pause", "cancel", "retry_verify", "retry_collect", "retry_analyze", "rerun"]
-        
-        if action not in valid_actions:
-            raise HTTPException(status_code=400, detail=f"action not supported {valid_actions}")
+
+        if action not in VALID_ACTIONS:
+            raise HTTPException(status_code=400, detail=f"action not supported {VALID_ACTIONS}")
         
-        task = get_task_status(task_id)
+        task = await get_task_status_async(task_id)
         if not task:
             raise HTTPException(status_code=404, detail="task not found")
+
+        strategy_types = [ACTION_RETRY_STRATEGIES[action]] if action in ACTION_RETRY_STRATEGIES else []
+        strategies = await get_retry_strategies_async(strategy_types)
+        task_user = await get_task_user_async(task_id) if action == "rerun" else None
+        plan = _plan_intervention(task, action, strategies, task_user)
+        # flushed, so a worker reading tasks.status next sees the pause/cancel
+        await run_in_threadpool(_apply_interventions, [plan], True)
         
-        if action == "pause":
-            update_task_status(task_id, "paused")
-            msg = "task paused"
-        elif action == "cancel":
-            update_task_status(task_id, "cancelled", error_msg="user manually cancelled")
-            msg = "task cancelled"
-        elif action == "retry_verify":
-            region_strategy = get_retry_strategy("region_verify")
-            if task["region_verify_status"] not in ["failed", "timeout"]:
-                raise HTTPException(status_code=400, detail="only region verification failed/timeout can be retried")
-            if task["region_retry_count"] >= region_strategy["max_retry_count"]:
-                raise HTTPException(status_code=400, detail=f"已达最大重试次数({region_strategy['max_retry_count']}次)")
-            
-            redis_client.lpush(settings.TASK_QUEUE_RETRY, json.dumps({
-                "task_id": task_id, "retry_type": "verify"
-            }))
-            update_task_status(task_id, "pending", region_retry_count=task["region_retry_count"] + 1)
-            msg = "region verification task added to retry queue"
-        elif action == "retry_collect":
-            if task["collect_status"] not in ["failed"]:
-                raise HTTPException(status_code=400, detail="only collection failed can be retried")
-            if task["region_verify_status"] != "success":
-                raise HTTPException(status_code=400, detail="region verification not successful, cannot retry collection")
-            
-            redis_client.lpush(settings.TASK_QUEUE_RETRY, json.dumps({
-                "task_id": task_id, "retry_type": "collect"
-            }))
-            update_task_status(task_id, "pending")
-            msg = "collection task added to retry queue"
-        elif action == "retry_analyze":
-            if task["analysis_status"] not in ["failed", "timeout"]:
-                raise HTTPException(status_code=400, detail="only analysis failed/timeout can be retried")
-            if task["collect_status"] != "completed":
-                raise HTTPException(status_code=400, detail="collection not completed, cannot retry analysis")
-            
-            redis_client.lpush(settings.TASK_QUEUE_RETRY, json.dumps({
-                "task_id": task_id, "retry_type": "analyze"
-            }))
-            update_task_status(task_id, "pending")
-            msg = "analysis task added to retry queue"
-        elif action == "rerun":
-            task_user = get_task_user(task_id)
-            task_data = {
-                "task_id": task_id,
-                "user_id": task_user["user_id"],
-                "ip_address": task_user["ip_address"]
-            }
-            redis_client.lpush(settings.TASK_QUEUE_VERIFY, json.dumps(task_data))
-            update_task_status(task_id, "pending", region_retry_count=0, error_msg="")
-            msg = "task rerunned from verification queue"
-        
-        return {"code": 200, "msg": msg, "data": {"task_id": task_id}}
+        return {"code": 200, "msg": plan["msg"], "data": {"task_id": task_id}}
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"intervene failed: {e}")
 
-# get task API logs
+# intervene on many tasks: tasks, users and retry strategies are each loaded with one query,
+# jobs are queued in one pipeline and status updates land as one state writer flush
+@router.post("/intervene-batch")
+async def intervene_task_batch_api(request: TaskInterveneBatchRequest):
+    _check_batch_size(request.items)
+    try:
+        actions = [item.action.lower() for item in request.items]
+        task_ids = [item.task_id for item in request.items]
+        tasks = await get_tasks_status_async(task_ids)
+        strategies = await get_retry_strategies_async(
+            ACTION_RETRY_STRATEGIES[a] for a in actions if a in ACTION_RETRY_STRATEGIES
+        )
+        rerun_ids = [t for t, a in zip(task_ids, actions) if a == "rerun" and t in tasks]
+        task_users = await get_task_users_async(rerun_ids)
+
+        results, plans, planned = [], [], set()
+        for task_id, action in zip(task_ids, actions):
+            try:
+                if action not in VALID_ACTIONS:
+                    raise HTTPException(status_code=400, detail=f"action not supported {VALID_ACTIONS}")
+                if task_id not in tasks:
+                    raise HTTPException(status_code=404, detail="task not found")
+                if task_id in planned:
+                    raise HTTPException(status_code=409, detail="task already in batch")
+                plan = _plan_intervention(tasks[task_id], action, strategies, task_users.get(task_id))
+            except HTTPException as e:
+                results.append({"task_id": task_id, "code": e.status_code, "msg": e.detail})
+                continue
+            planned.add(task_id)
+            plans.append(plan)
+            results.append({"task_id": task_id, "code": 200, "msg": plan["msg"]})
+
+        await run_in_threadpool(_apply_interventions, plans, True)
+        return {"code": 200, "msg": f"{len(plans)}/{len(results)} tasks intervened", "data": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"intervene failed: {e}")
+
+def _log_fields(fields: Optional[str], include_bodies: bool) -> list:
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in selected if f not in API_LOG_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"unknown log fields {unknown}, allowed {list(API_LOG_FIELDS)}")
+    else:
+        selected = list(API_LOG_DEFAULT_FIELDS)
+    if include_bodies:
+        selected += [f for f in API_LOG_BODY_FIELDS if f not in selected]
+    return selected
+
+# every page of the task's logs, one keyset query per API_LOG_EXPORT_BATCH rows
+async def _export_logs_ndjson(task_id, before_id, api_type, status, fields):
+    while True:
+        logs = await get_task_api_logs_async(
+            task_id, before_id, settings.API_LOG_EXPORT_BATCH, api_type, status, fields
+        )
+        if not logs:
+            return
+        yield "".join(dumps(log) + "\n" for log in logs)
+        if len(logs) < settings.API_LOG_EXPORT_BATCH:
+            return
+        before_id = logs[-1]["log_id"]
+
+# get task API logs, newest first; pass next_before_id back as before_id for the next page
 @router.get("/logs/{task_id}")
-async def get_task_logs_api(task_id: str):
+async def get_task_logs_api(
+    task_id: str,
+    before_id: Optional[int] = None,
+    limit: int = Query(settings.API_LOG_PAGE_SIZE, ge=1, le=settings.API_LOG_PAGE_MAX),
+    api_type: Optional[str] = None,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    include_bodies: bool = False,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    selected = _log_fields(fields, include_bodies)
+    if format == "ndjson":
+        return StreamingResponse(
+            _export_logs_ndjson(task_id, before_id, api_type, status, selected),
+            media_type="application/x-ndjson",
+        )
     try:
-        logs = get_task_api_logs(task_id)
-        return {"code": 200, "msg": "查询成功", "data": logs}
+        logs = await get_task_api_logs_async(task_id, before_id, limit, api_type, status, selected)
+        next_before_id = logs[-1]["log_id"] if len(logs) == limit else None
+        return json_response({"code": 200, "msg": "查询成功", "data": logs, "next_before_id": next_before_id})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"查询日志失败: {e}")
     
@@ -183,7 +453,7 @@ async def get_task_logs_api(task_id: str):
 async def link_tiktok_start(device=Depends(require_device), ) -> LinkStartResponse:
     res = await archive_client.start_xordi_auth(anchor_token=None)
 
-    task_id = create_task(res.get("archive_job_id", device["device_id"]))
+    task_id = await create_task_async(res.get("archive_job_id", device["device_id"]))
     print(f"task created: {task_id}")
     # add task to verify queue
     task_data = {
@@ -192,18 +462,7 @@ async def link_tiktok_start(device=Depends(require_device), ) -> LinkStartRespon
     redis_client.lpush(settings.TASK_QUEUE_VERIFY, json.dumps(task_data))
 
     # initialize task status in Redis
-    redis_key = settings.TASK_STATUS_KEY.format(task_id=task_id)
-    redis_client.hset(redis_key, mapping={
-        "task_id": task_id,
-        "status": "pending",
-        "region_retry_count": 0,
-        "collect_total": 0,
-        "collect_completed": 0,
-        "collect_page": 0,
-        "collect_progress": "0%",
-        "collect_status": "not_started",
-        "analysis_status": "not_executed"
-    })
+    fill_status(task_id, initial_status(task_id))
 
     return LinkStartResponse(
         archive_job_id=res.get("archive_job_id", ""),
@@ -217,7 +476,7 @@ async def link_tiktok_start(device=Depends(require_device), ) -> LinkStartRespon
     responses={401: {"model": ErrorResponse}},
 )
 async def link_tiktok_redirect(job_id: str, device=Depends(require_device)) -> RedirectResponse:
-    job = get_task_status(job_id)
+    job = await get_task_status_async(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="job_not_found")
     if job.device_id and job.device_id != device["device_id"]:
@@ -0,0 +1,49 @@
+import json
+import logging
+from typing import Any, Dict
+
+from app.core.config import settings
+from app.core.database import redis_client
+
+logger = logging.getLogger("analysis_checkpoint")
+
+
+def _checkpoint_key(task_id: str) -> str:
+    return settings.ANALYSIS_CHECKPOINT_KEY.format(task_id=task_id)
+
+
+# load parsed analysis fields saved by a previous attempt
+def load_checkpoint(task_id: str) -> Dict[str, Any]:
+    try:
+        raw = redis_client.hgetall(_checkpoint_key(task_id))
+    except Exception as e:
+        logger.warning(f"load analysis checkpoint failed: {e}")
+        return {}
+    fields = {}
+    for field, value in raw.items():
+        try:
+            fields[field] = json.loads(value)
+        except ValueError:
+            continue
+    return fields
+
+
+# persist successfully parsed fields so a retry only calls the missing prompts
+def save_checkpoint(task_id: str, fields: Dict[str, Any]) -> None:
+    if not fields:
+        return
+    key = _checkpoint_key(task_id)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hset(key, mapping={k: json.dumps(v) for k, v in fields.items()})
+        pipe.expire(key, settings.ANALYSIS_CHECKPOINT_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"save analysis checkpoint failed: {e}")
+
+
+def clear_checkpoint(task_id: str) -> None:
+    try:
+        redis_client.delete(_checkpoint_key(task_id))
+    except Exception as e:
+        logger.warning(f"clear analysis checkpoint failed: {e}")
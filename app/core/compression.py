@@ -0,0 +1,145 @@
+"""Response compression.
+
+``CompressionMiddleware`` encodes response bodies with brotli when the
+client accepts it and the brotli package is installed, otherwise with gzip.
+Bodies under ``RESPONSE_COMPRESSION_MIN_SIZE`` are sent as they are, and so
+are responses that already carry a Content-Encoding (the stored wrapped
+documents) and event streams, whose events must reach the client as soon as
+they are written. Other streamed bodies, like the NDJSON log export, are
+compressed chunk by chunk and flushed after each chunk.
+"""
+import importlib.util
+import logging
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("compression")
+
+if importlib.util.find_spec("brotli") is not None:
+    import brotli
+else:
+    brotli = None
+    logger.warning("brotli is not installed, responses are compressed with gzip only")
+
+# never compressed: events must not wait in a compressor buffer
+_SKIP_CONTENT_TYPES = ("text/event-stream",)
+
+
+class _GzipEncoder:
+    def __init__(self, level: int) -> None:
+        # wbits 31: gzip container
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+def _accepted_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        q = params.strip().replace(" ", "")
+        if q.startswith("q=") and q[2:].strip("0.") == "":
+            continue
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = _accepted_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressionResponder(self, encoding, send)(scope, receive)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[Message] = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive) -> None:
+        await self.middleware.app(scope, receive, self.send_compressed)
+
+    def _new_encoder(self):
+        if self.encoding == "br":
+            return _BrotliEncoder(self.middleware.brotli_quality)
+        return _GzipEncoder(self.middleware.gzip_level)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # held back until the first body chunk decides the headers
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                "content-encoding" in headers
+                or content_type.startswith(_SKIP_CONTENT_TYPES)
+                or (not more_body and len(body) < self.middleware.minimum_size)
+            ):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            self.encoder = self._new_encoder()
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # the encoded bytes differ from the ones a strong ETag names
+                headers["ETag"] = "W/" + etag
+            if more_body:
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+            else:
+                body = self.encoder.finish(body)
+                headers["Content-Length"] = str(len(body))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            await self.send(start)
+        body = self.encoder.compress(body) if more_body else self.encoder.finish(body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 # load .env file
@@ -13,12 +14,30 @@ class Settings():
     MYSQL_USER: str = os.getenv("MYSQL_USER")
     MYSQL_PASSWORD: str = os.getenv("MYSQL_PASSWORD")
     MYSQL_DB: str = os.getenv("MYSQL_DB")
+    # max pooled connections per process, by PROCESS_ROLE; pools open connections on demand
+    # per-process budget: the api's handlers use the async pool, its sync pool only serves threadpool work
+    MYSQL_POOL_SIZES: dict = json.loads(os.getenv("MYSQL_POOL_SIZES", '{"api": 5, "verify": 2, "collect": 3, "analyze": 3, "email": 1, "log_retention": 1, "archive": 1, "default": 5}'))
+    MYSQL_ASYNC_POOL_SIZES: dict = json.loads(os.getenv("MYSQL_ASYNC_POOL_SIZES", '{"api": 15, "default": 2}'))
+    MYSQL_ASYNC_POOL_MIN: int = int(os.getenv("MYSQL_ASYNC_POOL_MIN", 1))
+    # optional read replica; readonly reads fall back to the primary while it lags or after own writes
+    MYSQL_REPLICA_HOST: str = os.getenv("MYSQL_REPLICA_HOST", "")
+    MYSQL_REPLICA_PORT: int = int(os.getenv("MYSQL_REPLICA_PORT", 3306))
+    MYSQL_REPLICA_USER: str = os.getenv("MYSQL_REPLICA_USER") or os.getenv("MYSQL_USER")
+    MYSQL_REPLICA_PASSWORD: str = os.getenv("MYSQL_REPLICA_PASSWORD") or os.getenv("MYSQL_PASSWORD")
+    MYSQL_REPLICA_MAX_LAG: float = float(os.getenv("MYSQL_REPLICA_MAX_LAG", 2))
+    MYSQL_REPLICA_LAG_CHECK_INTERVAL: float = float(os.getenv("MYSQL_REPLICA_LAG_CHECK_INTERVAL", 2))
+    READ_STICKY_KEY: str = os.getenv("READ_STICKY_KEY", "db:sticky:{key}")
+    # keep above MYSQL_REPLICA_MAX_LAG + MYSQL_REPLICA_LAG_CHECK_INTERVAL
+    READ_STICKY_TTL: int = int(os.getenv("READ_STICKY_TTL", 10))
+    # seconds a migration DDL waits for a metadata lock before giving up
+    MIGRATION_LOCK_WAIT_TIMEOUT: int = int(os.getenv("MIGRATION_LOCK_WAIT_TIMEOUT", 5))
 
     # Redis
     REDIS_HOST: str = os.getenv("REDIS_HOST")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
     REDIS_DB: int = int(os.getenv("REDIS_DB", 0))
     REDIS_PASSWORD: str = os.getenv("REDIS_PASSWORD", "")
+    REDIS_POOL_SIZES: dict = json.loads(os.getenv("REDIS_POOL_SIZES", '{"api": 50, "default": 10}'))
     REDIS_LOCK_EXPIRE: int = int(os.getenv("REDIS_LOCK_EXPIRE", 60))
 
     # queue and task keys
@@ -27,15 +46,78 @@ class Settings():
     TASK_QUEUE_ANALYZE: str = os.getenv("TASK_QUEUE_ANALYZE")
     TASK_QUEUE_RETRY: str = os.getenv("TASK_QUEUE_RETRY")
     TASK_STATUS_KEY: str = os.getenv("TASK_STATUS_KEY")
+    # status hashes expire TASK_STATUS_TTL after their last write, TASK_STATUS_TERMINAL_TTL once terminal
+    TASK_STATUS_TTL: int = int(os.getenv("TASK_STATUS_TTL", 24 * 3600))
+    TASK_STATUS_TERMINAL_TTL: int = int(os.getenv("TASK_STATUS_TERMINAL_TTL", 600))
+    # latest task of a user, lets conditional GETs by app_user_id skip MySQL
+    USER_TASK_KEY: str = os.getenv("USER_TASK_KEY", "user:task:{app_user_id}")
+    # status versions are published here; /api/task/stream and /api/task/ws forward them
+    TASK_EVENTS_CHANNEL: str = os.getenv("TASK_EVENTS_CHANNEL", "task:events:{task_id}")
+    TASK_STREAM_HEARTBEAT: float = float(os.getenv("TASK_STREAM_HEARTBEAT", 15))
+    TASK_STREAM_MAX_SECONDS: int = int(os.getenv("TASK_STREAM_MAX_SECONDS", 3600))
+    # finished wrapped documents, gzipped once at completion and served from Redis
+    WRAPPED_CACHE_KEY: str = os.getenv("WRAPPED_CACHE_KEY", "wrapped:{app_user_id}")
+    WRAPPED_CACHE_TTL: int = int(os.getenv("WRAPPED_CACHE_TTL", 30 * 24 * 3600))
     TASK_LOCK_KEY: str = os.getenv("TASK_LOCK_KEY")
     TASK_QUEUE_EMAIL_SEND: str = os.getenv("TASK_QUEUE_EMAIL_SEND")
+    # upper bound on items accepted by /create-batch and /intervene-batch
+    TASK_BATCH_MAX_ITEMS: int = int(os.getenv("TASK_BATCH_MAX_ITEMS", 5000))
+    COLLECT_PROGRESS_KEY: str = os.getenv("COLLECT_PROGRESS_KEY", "task:progress:{task_id}")
+    COLLECT_PROGRESS_TTL: int = int(os.getenv("COLLECT_PROGRESS_TTL", 24 * 3600))
+    # seconds between MySQL writes of collection counters; completion is always written
+    COLLECT_PROGRESS_FLUSH_INTERVAL: float = float(os.getenv("COLLECT_PROGRESS_FLUSH_INTERVAL", 5))
+    ANALYSIS_CHECKPOINT_KEY: str = os.getenv("ANALYSIS_CHECKPOINT_KEY", "task:analysis:checkpoint:{task_id}")
+    ANALYSIS_CHECKPOINT_TTL: int = int(os.getenv("ANALYSIS_CHECKPOINT_TTL", 7 * 24 * 3600))
+    # seconds an analysis task may wait on the LLM before remaining fields are computed locally
+    ANALYSIS_LATENCY_BUDGET: float = float(os.getenv("ANALYSIS_LATENCY_BUDGET", 60))
+    ANALYSIS_LOCAL_FALLBACK: bool = os.getenv("ANALYSIS_LOCAL_FALLBACK", "true").lower() == "true"
+
+    # terminal tasks (status_cache.TERMINAL_STATUSES) older than TASK_ARCHIVE_AFTER_DAYS move to tasks_archive in throttled batches
+    TASK_ARCHIVE_AFTER_DAYS: int = int(os.getenv("TASK_ARCHIVE_AFTER_DAYS", 30))
+    TASK_ARCHIVE_BATCH_SIZE: int = int(os.getenv("TASK_ARCHIVE_BATCH_SIZE", 500))
+    TASK_ARCHIVE_BATCH_PAUSE_MS: int = int(os.getenv("TASK_ARCHIVE_BATCH_PAUSE_MS", 200))
+    TASK_ARCHIVE_MAX_BATCHES: int = int(os.getenv("TASK_ARCHIVE_MAX_BATCHES", 200))
+    TASK_ARCHIVE_INTERVAL: int = int(os.getenv("TASK_ARCHIVE_INTERVAL", 600))
 
     # Worker settings
     WORKER_VERIFY_NUM: int = int(os.getenv("WORKER_VERIFY_NUM", 4))
     WORKER_ANALYZE_NUM: int = int(os.getenv("WORKER_ANALYZE_NUM", 4))
     API_TIMEOUT: int = int(os.getenv("API_TIMEOUT", 10))
+    # api_call_logs sink
+    API_LOG_QUEUE_SIZE: int = int(os.getenv("API_LOG_QUEUE_SIZE", 10000))
+    API_LOG_BATCH_SIZE: int = int(os.getenv("API_LOG_BATCH_SIZE", 200))
+    API_LOG_FLUSH_MS: int = int(os.getenv("API_LOG_FLUSH_MS", 500))
+    API_LOG_HIGH_WATERMARK: float = float(os.getenv("API_LOG_HIGH_WATERMARK", 0.8))
+    API_LOG_SAMPLE_RATE: float = float(os.getenv("API_LOG_SAMPLE_RATE", 0.1))
+    API_LOG_FULL_POLICY: str = os.getenv("API_LOG_FULL_POLICY", "drop_new")
+    API_LOG_MAX_BODY_BYTES: int = int(os.getenv("API_LOG_MAX_BODY_BYTES", 4096))
+    # failed and sampled calls are kept whole up to this size
+    API_LOG_MAX_FULL_BODY_BYTES: int = int(os.getenv("API_LOG_MAX_FULL_BODY_BYTES", 65536))
+    # per api_type overrides of max_body_bytes / max_full_body_bytes / oversize / sample_rate
+    API_LOG_CAPTURE_POLICIES: dict = json.loads(os.getenv("API_LOG_CAPTURE_POLICIES", '{"get_watch_history": {"oversize": "hash", "max_body_bytes": 1024, "sample_rate": 0.01}, "finalize_watch_history": {"oversize": "hash", "max_body_bytes": 1024, "sample_rate": 0.01}}'))
+    API_LOG_REDACT_HEADERS: list = json.loads(os.getenv("API_LOG_REDACT_HEADERS", '["Authorization", "X-Archive-API-Key"]'))
+    # keys masked at any depth of logged request and response bodies
+    API_LOG_REDACT_FIELDS: list = json.loads(os.getenv("API_LOG_REDACT_FIELDS", '["authorization_code", "anchor_token", "access_token", "refresh_token"]'))
+    API_LOG_RETENTION_DAYS: int = int(os.getenv("API_LOG_RETENTION_DAYS", 14))
+    API_LOG_PARTITION_DAYS_AHEAD: int = int(os.getenv("API_LOG_PARTITION_DAYS_AHEAD", 3))
+    # /api/task/logs pages by log_id; the NDJSON export reads API_LOG_EXPORT_BATCH rows per query
+    API_LOG_PAGE_SIZE: int = int(os.getenv("API_LOG_PAGE_SIZE", 100))
+    API_LOG_PAGE_MAX: int = int(os.getenv("API_LOG_PAGE_MAX", 1000))
+    API_LOG_EXPORT_BATCH: int = int(os.getenv("API_LOG_EXPORT_BATCH", 1000))
+    # responses are rendered with orjson when it is installed
+    ORJSON_RESPONSES: bool = os.getenv("ORJSON_RESPONSES", "true").lower() == "true"
+    # brotli or gzip for bodies of at least RESPONSE_COMPRESSION_MIN_SIZE bytes
+    RESPONSE_COMPRESSION: bool = os.getenv("RESPONSE_COMPRESSION", "true").lower() == "true"
+    RESPONSE_COMPRESSION_MIN_SIZE: int = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", 1024))
+    RESPONSE_GZIP_LEVEL: int = int(os.getenv("RESPONSE_GZIP_LEVEL", 6))
+    RESPONSE_BROTLI_QUALITY: int = int(os.getenv("RESPONSE_BROTLI_QUALITY", 4))
     REGION_WHITELIST: list = eval(os.getenv("REGION_WHITELIST", '["CN"]'))
     COLLECT_PAGE_SIZE: int = int(os.getenv("COLLECT_PAGE_SIZE", 20))
+    # task state updates are coalesced for this long before being written
+    STATE_WRITER_WINDOW_MS: int = int(os.getenv("STATE_WRITER_WINDOW_MS", 50))
+    STATE_WRITER_BATCH_SIZE: int = int(os.getenv("STATE_WRITER_BATCH_SIZE", 200))
+    # flushes a task's update may fail before it is dropped (MySQL and Redis both keep the old state)
+    STATE_WRITER_MAX_ATTEMPTS: int = int(os.getenv("STATE_WRITER_MAX_ATTEMPTS", 3))
 
     # API settings
     REGION_VERIFY_API_URL: str = os.getenv("REGION_VERIFY_API_URL")
@@ -61,6 +143,10 @@ class Settings():
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
     SESSION_TTL_DAYS: int = int(os.getenv("SESSION_TTL_DAYS", 30))
+    # validated sessions are cached by token hash; expires_at is only rewritten once it lags this much
+    SESSION_CACHE_KEY: str = os.getenv("SESSION_CACHE_KEY", "session:cache:{token_hash}")
+    SESSION_CACHE_TTL: int = int(os.getenv("SESSION_CACHE_TTL", 60))
+    SESSION_REFRESH_INTERVAL: int = int(os.getenv("SESSION_REFRESH_INTERVAL", 3600))
     SESSION_TTL_KEY: str = os.getenv("SESSION_TTL_KEYS", "abcdefghijklmnopqrstuvwxyz")
 
     # OpenRouter
@@ -68,6 +154,33 @@ class Settings():
     OPENROUTER_MODEL: str = os.getenv("OPENROUTER_MODEL")
     OPENROUTER_URL: str = os.getenv("OPENROUTER_URL")
 
+    # LLM client
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "true").lower() == "true"
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", 20))
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+    # per prompt type overrides, e.g. {"llm_niche_journey": 30}
+    LLM_TIMEOUTS: dict = json.loads(os.getenv("LLM_TIMEOUTS", "{}"))
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", 10))
+    LLM_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60))
+
+    # LLM context sampling
+    LLM_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", 1200))
+    SAMPLE_PER_STRATUM: int = int(os.getenv("SAMPLE_PER_STRATUM", 2))
+    SAMPLE_MAX_CANDIDATES: int = int(os.getenv("SAMPLE_MAX_CANDIDATES", 2000))
+    SAMPLE_DEDUPE_THRESHOLD: float = float(os.getenv("SAMPLE_DEDUPE_THRESHOLD", 0.7))
+
+    # users read-through cache
+    USER_CACHE_ENABLED: bool = os.getenv("USER_CACHE_ENABLED", "true").lower() == "true"
+    USER_CACHE_KEY: str = os.getenv("USER_CACHE_KEY", "user:cache:{app_user_id}")
+    USER_CACHE_TTL: int = int(os.getenv("USER_CACHE_TTL", 60))
+
+    # LLM response cache
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_KEY: str = os.getenv("LLM_CACHE_KEY", "llm:cache")
+    LLM_CACHE_TTL: int = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 100000))
+    LLM_CACHE_LOCAL_SIZE: int = int(os.getenv("LLM_CACHE_LOCAL_SIZE", 512))
+
 
     #email settings
     AWS_ACCESS_KEY_ID: str = os.getenv("AWS_ACCESS_KEY_ID")
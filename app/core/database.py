@@ -2,9 +2,14 @@ import pymysql
 import redis
 import os
 import sys
+import time
+import threading
+import asyncio
+import aiomysql
+from contextlib import asynccontextmanager
 from app.core.config import settings
 from redis.lock import Lock
-from dbutils.pooled_db import PooledDB 
+from dbutils.pooled_db import PooledDB
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 
@@ -16,33 +21,430 @@ POOL_CONFIG = {
     "database": settings.MYSQL_DB,
     "charset": "utf8mb4",
     "cursorclass": pymysql.cursors.DictCursor,
-    "maxconnections": 20,  # pool max connections
-    "mincached": 5,        # initial pool connections
-    "maxcached": 10,       # max cached connections
-    "maxshared": 5,        # max shared connections
     "blocking": True,      # block if no connection available
     "setsession": [],     # session commands
 }
-# create MySQL connection pool
-mysql_pool = PooledDB(
-    creator=pymysql,
-    **POOL_CONFIG
-)
-# get MySQL connection from pool
-def get_mysql_conn():
-    conn = mysql_pool.connection()
-    return conn
-
-# create Redis client
-redis_client = redis.Redis(
-    host=settings.REDIS_HOST,
-    port=settings.REDIS_PORT,
-    db=settings.REDIS_DB,
-    password=settings.REDIS_PASSWORD,
-    decode_responses=True
-)
+
+# role of this process (api, verify, collect, analyze, email, ...), set by start_workers.py
+def process_role():
+    return os.getenv("PROCESS_ROLE", "api")
+
+# pool sizes for the current role, falling back to "default"
+# kind is "mysql", "mysql_async" or "redis"
+def pool_size(kind):
+    sizes = {
+        "mysql": settings.MYSQL_POOL_SIZES,
+        "mysql_async": settings.MYSQL_ASYNC_POOL_SIZES,
+    }.get(kind, settings.REDIS_POOL_SIZES)
+    return int(sizes.get(process_role(), sizes.get("default", 5)))
+
+
+# checkout/usage counters for this process' pools
+_stats_lock = threading.Lock()
+_stats = {}
+
+def _reset_stats():
+    _stats.clear()
+    _stats.update({
+        "checkouts": 0, "in_use": 0, "max_in_use": 0,
+        "wait_total": 0.0, "wait_max": 0.0, "errors": 0,
+        "async_checkouts": 0, "async_wait_total": 0.0, "async_wait_max": 0.0, "async_errors": 0,
+        "replica_reads": 0, "primary_reads": 0, "sticky_reads": 0, "lag_fallbacks": 0,
+    })
+
+_reset_stats()
+
+def _record_checkout(wait, prefix=""):
+    with _stats_lock:
+        _stats[f"{prefix}checkouts"] += 1
+        _stats[f"{prefix}wait_total"] += wait
+        _stats[f"{prefix}wait_max"] = max(_stats[f"{prefix}wait_max"], wait)
+        if not prefix:
+            _stats["in_use"] += 1
+            _stats["max_in_use"] = max(_stats["max_in_use"], _stats["in_use"])
+
+def _record_error(prefix=""):
+    with _stats_lock:
+        _stats[f"{prefix}errors"] += 1
+
+def _count_read(field):
+    with _stats_lock:
+        _stats[field] += 1
+
+
+class _TrackedConnection:
+    """Pooled connection that keeps the in-use count; close() returns it to the pool once."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._closed = False
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        with _stats_lock:
+            _stats["in_use"] -= 1
+        self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+# pools are created on first use and per PID: a forked child never reuses the parent's sockets
+_pool_pid = None
+_mysql_pool = None
+_replica_pool = None
+_redis_client = None
+_redis_bytes_client = None
+_pool_lock = threading.Lock()
+
+def _check_pid():
+    global _pool_pid, _mysql_pool, _replica_pool, _redis_client, _redis_bytes_client, _replica_lag
+    global _async_mysql_pool, _async_mysql_pool_lock, _async_replica_pool, _async_replica_pool_lock
+    pid = os.getpid()
+    if _pool_pid != pid:
+        # inherited pools are dropped without closing, closing would tear down the parent's connections
+        _pool_pid = pid
+        _mysql_pool = None
+        _replica_pool = None
+        _redis_client = None
+        _redis_bytes_client = None
+        # the aiomysql pools hold the parent's sockets, and their locks may be bound to its loop
+        _async_mysql_pool = None
+        _async_mysql_pool_lock = asyncio.Lock()
+        _async_replica_pool = None
+        _async_replica_pool_lock = asyncio.Lock()
+        _replica_lag = (0.0, None)
+        _reset_stats()
+
+def _after_fork_in_child():
+    global _pool_lock
+    _pool_lock = threading.Lock()
+    _check_pid()
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+def get_mysql_pool():
+    global _mysql_pool
+    _check_pid()
+    if _mysql_pool is None:
+        with _pool_lock:
+            if _mysql_pool is None:
+                size = pool_size("mysql")
+                _mysql_pool = PooledDB(
+                    creator=pymysql,
+                    maxconnections=size,  # pool max connections
+                    mincached=0,          # connections are opened on demand
+                    maxcached=size,       # max idle connections kept
+                    maxshared=0,          # pymysql connections can't be shared between threads
+                    **POOL_CONFIG
+                )
+    return _mysql_pool
+
+def _get_replica_pool():
+    global _replica_pool
+    _check_pid()
+    if _replica_pool is None:
+        with _pool_lock:
+            if _replica_pool is None:
+                size = pool_size("mysql")
+                _replica_pool = PooledDB(
+                    creator=pymysql,
+                    maxconnections=size,
+                    mincached=0,
+                    maxcached=size,
+                    maxshared=0,
+                    **{**POOL_CONFIG, **REPLICA_CONFIG}
+                )
+    return _replica_pool
+
+# get MySQL connection from pool; readonly=True may be served by the replica (see _use_replica)
+def get_mysql_conn(readonly=False, sticky_key=None):
+    if readonly and _use_replica(sticky_key):
+        pool = _get_replica_pool()
+        _count_read("replica_reads")
+    else:
+        pool = get_mysql_pool()
+        if readonly:
+            _count_read("primary_reads")
+    start = time.perf_counter()
+    try:
+        conn = pool.connection()
+    except Exception:
+        _record_error()
+        raise
+    _record_checkout(time.perf_counter() - start)
+    return _TrackedConnection(conn)
+
+# async MySQL pool for the FastAPI handlers, created lazily on the running loop
+_async_mysql_pool = None
+_async_mysql_pool_lock = asyncio.Lock()
+
+async def get_async_mysql_pool():
+    global _async_mysql_pool
+    _check_pid()
+    if _async_mysql_pool is None:
+        async with _async_mysql_pool_lock:
+            if _async_mysql_pool is None:
+                _async_mysql_pool = await aiomysql.create_pool(
+                    host=settings.MYSQL_HOST,
+                    port=settings.MYSQL_PORT,
+                    user=settings.MYSQL_USER,
+                    password=settings.MYSQL_PASSWORD,
+                    db=settings.MYSQL_DB,
+                    charset="utf8mb4",
+                    cursorclass=aiomysql.DictCursor,
+                    minsize=min(settings.MYSQL_ASYNC_POOL_MIN, pool_size("mysql_async")),
+                    maxsize=pool_size("mysql_async"),
+                    # reads then leave no transaction open; writers still commit explicitly
+                    autocommit=True,
+                )
+    return _async_mysql_pool
+
+_async_replica_pool = None
+_async_replica_pool_lock = asyncio.Lock()
+
+async def _get_async_replica_pool():
+    global _async_replica_pool
+    _check_pid()
+    if _async_replica_pool is None:
+        async with _async_replica_pool_lock:
+            if _async_replica_pool is None:
+                _async_replica_pool = await aiomysql.create_pool(
+                    host=REPLICA_CONFIG["host"],
+                    port=REPLICA_CONFIG["port"],
+                    user=REPLICA_CONFIG["user"],
+                    password=REPLICA_CONFIG["password"],
+                    db=settings.MYSQL_DB,
+                    charset="utf8mb4",
+                    cursorclass=aiomysql.DictCursor,
+                    minsize=min(settings.MYSQL_ASYNC_POOL_MIN, pool_size("mysql_async")),
+                    maxsize=pool_size("mysql_async"),
+                    autocommit=True,
+                )
+    return _async_replica_pool
+
+# get async MySQL connection from pool, released back on exit
+@asynccontextmanager
+async def get_async_mysql_conn(readonly=False, sticky_key=None):
+    if readonly and await _use_replica_async(sticky_key):
+        pool = await _get_async_replica_pool()
+        _count_read("replica_reads")
+    else:
+        pool = await get_async_mysql_pool()
+        if readonly:
+            _count_read("primary_reads")
+    start = time.perf_counter()
+    try:
+        conn = await pool.acquire()
+    except Exception:
+        _record_error("async_")
+        raise
+    _record_checkout(time.perf_counter() - start, "async_")
+    try:
+        yield conn
+    finally:
+        # a connection released inside a transaction (a writer that failed before
+        # commit) would be closed by the pool, or keep its snapshot
+        if conn.get_transaction_status():
+            try:
+                await conn.rollback()
+            except Exception:
+                pass
+        pool.release(conn)
+
+async def close_async_mysql_pool():
+    global _async_mysql_pool, _async_replica_pool
+    for pool in (_async_mysql_pool, _async_replica_pool):
+        if pool is not None:
+            pool.close()
+            await pool.wait_closed()
+    _async_mysql_pool = None
+    _async_replica_pool = None
+
+# get Redis client for this process
+def get_redis_client():
+    global _redis_client
+    _check_pid()
+    if _redis_client is None:
+        with _pool_lock:
+            if _redis_client is None:
+                _redis_client = redis.Redis(
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    db=settings.REDIS_DB,
+                    password=settings.REDIS_PASSWORD,
+                    decode_responses=True,
+                    max_connections=pool_size("redis"),
+                )
+    return _redis_client
+
+# Redis client that returns raw bytes, for values that are not text (compressed blobs)
+def get_redis_bytes_client():
+    global _redis_bytes_client
+    _check_pid()
+    if _redis_bytes_client is None:
+        with _pool_lock:
+            if _redis_bytes_client is None:
+                _redis_bytes_client = redis.Redis(
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    db=settings.REDIS_DB,
+                    password=settings.REDIS_PASSWORD,
+                    max_connections=pool_size("redis"),
+                )
+    return _redis_bytes_client
+
+
+class _RedisProxy:
+    """Module-level stand-in for the per-process Redis client."""
+
+    def __getattr__(self, name):
+        return getattr(get_redis_client(), name)
+
+    def __repr__(self):
+        return f"<redis_client proxy pid={os.getpid()}>"
+
+
+redis_client = _RedisProxy()
+
+
+# read replica routing: readonly reads go to the replica unless the caller's sticky key
+# was written within READ_STICKY_TTL seconds or the replica lags more than MYSQL_REPLICA_MAX_LAG
+REPLICA_CONFIG = {
+    "host": settings.MYSQL_REPLICA_HOST,
+    "port": settings.MYSQL_REPLICA_PORT,
+    "user": settings.MYSQL_REPLICA_USER,
+    "password": settings.MYSQL_REPLICA_PASSWORD,
+}
+
+# (checked_at, seconds behind source or None when unknown/broken)
+_replica_lag = (0.0, None)
+
+def _lag_from_status(status):
+    if not status:
+        return None
+    lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+    return float(lag) if lag is not None else None
+
+# SHOW REPLICA STATUS needs MySQL 8.0.22+, older servers only know SHOW SLAVE STATUS
+def _replica_status(cursor):
+    try:
+        cursor.execute("SHOW REPLICA STATUS")
+    except Exception:
+        cursor.execute("SHOW SLAVE STATUS")
+    return cursor.fetchone()
+
+def _replica_lag_fresh():
+    checked_at, lag = _replica_lag
+    return time.time() - checked_at < settings.MYSQL_REPLICA_LAG_CHECK_INTERVAL
+
+def _lag_ok(lag):
+    if lag is not None and lag <= settings.MYSQL_REPLICA_MAX_LAG:
+        return True
+    _count_read("lag_fallbacks")
+    return False
+
+def _check_replica_lag():
+    global _replica_lag
+    if _replica_lag_fresh():
+        return _replica_lag[1]
+    lag = None
+    conn = None
+    try:
+        conn = _get_replica_pool().connection()
+        with conn.cursor() as cursor:
+            lag = _lag_from_status(_replica_status(cursor))
+    except Exception as e:
+        print(f"replica lag check failed: {e}")
+    finally:
+        if conn:
+            conn.close()
+    _replica_lag = (time.time(), lag)
+    return lag
+
+async def _check_replica_lag_async():
+    global _replica_lag
+    if _replica_lag_fresh():
+        return _replica_lag[1]
+    lag = None
+    try:
+        pool = await _get_async_replica_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                try:
+                    await cursor.execute("SHOW REPLICA STATUS")
+                except Exception:
+                    await cursor.execute("SHOW SLAVE STATUS")
+                lag = _lag_from_status(await cursor.fetchone())
+    except Exception as e:
+        print(f"replica lag check failed: {e}")
+    _replica_lag = (time.time(), lag)
+    return lag
+
+def _sticky_key(key):
+    return settings.READ_STICKY_KEY.format(key=key)
+
+def _is_sticky(sticky_key):
+    if not sticky_key:
+        return False
+    try:
+        sticky = bool(redis_client.exists(_sticky_key(sticky_key)))
+    except Exception as e:
+        print(f"read sticky check failed: {e}")
+        return True
+    if sticky:
+        _count_read("sticky_reads")
+    return sticky
+
+def _use_replica(sticky_key):
+    if not settings.MYSQL_REPLICA_HOST or _is_sticky(sticky_key):
+        return False
+    return _lag_ok(_check_replica_lag())
+
+async def _use_replica_async(sticky_key):
+    if not settings.MYSQL_REPLICA_HOST or _is_sticky(sticky_key):
+        return False
+    return _lag_ok(await _check_replica_lag_async())
+
+# pin reads for these keys (e.g. "task:<id>", "user:<id>") to the primary for a short window
+def mark_written(*sticky_keys):
+    if not settings.MYSQL_REPLICA_HOST:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for key in sticky_keys:
+            if key:
+                pipe.set(_sticky_key(key), 1, ex=settings.READ_STICKY_TTL)
+        pipe.execute()
+    except Exception as e:
+        print(f"mark written failed: {e}")
+
+# pool usage of this process
+def pool_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    checkouts = stats["checkouts"]
+    stats["wait_avg"] = stats["wait_total"] / checkouts if checkouts else 0.0
+    stats.update({
+        "pid": os.getpid(),
+        "role": process_role(),
+        "mysql_max_connections": pool_size("mysql"),
+        "mysql_async_max_connections": pool_size("mysql_async"),
+        "replica_lag": _replica_lag[1],
+        "redis_max_connections": pool_size("redis"),
+    })
+    if _redis_client is not None and _pool_pid == os.getpid():
+        pool = _redis_client.connection_pool
+        stats["redis_in_use"] = len(getattr(pool, "_in_use_connections", ()))
+        stats["redis_created"] = getattr(pool, "_created_connections", 0)
+    if _async_mysql_pool is not None:
+        stats["async_size"] = _async_mysql_pool.size
+        stats["async_free"] = _async_mysql_pool.freesize
+    return stats
 
 # get distributed lock for a task
 def get_task_lock(task_id):
     lock_key = settings.TASK_LOCK_KEY.format(task_id=task_id)
-    return Lock(redis_client, lock_key, timeout=settings.REDIS_LOCK_EXPIRE)
\ No newline at end of file
+    return Lock(redis_client, lock_key, timeout=settings.REDIS_LOCK_EXPIRE)
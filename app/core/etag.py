@@ -0,0 +1,59 @@
+"""ETag helpers for polled endpoints.
+
+Task-backed responses use the status cache version as their validator, so
+``If-None-Match`` can be answered from one HMGET before any MySQL read or
+serialization. ETags are weak: the same version may be sent gzip-encoded
+or not.
+"""
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.core.responses import json_response
+
+# clients must revalidate, which is a 304 whenever the version has not moved
+CACHE_CONTROL = "no-cache"
+
+
+def version_etag(kind: str, key: str, version: int) -> str:
+    return f'W/"{kind}-{key}-{version}"'
+
+
+def content_etag(content: Any) -> str:
+    body = json.dumps(jsonable_encoder(content), sort_keys=True, separators=(",", ":"))
+    return f'W/"{hashlib.sha1(body.encode("utf-8")).hexdigest()[:20]}"'
+
+
+def _opaque(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """Weak comparison against If-None-Match."""
+    header = request.headers.get("if-none-match")
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(candidate) for candidate in header.split(",")}
+
+
+def not_modified(etag: str, cache_control: str = CACHE_CONTROL) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def with_etag(content: Any, etag: Optional[str], status_code: int = 200) -> Response:
+    headers: Dict[str, str] = {"Cache-Control": CACHE_CONTROL}
+    if etag:
+        headers["ETag"] = etag
+    return json_response(content, status_code=status_code, headers=headers)
+
+
+def conditional(request: Request, content: Any, etag: Optional[str]) -> Response:
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return with_etag(content, etag)
@@ -0,0 +1,69 @@
+"""Deterministic fallbacks for wrapped analysis fields.
+
+Computed only from the summary statistics the collector stores in the task
+payload, so they cost nothing and never fail. The analyze worker uses them
+for fields the LLM did not return within the task's latency budget.
+"""
+from typing import Any, Dict, List, Optional
+
+# rough length of one swipe on a phone screen, in metres
+_SWIPE_METRES = 0.1
+
+
+def _niches(summary: Dict[str, Any]) -> List[str]:
+    niches = [str(h).lstrip("#").strip() for h in summary.get("top_hashtags") or []]
+    niches = [n for n in niches if n]
+    if not niches:
+        niches = [str(c) for c in summary.get("top_creators") or [] if c]
+    return niches
+
+
+def _percentile(total_hours: float) -> str:
+    for hours, label in ((500, "top 1%"), (200, "top 5%"), (100, "top 10%"), (50, "top 25%")):
+        if total_hours >= hours:
+            return label
+    return "top 50%"
+
+
+def _personality(night_pct: float, peak_hour: Optional[int], total_hours: float) -> tuple[str, str]:
+    if night_pct >= 35:
+        return "night_shift_scroller", f"{night_pct:.0f}% of your watch time landed between 10pm and 4am."
+    if peak_hour is not None and 5 <= peak_hour < 10:
+        return "early_bird_browser", f"Your feed peaked around {peak_hour}:00, well before most people wake up."
+    if total_hours >= 200:
+        return "marathon_scroller", f"{total_hours:.0f} hours of videos is a serious commitment."
+    return "casual_explorer", "You dip in and out without letting the feed take over your day."
+
+
+def brain_rot_score(summary: Dict[str, Any]) -> int:
+    night_pct = min(float(summary.get("night_pct") or 0.0), 100.0)
+    hours_pct = min(float(summary.get("total_hours") or 0.0) / 500 * 100, 100.0)
+    videos_pct = min(int(summary.get("total_videos") or 0) / 20000 * 100, 100.0)
+    return max(0, min(100, int(round(0.4 * night_pct + 0.4 * hours_pct + 0.2 * videos_pct))))
+
+
+def local_analysis(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Return every analysis field computed from summary statistics."""
+    night_pct = float(summary.get("night_pct") or 0.0)
+    total_hours = float(summary.get("total_hours") or 0.0)
+    total_videos = int(summary.get("total_videos") or 0)
+    peak_hour = summary.get("peak_hour")
+    niches = _niches(summary)
+    score = brain_rot_score(summary)
+    personality, personality_explanation = _personality(night_pct, peak_hour, total_hours)
+    km = total_videos * _SWIPE_METRES / 1000
+
+    return {
+        "personality_type": personality,
+        "personality_explanation": personality_explanation,
+        "niche_journey": niches[:5],
+        "top_niches": niches[:2],
+        "top_niche_percentile": _percentile(total_hours),
+        "brain_rot_score": score,
+        "brain_rot_explanation": (
+            f"Scored {score} from {total_hours:.0f} hours watched, "
+            f"{night_pct:.0f}% of it late at night."
+        ),
+        "keyword_2026": niches[0] if niches else "balance",
+        "thumb_roast": f"Your thumb swiped through {total_videos:,} videos, roughly {km:.1f} km of screen.",
+    }
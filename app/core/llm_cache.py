@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.database import redis_client
+
+logger = logging.getLogger("llm_cache")
+
+
+class LLMCache:
+    """Content-addressed cache of validated LLM outputs.
+
+    Lookups go through an in-process LRU first, then Redis. Redis entries
+    expire after ``ttl`` seconds and an index sorted set caps the number of
+    entries, evicting the oldest ones first.
+    """
+
+    def __init__(
+        self,
+        prefix: str = settings.LLM_CACHE_KEY,
+        ttl: int = settings.LLM_CACHE_TTL,
+        max_entries: int = settings.LLM_CACHE_MAX_ENTRIES,
+        local_size: int = settings.LLM_CACHE_LOCAL_SIZE,
+        enabled: bool = settings.LLM_CACHE_ENABLED,
+    ) -> None:
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.local_size = local_size
+        self.enabled = enabled
+        self._local: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, prompt: str, sample_texts: List[str], temperature: float) -> str:
+        raw = json.dumps(
+            [model, prompt, list(sample_texts), temperature],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.prefix}:entry:{key}"
+
+    def _index_key(self) -> str:
+        return f"{self.prefix}:index"
+
+    def _stats_key(self) -> str:
+        return f"{self.prefix}:stats"
+
+    def _remember_local(self, key: str, value: str) -> None:
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _count(self, field: str) -> None:
+        try:
+            redis_client.hincrby(self._stats_key(), field, 1)
+        except Exception as e:
+            logger.warning(f"llm cache stats update failed: {e}")
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._local.get(key)
+            if value is not None:
+                self._local.move_to_end(key)
+                self.local_hits += 1
+        if value is not None:
+            self._count("hits")
+            return value
+
+        try:
+            value = redis_client.get(self._entry_key(key))
+        except Exception as e:
+            logger.warning(f"llm cache get failed: {e}")
+            value = None
+        if value is not None:
+            self.redis_hits += 1
+            self._count("hits")
+            self._remember_local(key, value)
+            return value
+
+        self.misses += 1
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        """Store a validated output. Empty values (failed calls) are never cached."""
+        if not self.enabled or not value:
+            return
+        self._remember_local(key, value)
+        now = time.time()
+        index_key = self._index_key()
+        try:
+            pipe = redis_client.pipeline()
+            pipe.set(self._entry_key(key), value, ex=self.ttl)
+            pipe.zadd(index_key, {key: now})
+            # entries past their TTL are already gone, drop them from the index
+            pipe.zremrangebyscore(index_key, "-inf", now - self.ttl)
+            pipe.zcard(index_key)
+            size = pipe.execute()[-1]
+
+            overflow = size - self.max_entries
+            if overflow > 0:
+                evicted = [k for k, _ in redis_client.zpopmin(index_key, overflow)]
+                if evicted:
+                    redis_client.delete(*[self._entry_key(k) for k in evicted])
+        except Exception as e:
+            logger.warning(f"llm cache set failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.local_hits + self.redis_hits
+        total = hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate_pct": round(hits / total * 100, 2) if total else 0.0,
+        }
@@ -0,0 +1,106 @@
+import asyncio
+import importlib.util
+import logging
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger("llm_client")
+
+
+class LLMClient:
+    """Process-wide OpenRouter client.
+
+    Owns one pooled keep-alive ``httpx.AsyncClient`` (HTTP/2 when enabled) so
+    the prompts of a task reuse the same connection instead of paying DNS,
+    TCP and TLS setup on every call. Create it with ``start()`` when the
+    worker boots and release it with ``aclose()`` on shutdown.
+    """
+
+    def __init__(
+        self,
+        api_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        default_timeout: float = settings.LLM_TIMEOUT,
+        timeouts: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.api_url = api_url or settings.OPENROUTER_URL
+        self.api_key = api_key or settings.OPENROUTER_API_KEY
+        self.model = model or settings.OPENROUTER_MODEL
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts if timeouts is not None else settings.LLM_TIMEOUTS
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key and self.model)
+
+    async def start(self) -> None:
+        if self._client is not None:
+            return
+        http2 = settings.LLM_HTTP2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("h2 is not installed, llm client falls back to HTTP/1.1 keep-alive")
+            http2 = False
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(self.default_timeout, connect=settings.LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+                keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+            ),
+            headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+        )
+        logger.info(f"llm client started (http2={http2})")
+
+    async def aclose(self) -> None:
+        if self._client is None:
+            return
+        await self._client.aclose()
+        self._client = None
+        logger.info("llm client closed")
+
+    def timeout_for(self, prompt_type: Optional[str]) -> httpx.Timeout:
+        seconds = self.timeouts.get(prompt_type, self.default_timeout) if prompt_type else self.default_timeout
+        return httpx.Timeout(seconds, connect=settings.LLM_CONNECT_TIMEOUT)
+
+    async def complete(
+        self,
+        prompt: str,
+        sample_texts: List[str],
+        temperature: float,
+        prompt_type: Optional[str] = None,
+    ) -> str:
+        """Run one chat completion; returns "" when every attempt fails."""
+        if not self.configured:
+            return ""
+        if self._client is None:
+            await self.start()
+        messages = [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": "\n".join(sample_texts)},
+        ]
+        timeout = self.timeout_for(prompt_type)
+        backoff = 1.0
+        for _ in range(3):
+            try:
+                resp = await self._client.post(
+                    self.api_url,
+                    json={"model": self.model, "messages": messages, "temperature": temperature},
+                    timeout=timeout,
+                )
+                if resp.status_code == 200:
+                    data = resp.json()
+                    return data["choices"][0]["message"]["content"].strip()
+            except Exception as e:
+                logger.warning(f"llm call {prompt_type} failed: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 4.0)
+        return ""
+
+
+llm_client = LLMClient()
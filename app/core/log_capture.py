@@ -0,0 +1,70 @@
+import hashlib
+import json
+import random
+from typing import Any, Dict
+
+from app.core.config import settings
+
+REDACTED = "***"
+
+DEFAULT_CAPTURE_POLICY = {
+    # bodies larger than this (encoded JSON bytes) are truncated or hashed
+    "max_body_bytes": settings.API_LOG_MAX_BODY_BYTES,
+    # failed and sampled calls skip the cap above but not this one
+    "max_full_body_bytes": settings.API_LOG_MAX_FULL_BODY_BYTES,
+    # "truncate" keeps a preview, "hash" keeps only a digest
+    "oversize": "truncate",
+    # fraction of successful calls captured in full, failures always are
+    "sample_rate": 0.0,
+}
+
+
+def capture_policy(api_type: str) -> Dict[str, Any]:
+    return {**DEFAULT_CAPTURE_POLICY, **settings.API_LOG_CAPTURE_POLICIES.get(api_type, {})}
+
+
+def redact_headers(headers: Any) -> Any:
+    if not isinstance(headers, dict):
+        return headers
+    redacted = {h.lower() for h in settings.API_LOG_REDACT_HEADERS}
+    return {k: (REDACTED if k.lower() in redacted else v) for k, v in headers.items()}
+
+
+def redact_fields(value: Any) -> Any:
+    redacted = {f.lower() for f in settings.API_LOG_REDACT_FIELDS}
+    if isinstance(value, dict):
+        return {k: (REDACTED if str(k).lower() in redacted else redact_fields(v)) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact_fields(v) for v in value]
+    return value
+
+
+def _truncate(text: str, max_bytes: int) -> str:
+    # cut by bytes, dropping a character split at the boundary
+    return text.encode("utf-8")[:max_bytes].decode("utf-8", "ignore")
+
+
+def _capped_json(value: Any, policy: Dict[str, Any], max_bytes: int) -> str:
+    encoded = json.dumps(redact_fields(value))
+    size = len(encoded.encode("utf-8"))
+    if size <= max_bytes:
+        return encoded
+    digest = hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+    if policy["oversize"] == "hash":
+        return json.dumps({"_sha256": digest, "_size": size})
+    # a JSON column can't hold a cut-off document, so the preview is stored as a string
+    return json.dumps({"_sha256": digest, "_size": size, "_preview": _truncate(encoded, max_bytes)})
+
+
+def encode_log_bodies(row: Dict[str, Any]) -> tuple:
+    """Return (request_params, request_headers, response_data, error_detail) as they should be stored."""
+    policy = capture_policy(row["api_type"])
+    full = row["status"] != "success" or random.random() < policy["sample_rate"]
+    max_bytes = policy["max_full_body_bytes"] if full else policy["max_body_bytes"]
+    headers = json.dumps(redact_headers(row["request_headers"]))
+    # error_detail carries the response text of failed calls
+    error_detail = _truncate(row["error_detail"] or "", policy["max_full_body_bytes"])
+    return (
+        _capped_json(row["request_params"], policy, max_bytes), headers,
+        _capped_json(row["response_data"], policy, max_bytes), error_detail,
+    )
@@ -0,0 +1,81 @@
+import re
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import get_mysql_conn
+
+# api_call_logs is RANGE partitioned on TO_DAYS(call_time): one pYYYYMMDD per day plus p_future
+_DAILY_PARTITION = re.compile(r"^p(\d{8})$")
+
+
+def _partition_name(day: date) -> str:
+    return f"p{day:%Y%m%d}"
+
+
+def _list_partitions(cursor) -> List[Tuple[str, date]]:
+    cursor.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'api_call_logs' AND PARTITION_NAME IS NOT NULL
+    """)
+    partitions = []
+    for row in cursor.fetchall():
+        match = _DAILY_PARTITION.match(row["PARTITION_NAME"])
+        if match:
+            y, m, d = match.group(1)[:4], match.group(1)[4:6], match.group(1)[6:]
+            partitions.append((row["PARTITION_NAME"], date(int(y), int(m), int(d))))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+# split p_future so every day up to days_ahead has its own partition
+def ensure_log_partitions(days_ahead: int = settings.API_LOG_PARTITION_DAYS_AHEAD, today: Optional[date] = None) -> List[str]:
+    today = today or date.today()
+    conn = None
+    created = []
+    try:
+        conn = get_mysql_conn()
+        with conn.cursor() as cursor:
+            partitions = _list_partitions(cursor)
+            latest = partitions[-1][1] if partitions else None
+            # partition pYYYYMMDD holds rows of that day, i.e. VALUES LESS THAN the next day;
+            # only p_future can be split, so days at or before the latest partition are skipped
+            for offset in range(-1, days_ahead + 1):
+                day = today + timedelta(days=offset)
+                if latest is not None and day <= latest:
+                    continue
+                name = _partition_name(day)
+                cursor.execute(f"""
+                    ALTER TABLE api_call_logs REORGANIZE PARTITION p_future INTO (
+                        PARTITION {name} VALUES LESS THAN (TO_DAYS('{day + timedelta(days=1)}')),
+                        PARTITION p_future VALUES LESS THAN MAXVALUE
+                    )
+                """)
+                created.append(name)
+    except Exception as e:
+        print(f"ensure api log partitions failed: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+    return created
+
+
+# drop whole daily partitions older than the retention window instead of DELETE-ing rows
+def drop_expired_log_partitions(retention_days: int = settings.API_LOG_RETENTION_DAYS, today: Optional[date] = None) -> List[str]:
+    cutoff = (today or date.today()) - timedelta(days=retention_days)
+    conn = None
+    dropped = []
+    try:
+        conn = get_mysql_conn()
+        with conn.cursor() as cursor:
+            expired = [name for name, day in _list_partitions(cursor) if day < cutoff]
+            if expired:
+                cursor.execute(f"ALTER TABLE api_call_logs DROP PARTITION {', '.join(expired)}")
+                dropped = expired
+    except Exception as e:
+        print(f"drop expired api log partitions failed: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+    return dropped
@@ -0,0 +1,165 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.database import get_mysql_conn
+from app.core.log_capture import encode_log_bodies
+from app.core.state_writer import register_exit_flush
+
+logger = logging.getLogger("log_sink")
+
+INSERT_API_LOG_SQL = """
+    INSERT INTO api_call_logs
+    (task_id, api_type, request_url, request_params, request_headers,
+     response_code, response_data, cost_time, status, error_detail, retry_count)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+class ApiLogSink:
+    """Asynchronous sink for api_call_logs rows.
+
+    ``submit`` applies the body capture policy (``log_capture``) and appends
+    the encoded row to a bounded in-memory queue, so queued rows never hold
+    more than the capped bodies; a background thread
+    drains it into multi-row INSERTs every ``batch_size`` rows or
+    ``flush_ms`` milliseconds. When the queue is above ``high_watermark``
+    successful calls are sampled at ``sample_rate`` (failures are always
+    kept), and when it is full rows are dropped according to ``full_policy``
+    ("drop_new" or "drop_oldest").
+    """
+
+    def __init__(
+        self,
+        max_queue: int = settings.API_LOG_QUEUE_SIZE,
+        batch_size: int = settings.API_LOG_BATCH_SIZE,
+        flush_ms: int = settings.API_LOG_FLUSH_MS,
+        high_watermark: float = settings.API_LOG_HIGH_WATERMARK,
+        sample_rate: float = settings.API_LOG_SAMPLE_RATE,
+        full_policy: str = settings.API_LOG_FULL_POLICY,
+    ) -> None:
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self.high_watermark = int(max_queue * high_watermark)
+        self.sample_rate = sample_rate
+        self.full_policy = full_policy
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._last_report = time.time()
+        self.counters = {"enqueued": 0, "dropped": 0, "sampled_out": 0, "written": 0, "write_errors": 0, "batches": 0}
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._cond:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            if self._pid is not None:
+                # forked child: rows queued by the parent are the parent's to write
+                self._queue.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="api-log-sink", daemon=True)
+            self._thread.start()
+            register_exit_flush(self, self.flush)
+
+    def submit(self, row: Dict[str, Any]) -> bool:
+        """Queue one log row; returns False when it was dropped or sampled out."""
+        self._ensure_started()
+        # decided before encoding, a sampled-out row is not worth serializing
+        if len(self._queue) >= self.high_watermark and row.get("status") == "success" and random.random() >= self.sample_rate:
+            with self._cond:
+                self.counters["sampled_out"] += 1
+            return False
+        if self.full_policy != "drop_oldest" and len(self._queue) >= self.max_queue:
+            with self._cond:
+                self.counters["dropped"] += 1
+            return False
+        request_params, request_headers, response_data, error_detail = encode_log_bodies(row)
+        row = {
+            **row,
+            "request_params": request_params, "request_headers": request_headers,
+            "response_data": response_data, "error_detail": error_detail,
+        }
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                if self.full_policy != "drop_oldest":
+                    self.counters["dropped"] += 1
+                    return False
+                self._queue.popleft()
+                self.counters["dropped"] += 1
+            self._queue.append(row)
+            self.counters["enqueued"] += 1
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def _take(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            n = min(self.batch_size, len(self._queue))
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if len(self._queue) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"api log flush failed: {e}")
+            if time.time() - self._last_report >= 60:
+                self._last_report = time.time()
+                logger.info(f"api log sink stats: {self.stats()}")
+
+    def flush(self) -> None:
+        with self._write_lock:
+            while True:
+                rows = self._take()
+                if not rows:
+                    return
+                self._write(rows)
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        conn = None
+        try:
+            conn = get_mysql_conn()
+            with conn.cursor() as cursor:
+                # pymysql rewrites executemany on INSERT ... VALUES into one multi-row INSERT
+                cursor.executemany(INSERT_API_LOG_SQL, [_to_params(r) for r in rows])
+            conn.commit()
+            with self._cond:
+                self.counters["written"] += len(rows)
+                self.counters["batches"] += 1
+        except Exception as e:
+            with self._cond:
+                self.counters["write_errors"] += len(rows)
+            print(f"record API call log failed: {e}")
+        finally:
+            if conn:
+                conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {**self.counters, "queued": len(self._queue)}
+
+
+# bodies were encoded by submit
+def _to_params(row: Dict[str, Any]) -> tuple:
+    return (
+        row["task_id"], row["api_type"], row["request_url"],
+        row["request_params"], row["request_headers"],
+        row["response_code"], row["response_data"], row["cost_time"],
+        row["status"], row["error_detail"], row["retry_count"],
+    )
+
+
+api_log_sink = ApiLogSink()
@@ -0,0 +1,201 @@
+"""Versioned schema migrations.
+
+Migrations live in ``migrations/NNNN_name.sql`` with a ``-- migrate:up`` and
+a ``-- migrate:down`` section; statements end with ``;`` at the end of a
+line. Applied versions are recorded in ``schema_version``. Index changes
+are written as ``ALGORITHM=INPLACE, LOCK=NONE`` so they run online, and the
+session ``lock_wait_timeout`` is kept short so a DDL waiting on a metadata
+lock gives up instead of queueing traffic behind it.
+
+    python -m app.core.migrate status
+    python -m app.core.migrate up [version]
+    python -m app.core.migrate down [version]
+"""
+import hashlib
+import os
+import re
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import pymysql
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from app.core.config import settings
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "migrations")
+_FILENAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+_SECTION = re.compile(r"^--\s*migrate:(up|down)\s*$", re.MULTILINE)
+
+SCHEMA_VERSION_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT NOT NULL PRIMARY KEY,
+        name VARCHAR(128) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    up: List[str]
+    down: List[str]
+    checksum: str
+
+
+def _statements(sql: str) -> List[str]:
+    statements, current = [], []
+    for line in sql.splitlines():
+        if not current and (not line.strip() or line.lstrip().startswith("--")):
+            continue
+        current.append(line)
+        if line.rstrip().endswith(";"):
+            statements.append("\n".join(current).rstrip().rstrip(";"))
+            current = []
+    if current:
+        statements.append("\n".join(current).rstrip())
+    return statements
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            text = f.read()
+        parts = _SECTION.split(text)
+        sections = dict(zip(parts[1::2], parts[2::2]))
+        if "up" not in sections:
+            raise ValueError(f"{filename} has no '-- migrate:up' section")
+        migrations.append(Migration(
+            version=int(match.group(1)),
+            name=match.group(2),
+            up=_statements(sections["up"]),
+            down=_statements(sections.get("down", "")),
+            checksum=hashlib.sha256(sections["up"].encode("utf-8")).hexdigest(),
+        ))
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("duplicate migration version")
+    return migrations
+
+
+def _connect():
+    # DDL commits implicitly, so migrations use their own autocommit connection instead of the pool
+    conn = pymysql.connect(
+        host=settings.MYSQL_HOST,
+        port=settings.MYSQL_PORT,
+        user=settings.MYSQL_USER,
+        password=settings.MYSQL_PASSWORD,
+        database=settings.MYSQL_DB,
+        charset="utf8mb4",
+        cursorclass=pymysql.cursors.DictCursor,
+        autocommit=True,
+    )
+    with conn.cursor() as cursor:
+        cursor.execute("SET SESSION lock_wait_timeout = %s", (settings.MIGRATION_LOCK_WAIT_TIMEOUT,))
+        cursor.execute(SCHEMA_VERSION_SQL)
+    return conn
+
+
+def applied_versions(conn) -> Dict[int, Dict]:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version, name, checksum, applied_at FROM schema_version ORDER BY version")
+        return {row["version"]: row for row in cursor.fetchall()}
+
+
+def _run(conn, migration: Migration, direction: str) -> None:
+    statements = migration.up if direction == "up" else migration.down
+    print(f"{direction} {migration.version:04d}_{migration.name}")
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+        if direction == "up":
+            cursor.execute(
+                "INSERT INTO schema_version (version, name, checksum) VALUES (%s, %s, %s)",
+                (migration.version, migration.name, migration.checksum),
+            )
+        else:
+            cursor.execute("DELETE FROM schema_version WHERE version = %s", (migration.version,))
+
+
+def migrate_up(target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations up to and including ``target`` (all when None)."""
+    conn = _connect()
+    try:
+        applied = applied_versions(conn)
+        done = []
+        for migration in load_migrations():
+            if migration.version in applied or (target is not None and migration.version > target):
+                continue
+            _run(conn, migration, "up")
+            done.append(migration.version)
+        return done
+    finally:
+        conn.close()
+
+
+def migrate_down(target: Optional[int] = None) -> List[int]:
+    """Revert applied migrations above ``target``; without a target only the latest one is reverted."""
+    conn = _connect()
+    try:
+        applied = applied_versions(conn)
+        migrations = [m for m in reversed(load_migrations()) if m.version in applied]
+        if target is None:
+            migrations = migrations[:1]
+        else:
+            migrations = [m for m in migrations if m.version > target]
+        done = []
+        for migration in migrations:
+            if not migration.down:
+                raise ValueError(f"migration {migration.version} cannot be reverted")
+            _run(conn, migration, "down")
+            done.append(migration.version)
+        return done
+    finally:
+        conn.close()
+
+
+def status() -> List[Dict]:
+    conn = _connect()
+    try:
+        applied = applied_versions(conn)
+    finally:
+        conn.close()
+    rows = []
+    for migration in load_migrations():
+        row = applied.get(migration.version)
+        state = "pending"
+        if row:
+            state = "applied" if row["checksum"] == migration.checksum else "changed"
+        rows.append({
+            "version": migration.version,
+            "name": migration.name,
+            "state": state,
+            "applied_at": row["applied_at"] if row else None,
+        })
+    return rows
+
+
+def main(argv: List[str]) -> int:
+    if not argv or argv[0] not in ("up", "down", "status"):
+        print(__doc__)
+        return 2
+    target = int(argv[1]) if len(argv) > 1 else None
+    if argv[0] == "up":
+        print(f"applied: {migrate_up(target)}")
+    elif argv[0] == "down":
+        print(f"reverted: {migrate_down(target)}")
+    else:
+        for row in status():
+            print(f"{row['version']:04d} {row['name']:<40} {row['state']:<8} {row['applied_at'] or ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
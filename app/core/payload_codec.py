@@ -0,0 +1,48 @@
+"""Binary encoding for task_payload blobs.
+
+A blob is one format byte followed by compressed compact JSON:
+``FORMAT_ZSTD_JSON`` when the zstandard package is installed, otherwise
+``FORMAT_ZLIB_JSON``. Decoding dispatches on the format byte, so rows
+written under either format stay readable.
+"""
+import importlib.util
+import json
+import logging
+import zlib
+from typing import Any
+
+logger = logging.getLogger("payload_codec")
+
+if importlib.util.find_spec("zstandard") is not None:
+    import zstandard
+else:
+    zstandard = None
+    logger.warning("zstandard is not installed, task payloads fall back to zlib")
+
+FORMAT_ZSTD_JSON = 1
+FORMAT_ZLIB_JSON = 2
+
+_ZSTD_LEVEL = 3
+_ZLIB_LEVEL = 6
+
+
+def encode_payload(value: Any) -> bytes:
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if zstandard is not None:
+        return bytes([FORMAT_ZSTD_JSON]) + zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(raw)
+    return bytes([FORMAT_ZLIB_JSON]) + zlib.compress(raw, _ZLIB_LEVEL)
+
+
+def decode_payload(blob: bytes) -> Any:
+    if not blob:
+        return None
+    fmt, body = blob[0], bytes(blob[1:])
+    if fmt == FORMAT_ZSTD_JSON:
+        if zstandard is None:
+            raise ValueError("payload is zstd-compressed but zstandard is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(body)
+    elif fmt == FORMAT_ZLIB_JSON:
+        raw = zlib.decompress(body)
+    else:
+        raise ValueError(f"unknown payload format {fmt}")
+    return json.loads(raw)
@@ -0,0 +1,125 @@
+"""Redis-first collection progress.
+
+Counters live in the task status hash (what ``/api/task/status`` returns,
+see ``status_cache``) and are advanced by a single Lua script per report,
+so concurrent month fetches never race. Completion is counted in units: one
+per collected month plus a final unit once the payload is persisted. When the last unit
+lands the script marks the hash completed and pushes the analyze job,
+exactly once. ``collect_total``/``collect_completed`` hold units in both
+Redis and MySQL, so progress read from either agrees. MySQL is written
+through the state writer on a cadence and on completion, never per page.
+"""
+import json
+import time
+from typing import Any, Dict
+
+from app.core.config import settings
+from app.core.database import redis_client
+from app.core.state_writer import state_writer
+from app.core.status_cache import FIELD_CODES, VERSION_FIELD, get_status_field, merge_status, status_key, version_seed
+
+# KEYS: status hash, progress hash, analyze queue
+# ARGV: units, rows, pages, now, flush interval, analyze job, progress ttl, status ttl, version seed, events channel
+_REPORT_LUA = """
+local done = redis.call('HINCRBY', KEYS[2], 'done_units', ARGV[1])
+local total = tonumber(redis.call('HGET', KEYS[2], 'total_units') or '0')
+redis.call('HSET', KEYS[1], '{collect_completed}', math.min(done, total))
+local rows = redis.call('HINCRBY', KEYS[2], 'rows', ARGV[2])
+local page = redis.call('HINCRBY', KEYS[1], '{collect_page}', ARGV[3])
+local pct = 0
+if total > 0 then pct = math.min(done / total * 100, 100) end
+redis.call('HSET', KEYS[1], '{collect_progress}', string.format('%.2f%%', pct))
+local completed = 0
+local enqueued = 0
+if total > 0 and done >= total then
+    completed = 1
+    if redis.call('HSETNX', KEYS[2], 'enqueued', 1) == 1 then
+        redis.call('HSET', KEYS[1], '{collect_status}', 'completed', '{status}', 'analyzing')
+        redis.call('LPUSH', KEYS[3], ARGV[6])
+        enqueued = 1
+    end
+end
+if redis.call('HEXISTS', KEYS[1], '{version}') == 0 then redis.call('HSET', KEYS[1], '{version}', ARGV[9]) end
+local version = redis.call('HINCRBY', KEYS[1], '{version}', 1)
+redis.call('PUBLISH', ARGV[10], version)
+redis.call('EXPIRE', KEYS[1], ARGV[8])
+local flush = 0
+local flushed_at = tonumber(redis.call('HGET', KEYS[2], 'flushed_at') or '0')
+if enqueued == 1 or tonumber(ARGV[4]) - flushed_at >= tonumber(ARGV[5]) then
+    redis.call('HSET', KEYS[2], 'flushed_at', ARGV[4])
+    flush = 1
+end
+redis.call('EXPIRE', KEYS[2], ARGV[7])
+return {{done, total, rows, page, completed, enqueued, flush}}
+""".format(version=VERSION_FIELD, **FIELD_CODES)
+
+_report_script = redis_client.register_script(_REPORT_LUA)
+
+
+def _keys(task_id: str) -> tuple:
+    return (
+        status_key(task_id),
+        settings.COLLECT_PROGRESS_KEY.format(task_id=task_id),
+        settings.TASK_QUEUE_ANALYZE,
+    )
+
+
+def start_collect_progress(task_id: str, total_units: int) -> None:
+    """Reset counters for a (re)started collection of ``total_units`` units."""
+    _, progress_key, _ = _keys(task_id)
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(progress_key)
+    pipe.hset(progress_key, mapping={"total_units": total_units, "done_units": 0, "flushed_at": time.time()})
+    pipe.expire(progress_key, settings.COLLECT_PROGRESS_TTL)
+    merge_status(task_id, {
+        "collect_total": total_units,
+        "collect_completed": 0,
+        "collect_page": 0,
+        "collect_progress": "0%",
+        "collect_status": "collecting",
+    }, pipe=pipe)
+    pipe.execute()
+    # Redis already holds these values; mirroring them later could overwrite newer counters
+    state_writer.submit(
+        task_id,
+        {"collect_total": total_units, "collect_completed": 0, "collect_page": 0, "collect_status": "collecting"},
+        cache=False,
+    )
+
+
+def report_collect_progress(task_id: str, user_id: str, rows: int = 0, pages: int = 0, units: int = 0) -> Dict[str, Any]:
+    """Add collected rows/pages/units and return the resulting progress.
+
+    The analyze job is enqueued by the report that completes the last unit;
+    ``enqueued`` is True only for that call.
+    """
+    job = json.dumps({"task_id": task_id, "user_id": user_id})
+    done, total, rows, page, completed, enqueued, flush = _report_script(
+        keys=list(_keys(task_id)),
+        args=[
+            units, rows, pages, time.time(), settings.COLLECT_PROGRESS_FLUSH_INTERVAL, job,
+            settings.COLLECT_PROGRESS_TTL, settings.TASK_STATUS_TTL, version_seed(),
+            settings.TASK_EVENTS_CHANNEL.format(task_id=task_id),
+        ],
+        client=redis_client,
+    )
+    if flush:
+        fields = {"collect_completed": min(done, total), "collect_page": page}
+        if completed:
+            fields.update({"status": "analyzing", "collect_status": "completed"})
+        state_writer.submit(task_id, fields, flush=bool(completed), cache=False)
+    return {
+        "done_units": done,
+        "total_units": total,
+        "collect_completed": min(done, total),
+        "rows": rows,
+        "collect_page": page,
+        "progress": round(min(done / total * 100, 100.0), 2) if total else 0.0,
+        "completed": bool(completed),
+        "enqueued": bool(enqueued),
+    }
+
+
+def collect_completed_in_cache(task_id: str) -> bool:
+    """True once the progress script has marked the collection completed."""
+    return get_status_field(task_id, "collect_status") == "completed"
@@ -0,0 +1,63 @@
+"""JSON rendering for API responses.
+
+With ``ORJSON_RESPONSES`` on and the orjson package installed, responses
+are rendered by orjson, which is several times faster than the stdlib
+encoder on large bodies (wrapped documents, log pages, status batches).
+Values orjson does not know natively go through ``jsonable_encoder``, so
+the output matches what FastAPI produces with the stdlib ``JSONResponse``,
+which remains the fallback.
+"""
+import importlib.util
+import json
+import logging
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+logger = logging.getLogger("responses")
+
+if importlib.util.find_spec("orjson") is not None:
+    import orjson
+else:
+    orjson = None
+    if settings.ORJSON_RESPONSES:
+        logger.warning("orjson is not installed, responses fall back to the stdlib json encoder")
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        # a plain dump, orjson serializes the values itself
+        return value.model_dump()
+    return jsonable_encoder(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson rendering; anything orjson does not serialize goes through jsonable_encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+USE_ORJSON = settings.ORJSON_RESPONSES and orjson is not None
+
+# the app's default_response_class
+JSON_RESPONSE_CLASS = FastJSONResponse if USE_ORJSON else JSONResponse
+
+
+def json_response(content: Any, **kwargs: Any) -> JSONResponse:
+    """A response for ``content`` returned directly, bypassing FastAPI's own encoding pass."""
+    if USE_ORJSON:
+        return FastJSONResponse(content, **kwargs)
+    return JSONResponse(jsonable_encoder(content), **kwargs)
+
+
+def dumps(value: Any) -> str:
+    """Compact JSON for NDJSON lines and stream events; unknown types are rendered with str()."""
+    if USE_ORJSON:
+        # datetimes keep the str() form these lines have always used
+        return orjson.dumps(value, default=str, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
@@ -0,0 +1,28 @@
+import json
+from datetime import date, datetime
+from typing import Any, Dict
+
+
+# MySQL rows carry datetime columns; tag them so cached rows round-trip with their types
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    return obj
+
+
+def dump_row(row: Dict[str, Any]) -> str:
+    return json.dumps(row, default=_encode)
+
+
+def load_row(raw: str) -> Dict[str, Any]:
+    return json.loads(raw, object_hook=_decode)
@@ -0,0 +1,160 @@
+import hashlib
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_MAX_HASH = (1 << 64) - 1
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English-heavy samples
+    return max(1, len(text) // 4)
+
+
+def pack_texts(texts: Iterable[str], token_budget: int) -> List[str]:
+    """Keep texts in order while they fit in the token budget."""
+    packed: List[str] = []
+    used = 0
+    for text in texts:
+        cost = estimate_tokens(text)
+        if used + cost > token_budget:
+            continue
+        packed.append(text)
+        used += cost
+    return packed
+
+
+def _shingles(text: str, size: int) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash_signature(text: str, num_perm: int, shingle_size: int) -> Tuple[int, ...]:
+    shingles = _shingles(text, shingle_size)
+    if not shingles:
+        return tuple([_MAX_HASH] * num_perm)
+    signature = []
+    for seed in range(num_perm):
+        salt = seed.to_bytes(16, "little")
+        signature.append(
+            min(
+                int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8, salt=salt).digest(), "little")
+                for s in shingles
+            )
+        )
+    return tuple(signature)
+
+
+class SampleSelector:
+    """Streaming, diversity-aware picker of sample texts for the LLM context.
+
+    Rows are fed one at a time with ``add`` while they are collected.
+    Near-duplicates are dropped using MinHash signatures bucketed with LSH
+    bands, and the survivors are kept per (month, creator) stratum. The
+    ``max_candidates`` budget is split evenly over ``months``, so months
+    collected first cannot use it up before later ones arrive. ``select``
+    then interleaves strata across months and creators and packs the result
+    into the token budget.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = settings.LLM_CONTEXT_TOKEN_BUDGET,
+        per_stratum: int = settings.SAMPLE_PER_STRATUM,
+        max_candidates: int = settings.SAMPLE_MAX_CANDIDATES,
+        months: int = 12,
+        threshold: float = settings.SAMPLE_DEDUPE_THRESHOLD,
+        num_perm: int = 16,
+        bands: int = 8,
+        shingle_size: int = 2,
+    ) -> None:
+        self.token_budget = token_budget
+        self.per_stratum = per_stratum
+        self.max_candidates = max_candidates
+        self.month_candidates = max(max_candidates // max(months, 1), per_stratum)
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+        self._buckets: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._signatures: List[Tuple[int, ...]] = []
+        self._strata: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+        self._stratum_counts: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._month_counts: Dict[str, int] = defaultdict(int)
+        self.seen = 0
+        self.duplicates = 0
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+        r = self.rows_per_band
+        return [(b, hash(signature[b * r : (b + 1) * r])) for b in range(self.bands)]
+
+    def _is_duplicate(self, signature: Tuple[int, ...], band_keys: List[Tuple[int, int]]) -> bool:
+        checked = set()
+        for key in band_keys:
+            for idx in self._buckets.get(key, ()):
+                if idx in checked:
+                    continue
+                checked.add(idx)
+                other = self._signatures[idx]
+                same = sum(1 for a, b in zip(signature, other) if a == b)
+                if same / self.num_perm >= self.threshold:
+                    return True
+        return False
+
+    def add(self, text: str, watched_at: Optional[datetime] = None, creator: Optional[str] = None) -> bool:
+        """Offer one sample; returns True when it was kept."""
+        if not text:
+            return False
+        self.seen += 1
+        stratum = (watched_at.strftime("%Y-%m") if watched_at else "", str(creator or ""))
+        self._stratum_counts[stratum] += 1
+        if (
+            len(self._strata[stratum]) >= self.per_stratum
+            or self._month_counts[stratum[0]] >= self.month_candidates
+            or len(self._signatures) >= self.max_candidates
+        ):
+            return False
+
+        signature = minhash_signature(text, self.num_perm, self.shingle_size)
+        band_keys = self._band_keys(signature)
+        if self._is_duplicate(signature, band_keys):
+            self.duplicates += 1
+            return False
+
+        idx = len(self._signatures)
+        self._signatures.append(signature)
+        for key in band_keys:
+            self._buckets[key].append(idx)
+        self._strata[stratum].append(text)
+        self._month_counts[stratum[0]] += 1
+        return True
+
+    def _interleaved(self) -> List[str]:
+        # per month: first sample of every creator (busiest first), then the second, ...
+        by_month: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        for stratum in self._strata:
+            by_month[stratum[0]].append(stratum)
+        month_queues: List[List[str]] = []
+        for month in sorted(by_month):
+            strata = sorted(by_month[month], key=lambda s: -self._stratum_counts[s])
+            queue: List[str] = []
+            for i in range(self.per_stratum):
+                queue.extend(self._strata[s][i] for s in strata if i < len(self._strata[s]))
+            month_queues.append(queue)
+
+        # then round-robin across months so no single month dominates
+        ordered: List[str] = []
+        depth = max((len(q) for q in month_queues), default=0)
+        for i in range(depth):
+            ordered.extend(q[i] for q in month_queues if i < len(q))
+        return ordered
+
+    def select(self, token_budget: Optional[int] = None) -> List[str]:
+        return pack_texts(self._interleaved(), token_budget or self.token_budget)
@@ -0,0 +1,258 @@
+import atexit
+import json
+import logging
+import multiprocessing.util
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.core.database import get_mysql_conn, mark_written, redis_client
+from app.core.status_cache import TERMINAL_STATUSES, merge_status
+
+logger = logging.getLogger("state_writer")
+
+# tasks columns that may be written through update_task_status, JSON columns are dumped
+TASK_COLUMNS = {
+    "status": False,
+    "region_verify_status": False,
+    "region_verify_result": True,
+    "region_retry_count": False,
+    "collect_status": False,
+    "collect_total": False,
+    "collect_completed": False,
+    "collect_page": False,
+    "analysis_status": False,
+    "analysis_result": True,
+    "error_msg": False,
+    "email_status": False,
+}
+
+
+def _db_value(column: str, value: Any) -> Any:
+    if TASK_COLUMNS[column] and not isinstance(value, str):
+        return json.dumps(value)
+    return value
+
+
+class TaskStateWriter:
+    """Write-behind buffer for task state.
+
+    Field updates are merged per task and flushed every ``window_ms`` as one
+    multi-row UPDATE per column set plus a single Redis pipeline. Terminal
+    states and explicit ``flush=True`` submissions are written immediately,
+    and pending updates are flushed on interpreter exit. Fields submitted with
+    ``cache=False`` are written to MySQL only, for values Redis already owns.
+
+    When a batched statement fails, the batch is written again task by task;
+    a task whose own update fails is not merged into Redis and goes back to
+    the buffer, for up to ``STATE_WRITER_MAX_ATTEMPTS`` flushes.
+    """
+
+    def __init__(
+        self,
+        window_ms: int = settings.STATE_WRITER_WINDOW_MS,
+        batch_size: int = settings.STATE_WRITER_BATCH_SIZE,
+        max_attempts: int = settings.STATE_WRITER_MAX_ATTEMPTS,
+    ) -> None:
+        self.window = window_ms / 1000.0
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._db_only: Dict[str, Set[str]] = {}
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            if self._pid is not None:
+                # forked child: the parent owns whatever it had buffered
+                self._pending = {}
+                self._db_only = {}
+                self._attempts = {}
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="task-state-writer", daemon=True)
+            self._thread.start()
+            register_exit_flush(self, self.flush)
+
+    def submit(self, task_id: str, fields: Dict[str, Any], flush: bool = False, cache: bool = True) -> None:
+        self._ensure_started()
+        with self._lock:
+            self._pending.setdefault(task_id, {}).update(fields)
+            db_only = self._db_only.setdefault(task_id, set())
+            if cache:
+                db_only.difference_update(fields)
+            else:
+                db_only.update(fields)
+            pending = len(self._pending)
+        if flush or fields.get("status") in TERMINAL_STATUSES or pending >= self.batch_size:
+            self.flush()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.window)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"task state flush failed: {e}")
+
+    def flush(self) -> None:
+        # serialize flushes so an older batch can't land after a newer one
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                db_only, self._db_only = self._db_only, {}
+            if not batch:
+                return
+            failed = self._write_mysql(batch)
+            if failed:
+                # Redis must not get ahead of MySQL for these
+                self._requeue({task_id: batch.pop(task_id) for task_id in failed}, db_only)
+            with self._lock:
+                for task_id in batch:
+                    self._attempts.pop(task_id, None)
+            self._write_redis(batch, db_only)
+            self.flushes += 1
+            self.rows_written += len(batch)
+
+    def write(self, task_id: str, fields: Dict[str, Any]) -> None:
+        """Write one task's fields (and anything pending for it) now; raises when MySQL rejects them."""
+        self._ensure_started()
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending.pop(task_id, {})
+                db_only = self._db_only.pop(task_id, set())
+                self._attempts.pop(task_id, None)
+            batch = {task_id: {**pending, **fields}}
+            try:
+                self._execute(batch)
+            except Exception:
+                if pending:
+                    self._requeue({task_id: pending}, {task_id: db_only})
+                raise
+            self._write_redis(batch, {task_id: db_only - set(fields)})
+            self.rows_written += 1
+
+    def _requeue(self, failed: Dict[str, Dict[str, Any]], db_only: Dict[str, Set[str]]) -> None:
+        with self._lock:
+            for task_id, fields in failed.items():
+                attempts = self._attempts.get(task_id, 0) + 1
+                if attempts >= self.max_attempts:
+                    self._attempts.pop(task_id, None)
+                    self.rows_failed += 1
+                    logger.error(f"task:{task_id} state update dropped after {attempts} attempts: {fields}")
+                    continue
+                self._attempts[task_id] = attempts
+                # fields submitted since the batch was taken are newer
+                newer = self._pending.get(task_id, {})
+                self._pending[task_id] = {**fields, **newer}
+                skip = (db_only.get(task_id, set()) - set(newer)) | self._db_only.get(task_id, set())
+                self._db_only[task_id] = skip
+
+    def _statements(self, batch: Dict[str, Dict[str, Any]]):
+        # tasks sharing the same column set go into one multi-row UPDATE
+        groups: Dict[tuple, List[str]] = {}
+        for task_id, fields in batch.items():
+            columns = tuple(sorted(c for c in fields if c in TASK_COLUMNS))
+            if columns:
+                groups.setdefault(columns, []).append(task_id)
+        for columns, task_ids in groups.items():
+            for i in range(0, len(task_ids), self.batch_size):
+                chunk = task_ids[i : i + self.batch_size]
+                set_parts, values = [], []
+                for column in columns:
+                    cases = " ".join(["WHEN %s THEN %s"] * len(chunk))
+                    set_parts.append(f"{column} = CASE task_id {cases} END")
+                    for task_id in chunk:
+                        values.extend([task_id, _db_value(column, batch[task_id][column])])
+                set_parts.append("update_time = CURRENT_TIMESTAMP")
+                placeholders = ", ".join(["%s"] * len(chunk))
+                values.extend(chunk)
+                yield f"UPDATE tasks SET {', '.join(set_parts)} WHERE task_id IN ({placeholders})", tuple(values)
+
+    def _execute(self, batch: Dict[str, Dict[str, Any]]) -> None:
+        conn = None
+        try:
+            conn = get_mysql_conn()
+            with conn.cursor() as cursor:
+                for sql, values in self._statements(batch):
+                    cursor.execute(sql, values)
+            conn.commit()
+        except Exception:
+            if conn:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            raise
+        finally:
+            if conn:
+                conn.close()
+        mark_written(*(f"task:{task_id}" for task_id in batch))
+
+    def _write_mysql(self, batch: Dict[str, Dict[str, Any]]) -> Set[str]:
+        """Write the batch; returns the task ids whose update failed."""
+        try:
+            self._execute(batch)
+            return set()
+        except Exception as e:
+            if len(batch) == 1:
+                print(f"failed to update task status: {e}")
+                return set(batch)
+            # one bad row must not take the whole window down with it
+            logger.warning(f"batched task state update failed, writing {len(batch)} tasks one by one: {e}")
+        failed = set()
+        for task_id, fields in batch.items():
+            try:
+                self._execute({task_id: fields})
+            except Exception as e:
+                print(f"failed to update task:{task_id} status: {e}")
+                failed.add(task_id)
+        return failed
+
+    def _write_redis(self, batch: Dict[str, Dict[str, Any]], db_only: Dict[str, Set[str]]) -> None:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            now = datetime.now()
+            for task_id, fields in batch.items():
+                skip = db_only.get(task_id, ())
+                mapping = {k: v for k, v in fields.items() if k not in skip}
+                if not mapping:
+                    continue
+                mapping["update_time"] = now
+                merge_status(task_id, mapping, pipe=pipe)
+            pipe.execute()
+        except Exception as e:
+            print(f"failed to update task status cache: {e}")
+
+
+def _raise_system_exit(signum, frame):
+    raise SystemExit(0)
+
+
+def register_exit_flush(owner: Any, flush: Callable[[], None]) -> None:
+    """Run ``flush`` when the current process exits, including SIGTERM and multiprocessing children."""
+    atexit.register(flush)
+    # multiprocessing children skip atexit but run their finalizers
+    multiprocessing.util.Finalize(owner, flush, exitpriority=10)
+    # workers are stopped with SIGTERM; turn it into SystemExit so exit flushes run
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _raise_system_exit)
+
+
+state_writer = TaskStateWriter()
@@ -0,0 +1,286 @@
+"""Task status cache.
+
+One Redis hash per task under ``TASK_STATUS_KEY``. Fields are stored under
+short codes (``FIELD_CODES``) as strings; ``encode_status`` and
+``decode_status`` are the only serializer. Every change goes through
+``merge_status`` (or the progress script), which bumps the ``_v`` version
+counter (seeded from the clock) and refreshes the TTL: ``TASK_STATUS_TTL`` while the task runs,
+``TASK_STATUS_TERMINAL_TTL`` once it is terminal. The new version is
+published on ``TASK_EVENTS_CHANNEL`` for the task streams (``task_events``).
+
+A hash filled from a complete row carries ``_f``. Merges into an expired
+hash leave a partial one, which reads treat as a miss; ``fill_status`` then
+adds the missing fields from MySQL without touching the ones already there,
+and only if ``_v`` has not moved since the read, so a stale row can't
+overwrite newer state.
+"""
+import json
+import time
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import redis_client
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled", "rejected"}
+
+FIELD_CODES = {
+    "task_id": "id",
+    "user_id": "u",
+    "app_user_id": "au",
+    "device_id": "d",
+    "status": "s",
+    "region_verify_status": "rs",
+    "region_verify_result": "rr",
+    "region_retry_count": "rc",
+    "collect_total": "ct",
+    "collect_completed": "cc",
+    "collect_page": "cp",
+    "collect_progress": "pg",
+    "collect_status": "cs",
+    "analysis_status": "as",
+    "analysis_result": "ar",
+    "error_msg": "e",
+    "email_status": "es",
+    "create_time": "t0",
+    "update_time": "t1",
+}
+FIELD_NAMES = {code: field for field, code in FIELD_CODES.items()}
+INT_FIELDS = {"region_retry_count", "collect_total", "collect_completed", "collect_page"}
+JSON_FIELDS = {"region_verify_result", "analysis_result"}
+# row columns that are not status
+SKIP_FIELDS = {"id", "archived_at"}
+
+VERSION_FIELD = "_v"
+FULL_FIELD = "_f"
+
+# status hashes start their version from the clock, so a hash that expired and
+# is written again never repeats a version (and an ETag) it had before
+_SEED_LUA = """
+if redis.call('HEXISTS', KEYS[1], '_v') == 0 then redis.call('HSET', KEYS[1], '_v', ARGV[4]) end
+"""
+
+_TTL_LUA = """
+local ttl = ARGV[1]
+local status = redis.call('HGET', KEYS[1], '%s')
+if status and string.find(ARGV[3], ',' .. status .. ',', 1, true) then ttl = ARGV[2] end
+redis.call('EXPIRE', KEYS[1], ttl)
+""" % FIELD_CODES["status"]
+
+# ARGV: ttl, terminal ttl, terminal statuses, seed, channel, number of pairs, pairs..., fields to delete...
+_MERGE_LUA = """
+local n = tonumber(ARGV[6])
+if n > 0 then
+    local kv = {}
+    for i = 7, 6 + 2 * n do kv[#kv + 1] = ARGV[i] end
+    redis.call('HSET', KEYS[1], unpack(kv))
+end
+if #ARGV > 6 + 2 * n then
+    redis.call('HDEL', KEYS[1], unpack(ARGV, 7 + 2 * n))
+end
+""" + _SEED_LUA + """
+local version = redis.call('HINCRBY', KEYS[1], '_v', 1)
+redis.call('PUBLISH', ARGV[5], version)
+""" + _TTL_LUA + """
+return version
+"""
+
+# ARGV: ttl, terminal ttl, terminal statuses, seed, channel, expected version, pairs...
+_FILL_LUA = """
+local version = tonumber(redis.call('HGET', KEYS[1], '_v') or '0')
+if version ~= tonumber(ARGV[6]) then
+    return 0
+end
+for i = 7, #ARGV, 2 do
+    redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('HSET', KEYS[1], '_f', 1)
+""" + _SEED_LUA + _TTL_LUA + """
+return tonumber(redis.call('HGET', KEYS[1], '_v'))
+"""
+
+# ARGV: ttl, terminal ttl, terminal statuses, seed, channel, field, amount
+_INCR_LUA = """
+redis.call('HINCRBY', KEYS[1], ARGV[6], ARGV[7])
+""" + _SEED_LUA + """
+local version = redis.call('HINCRBY', KEYS[1], '_v', 1)
+redis.call('PUBLISH', ARGV[5], version)
+""" + _TTL_LUA + """
+return version
+"""
+
+_merge_script = redis_client.register_script(_MERGE_LUA)
+_fill_script = redis_client.register_script(_FILL_LUA)
+_incr_script = redis_client.register_script(_INCR_LUA)
+
+
+def status_key(task_id: str) -> str:
+    return settings.TASK_STATUS_KEY.format(task_id=task_id)
+
+
+def field_code(field: str) -> str:
+    return FIELD_CODES.get(field, field)
+
+
+def version_seed() -> int:
+    return int(time.time() * 1000)
+
+
+def _script_args(task_id: str) -> list:
+    return [
+        settings.TASK_STATUS_TTL,
+        settings.TASK_STATUS_TERMINAL_TTL,
+        "," + ",".join(sorted(TERMINAL_STATUSES)) + ",",
+        version_seed(),
+        settings.TASK_EVENTS_CHANNEL.format(task_id=task_id),
+    ]
+
+
+def _encode_value(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_status(fields: Dict[str, Any]) -> Tuple[Dict[str, str], list]:
+    """Return (coded mapping to set, codes to delete); None and "" are stored as absent."""
+    mapping, deleted = {}, []
+    for field, value in fields.items():
+        if field in SKIP_FIELDS:
+            continue
+        encoded = _encode_value(value)
+        if encoded is None:
+            deleted.append(field_code(field))
+        else:
+            mapping[field_code(field)] = encoded
+    return mapping, deleted
+
+
+def decode_status(raw: Dict[str, str]) -> Dict[str, Any]:
+    """Typed status from a coded hash; every known field is present, absent ones are None."""
+    status = dict.fromkeys(FIELD_CODES)
+    for code, value in raw.items():
+        # long names are left in hashes written before the codes existed
+        if code in (VERSION_FIELD, FULL_FIELD) or FIELD_CODES.get(code, code) != code:
+            continue
+        field = FIELD_NAMES.get(code, code)
+        if field in INT_FIELDS:
+            try:
+                value = int(value)
+            except ValueError:
+                pass
+        elif field in JSON_FIELDS:
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        status[field] = value
+    return status
+
+
+def normalize_status(task: Dict[str, Any]) -> Dict[str, Any]:
+    """A MySQL row in the shape ``decode_status`` returns."""
+    return decode_status(encode_status(task)[0])
+
+
+def initial_status(task_id: str, **fields: Any) -> Dict[str, Any]:
+    """Status of a newly created task; pass it to ``fill_status``."""
+    status = {
+        "task_id": task_id,
+        "status": "pending",
+        "region_retry_count": 0,
+        "collect_total": 0,
+        "collect_completed": 0,
+        "collect_page": 0,
+        "collect_progress": "0%",
+        "collect_status": "not_started",
+        "analysis_status": "not_executed",
+    }
+    status.update(fields)
+    return status
+
+
+def _split(raw: Dict[str, str]) -> Tuple[Optional[Dict[str, Any]], int]:
+    version = int(raw.get(VERSION_FIELD, 0) or 0)
+    if not raw or FULL_FIELD not in raw:
+        return None, version
+    return decode_status(raw), version
+
+
+def get_status(task_id: str) -> Tuple[Optional[Dict[str, Any]], int]:
+    """(status, version); status is None for a missing or partial hash."""
+    return _split(redis_client.hgetall(status_key(task_id)))
+
+
+def get_statuses(task_ids: Iterable[str]) -> Dict[str, Tuple[Optional[Dict[str, Any]], int]]:
+    task_ids = list(task_ids)
+    pipe = redis_client.pipeline(transaction=False)
+    for task_id in task_ids:
+        pipe.hgetall(status_key(task_id))
+    return {task_id: _split(raw) for task_id, raw in zip(task_ids, pipe.execute())}
+
+
+def get_status_version(task_id: str) -> Optional[int]:
+    """Version of a complete hash, without reading the fields; None otherwise."""
+    version, full = redis_client.hmget(status_key(task_id), [VERSION_FIELD, FULL_FIELD])
+    if not version or not full:
+        return None
+    return int(version)
+
+
+def get_status_field(task_id: str, field: str) -> Optional[str]:
+    return redis_client.hget(status_key(task_id), field_code(field))
+
+
+def merge_status(task_id: str, fields: Dict[str, Any], pipe=None):
+    """Apply a partial update and bump the version; returns the new version (or the pipe's pending result)."""
+    mapping, deleted = encode_status(fields)
+    pairs = [item for pair in mapping.items() for item in pair]
+    return _merge_script(
+        keys=[status_key(task_id)],
+        args=_script_args(task_id) + [len(mapping)] + pairs + deleted,
+        client=pipe or redis_client,
+    )
+
+
+def fill_status(task_id: str, task: Dict[str, Any], version: int = 0, pipe=None):
+    """Fill the hash from a complete row, unless it changed since ``version`` was read.
+
+    Returns the hash version after the fill, 0 when it was skipped.
+    """
+    mapping, _ = encode_status(task)
+    pairs = [item for pair in mapping.items() for item in pair]
+    return _fill_script(
+        keys=[status_key(task_id)],
+        args=_script_args(task_id) + [version] + pairs,
+        client=pipe or redis_client,
+    )
+
+
+def incr_status_field(task_id: str, field: str, amount: int = 1):
+    return _incr_script(
+        keys=[status_key(task_id)],
+        args=_script_args(task_id) + [field_code(field), amount],
+        client=redis_client,
+    )
+
+
+def get_user_task_id(app_user_id: str) -> Optional[str]:
+    return redis_client.get(settings.USER_TASK_KEY.format(app_user_id=app_user_id))
+
+
+def set_user_task_id(app_user_id: str, task_id: str) -> None:
+    if not app_user_id or not task_id:
+        return
+    try:
+        redis_client.set(settings.USER_TASK_KEY.format(app_user_id=app_user_id), task_id, ex=settings.TASK_STATUS_TTL)
+    except Exception as e:
+        print(f"set user task failed: {e}")
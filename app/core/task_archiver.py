@@ -0,0 +1,94 @@
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.core.config import settings
+from app.core.database import get_mysql_conn, redis_client
+from app.core.status_cache import TERMINAL_STATUSES
+
+# columns copied from tasks into tasks_archive (same names, archived_at defaults to now)
+TASK_ARCHIVE_COLUMNS = (
+    "id", "task_id", "app_user_id", "status", "region_verify_status", "region_verify_result",
+    "region_retry_count", "collect_total", "collect_completed", "collect_page", "collect_status",
+    "analysis_status", "analysis_result", "error_msg", "create_time", "update_time",
+    "device_id", "email_status",
+)
+
+
+# archived tasks are rarely polled; their status hashes are rebuilt from the archive on demand
+def _drop_status_cache(task_ids) -> None:
+    if not task_ids:
+        return
+    try:
+        redis_client.delete(*(settings.TASK_STATUS_KEY.format(task_id=t) for t in task_ids))
+    except Exception as e:
+        print(f"drop archived task status cache failed: {e}")
+
+
+def archive_batch(cutoff: datetime, batch_size: int = settings.TASK_ARCHIVE_BATCH_SIZE) -> int:
+    """Move up to ``batch_size`` terminal tasks last updated before ``cutoff`` into tasks_archive.
+
+    Copy and delete run in one transaction, so a row is never in both tables
+    or in neither. Returns the number of tasks moved.
+    """
+    # the statuses the status cache treats as finished; "finalized" is still in progress
+    statuses = sorted(TERMINAL_STATUSES)
+    conn = None
+    try:
+        conn = get_mysql_conn()
+        with conn.cursor() as cursor:
+            # walks idx_status_update_time; FOR UPDATE keeps late writers off the rows being moved
+            cursor.execute(f"""
+                SELECT id, task_id FROM tasks
+                WHERE status IN ({", ".join(["%s"] * len(statuses))}) AND update_time < %s
+                ORDER BY update_time
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (*statuses, cutoff, batch_size))
+            rows = cursor.fetchall()
+            ids = [row["id"] for row in rows]
+            if not ids:
+                conn.commit()
+                return 0
+            placeholders = ", ".join(["%s"] * len(ids))
+            columns = ", ".join(TASK_ARCHIVE_COLUMNS)
+            # tasks_archive is partitioned on create_time, which must not be NULL there
+            select_columns = columns.replace(
+                "create_time", "COALESCE(create_time, update_time, CURRENT_TIMESTAMP)", 1
+            )
+            cursor.execute(f"""
+                INSERT INTO tasks_archive ({columns})
+                SELECT {select_columns} FROM tasks WHERE id IN ({placeholders})
+            """, tuple(ids))
+            cursor.execute(f"DELETE FROM tasks WHERE id IN ({placeholders})", tuple(ids))
+        conn.commit()
+        _drop_status_cache([row["task_id"] for row in rows if row["task_id"]])
+        return len(ids)
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print(f"archive tasks failed: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+
+def archive_finished_tasks(
+    older_than_days: int = settings.TASK_ARCHIVE_AFTER_DAYS,
+    batch_size: int = settings.TASK_ARCHIVE_BATCH_SIZE,
+    max_batches: int = settings.TASK_ARCHIVE_MAX_BATCHES,
+    pause: float = settings.TASK_ARCHIVE_BATCH_PAUSE_MS / 1000.0,
+    now: Optional[datetime] = None,
+) -> int:
+    """Archive in throttled batches until nothing is left or ``max_batches`` ran; returns rows moved."""
+    cutoff = (now or datetime.now()) - timedelta(days=older_than_days)
+    moved = 0
+    for _ in range(max_batches):
+        count = archive_batch(cutoff, batch_size)
+        moved += count
+        if count < batch_size:
+            break
+        # keep the purge and replication lag caused by each batch from piling up
+        time.sleep(pause)
+    return moved
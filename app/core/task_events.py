@@ -0,0 +1,161 @@
+"""Task status push streams.
+
+Every status cache write publishes the task's new version on
+``TASK_EVENTS_CHANNEL`` (see ``status_cache``). Each API process keeps one
+Redis pub/sub connection, subscribed to the channels of the tasks it is
+streaming, and wakes the local streams of a task when its version moves.
+A stream then sends the current status as a snapshot, so a client that
+missed versions, or resumes from the last one it saw, just gets the latest.
+"""
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.core.status_cache import TERMINAL_STATUSES
+
+logger = logging.getLogger("task_events")
+
+# (status, version), or (None, 0) when the task does not exist
+StatusLoader = Callable[[str], Awaitable[Tuple[Optional[dict], int]]]
+
+
+class TaskEventHub:
+    """Per-process fan-out of task version events to the streams of this process."""
+
+    def __init__(self) -> None:
+        self._streams: Dict[str, Set[asyncio.Queue]] = {}
+        self._client: Optional[aioredis.Redis] = None
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _channel(task_id: str) -> str:
+        return settings.TASK_EVENTS_CHANNEL.format(task_id=task_id)
+
+    async def _connect(self) -> None:
+        if self._client is None:
+            self._client = aioredis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB,
+                password=settings.REDIS_PASSWORD,
+                decode_responses=True,
+            )
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        channels = [self._channel(task_id) for task_id in self._streams]
+        if channels:
+            await self._pubsub.subscribe(*channels)
+
+    async def subscribe(self, task_id: str) -> asyncio.Queue:
+        # one pending wake-up is enough, the stream always reads the latest status
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        async with self._lock:
+            first = task_id not in self._streams
+            self._streams.setdefault(task_id, set()).add(queue)
+            if self._pubsub is None:
+                await self._connect()
+            elif first:
+                await self._pubsub.subscribe(self._channel(task_id))
+            # started once the connection is subscribed, get_message needs it
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read())
+        return queue
+
+    async def unsubscribe(self, task_id: str, queue: asyncio.Queue) -> None:
+        async with self._lock:
+            queues = self._streams.get(task_id)
+            if queues is None:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self._streams[task_id]
+                try:
+                    await self._pubsub.unsubscribe(self._channel(task_id))
+                except Exception as e:
+                    logger.warning(f"unsubscribe task:{task_id} events failed: {e}")
+
+    async def _read(self) -> None:
+        prefix, suffix = settings.TASK_EVENTS_CHANNEL.split("{task_id}")
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # streams keep sending heartbeats meanwhile
+                logger.warning(f"task events listener failed, reconnecting: {e}")
+                await asyncio.sleep(1.0)
+                try:
+                    async with self._lock:
+                        await self._connect()
+                except Exception as e:
+                    logger.warning(f"task events reconnect failed: {e}")
+                continue
+            if not message:
+                async with self._lock:
+                    # idle with no streams left: the next subscribe starts a new reader
+                    if not self._streams:
+                        self._reader = None
+                        return
+                continue
+            if message.get("type") != "message":
+                continue
+            channel = message["channel"]
+            task_id = channel[len(prefix):len(channel) - len(suffix)]
+            for queue in list(self._streams.get(task_id, ())):
+                if queue.empty():
+                    queue.put_nowait(message["data"])
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def stream(
+        self, task_id: str, load_status: StatusLoader, since: Optional[int] = None
+    ) -> AsyncIterator[Optional[Tuple[int, dict]]]:
+        """Yield (version, status) whenever the task moves past ``since``, None as a heartbeat.
+
+        Ends after a terminal status or ``TASK_STREAM_MAX_SECONDS``.
+        """
+        # subscribe before the first read so no version lands in between unseen
+        queue = await self.subscribe(task_id)
+        deadline = time.monotonic() + settings.TASK_STREAM_MAX_SECONDS
+        try:
+            while True:
+                status, version = await load_status(task_id)
+                if status is not None:
+                    if since is None or version > since:
+                        since = version
+                        yield version, status
+                    # a client resuming after the terminal event gets nothing more to wait for
+                    if status.get("status") in TERMINAL_STATUSES:
+                        return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=min(settings.TASK_STREAM_HEARTBEAT, remaining))
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            await self.unsubscribe(task_id, queue)
+
+
+task_event_hub = TaskEventHub()
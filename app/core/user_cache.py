@@ -0,0 +1,110 @@
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from app.core.config import settings
+from app.core.database import redis_client
+from app.core.row_codec import dump_row, load_row
+
+logger = logging.getLogger("user_cache")
+
+# users rows memoized for the current request, set by request_scope()
+_request_memo: ContextVar[Optional[Dict[str, Dict[str, Any]]]] = ContextVar("user_request_memo", default=None)
+
+
+class UserCache:
+    """Read-through cache for ``users`` rows.
+
+    A row is looked up in the per-request memo first, then in Redis (short
+    TTL), then loaded from MySQL by the caller. Writers call ``invalidate``
+    after committing; reads that must see the latest row pass
+    ``consistent=True`` to the model functions, which skip both layers.
+    """
+
+    def __init__(self, ttl: int = settings.USER_CACHE_TTL, enabled: bool = settings.USER_CACHE_ENABLED) -> None:
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counters = {"memo_hits": 0, "redis_hits": 0, "misses": 0, "bypassed": 0, "invalidations": 0, "errors": 0}
+
+    def _key(self, app_user_id: str) -> str:
+        return settings.USER_CACHE_KEY.format(app_user_id=app_user_id)
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            self.counters[field] += 1
+
+    def get(self, app_user_id: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled or not app_user_id:
+            return None
+        memo = _request_memo.get()
+        if memo is not None and app_user_id in memo:
+            self._count("memo_hits")
+            # callers mutate the returned row, so the memo hands out copies
+            return dict(memo[app_user_id])
+        try:
+            raw = redis_client.get(self._key(app_user_id))
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"user cache read failed: {e}")
+            raw = None
+        if raw is None:
+            self._count("misses")
+            return None
+        self._count("redis_hits")
+        user = load_row(raw)
+        if memo is not None:
+            memo[app_user_id] = dict(user)
+        return user
+
+    def set(self, app_user_id: str, user: Optional[Dict[str, Any]]) -> None:
+        # missing users aren't cached, so a freshly created user is visible immediately
+        if not self.enabled or not app_user_id or not user:
+            return
+        memo = _request_memo.get()
+        if memo is not None:
+            memo[app_user_id] = dict(user)
+        try:
+            redis_client.set(self._key(app_user_id), dump_row(user), ex=self.ttl)
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"user cache write failed: {e}")
+
+    def bypass(self) -> None:
+        self._count("bypassed")
+
+    def invalidate(self, app_user_id: str) -> None:
+        if not app_user_id:
+            return
+        memo = _request_memo.get()
+        if memo is not None:
+            memo.pop(app_user_id, None)
+        self._count("invalidations")
+        try:
+            redis_client.delete(self._key(app_user_id))
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"user cache invalidation failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters["memo_hits"] + counters["redis_hits"] + counters["misses"]
+        hits = counters["memo_hits"] + counters["redis_hits"]
+        counters["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return counters
+
+
+@contextmanager
+def request_scope() -> Iterator[None]:
+    """Memoize users rows until the block exits; entered once per HTTP request."""
+    token = _request_memo.set({})
+    try:
+        yield
+    finally:
+        _request_memo.reset(token)
+
+
+user_cache = UserCache()
@@ -7,12 +7,17 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 import requests
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, RetryCallState
 from app.core.config import settings
-from app.core.database import get_mysql_conn, redis_client
+from app.core.database import get_mysql_conn, get_async_mysql_conn
+from app.core.state_writer import state_writer
+from app.core.status_cache import incr_status_field
+from app.core.log_sink import api_log_sink
 
 # generate unique task ID
 def generate_task_id():
     return f"task_{uuid.uuid4().hex[:16]}"
 
+DEFAULT_RETRY_STRATEGY = {"max_retry_count": 3, "initial_delay": 1.0, "max_delay": 10.0, "multiplier": 2.0}
+
 # get retry strategy from DB
 def get_retry_strategy(api_type):
     conn = None
@@ -24,41 +29,65 @@ def get_retry_strategy(api_type):
                 FROM retry_strategies WHERE api_type = %s
             """, (api_type,))
             strategy = cursor.fetchone()
-        return strategy or {
-            "max_retry_count": 3,
-            "initial_delay": 1.0,
-            "max_delay": 10.0,
-            "multiplier": 2.0
-        }
+        return strategy or dict(DEFAULT_RETRY_STRATEGY)
     except Exception as e:
         print(f"failed to get retry strategy: {e}")
-        return {"max_retry_count":3, "initial_delay":1.0, "max_delay":10.0, "multiplier":2.0}
+        return dict(DEFAULT_RETRY_STRATEGY)
     finally:
         if conn:
             conn.close()  
 
-# log API call details
-def log_api_call(task_id, api_type, request_url, request_params, request_headers, 
-                 response_code, response_data, cost_time, status, error_detail="", retry_count=0):
-    conn = None
+async def get_retry_strategy_async(api_type):
     try:
-        conn = get_mysql_conn()
-        with conn.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO api_call_logs 
-                (task_id, api_type, request_url, request_params, request_headers, 
-                 response_code, response_data, cost_time, status, error_detail, retry_count)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                task_id, api_type, request_url, json.dumps(request_params), json.dumps(request_headers),
-                response_code, json.dumps(response_data), cost_time, status, error_detail, retry_count
-            ))
-        conn.commit()
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    SELECT max_retry_count, initial_delay, max_delay, multiplier 
+                    FROM retry_strategies WHERE api_type = %s
+                """, (api_type,))
+                strategy = await cursor.fetchone()
+        return strategy or dict(DEFAULT_RETRY_STRATEGY)
     except Exception as e:
-        print(f"record API call log failed: {e}")
-    finally:
-        if conn:
-            conn.close()
+        print(f"failed to get retry strategy: {e}")
+        return dict(DEFAULT_RETRY_STRATEGY)
+
+# get the strategies for several api types in one query, defaults fill the missing ones
+async def get_retry_strategies_async(api_types):
+    api_types = list(dict.fromkeys(api_types))
+    strategies = {}
+    if not api_types:
+        return strategies
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(f"""
+                    SELECT api_type, max_retry_count, initial_delay, max_delay, multiplier
+                    FROM retry_strategies WHERE api_type IN ({", ".join(["%s"] * len(api_types))})
+                """, tuple(api_types))
+                for row in await cursor.fetchall():
+                    strategies[row.pop("api_type")] = row
+    except Exception as e:
+        print(f"failed to get retry strategies: {e}")
+    for api_type in api_types:
+        strategies.setdefault(api_type, dict(DEFAULT_RETRY_STRATEGY))
+    return strategies
+
+# log API call details, queued and bulk-inserted by the api log sink
+def log_api_call(task_id, api_type, request_url, request_params, request_headers, 
+                 response_code, response_data, cost_time, status, error_detail="", retry_count=0):
+    api_log_sink.submit({
+        "task_id": task_id,
+        "api_type": api_type,
+        "request_url": request_url,
+        "request_params": request_params,
+        "request_headers": request_headers,
+        "response_code": response_code,
+        "response_data": response_data,
+        "cost_time": cost_time,
+        "status": status,
+        "error_detail": error_detail,
+        "retry_count": retry_count,
+    })
 
 # callback to update retry count in DB and Redis
 def region_verify_retry_callback(retry_state: RetryCallState):
@@ -74,8 +103,7 @@ def region_verify_retry_callback(retry_state: RetryCallState):
                     WHERE task_id = %s
                 """, (task_id,))
             conn.commit()
-            redis_key = settings.TASK_STATUS_KEY.format(task_id=task_id)
-            redis_client.hincrby(redis_key, "region_retry_count", 1)
+            incr_status_field(task_id, "region_retry_count")
         except Exception as e:
             print(f"failed toupdate retry count: {e}")
         finally:
@@ -107,7 +135,8 @@ def call_api_with_retry(api_type, task_id, url, method="GET",  params = None, he
         before_sleep=region_verify_retry_callback if api_type == "region_verify" else None
     )
     def _call_api():
-        nonlocal retry_count
+        # the logged row records the last attempt's status, code and body (capped by log_capture)
+        nonlocal retry_count, response_code, response_data, status, error_detail
         retry_count += 1
         try:
             if method.lower() == "get":
@@ -124,6 +153,7 @@ def call_api_with_retry(api_type, task_id, url, method="GET",  params = None, he
                 error_detail = f"status code: {response.status_code}, content: {response.text}"
                 raise Exception(error_detail)
 
+            status = "success"
             return response_data, response_code
        
         except requests.exceptions.Timeout:
@@ -140,7 +170,7 @@ def call_api_with_retry(api_type, task_id, url, method="GET",  params = None, he
             raise
 
     try:
-        response_data = _call_api()
+        result = _call_api()
     except Exception as e:
         error_detail = str(e)
         raise
@@ -151,112 +181,8 @@ def call_api_with_retry(api_type, task_id, url, method="GET",  params = None, he
             response_code, response_data, cost_time, status, error_detail, retry_count-1
         )
 
-    return response_data
-
-# update task status in DB and Redis
-def update_task_status(task_id, status, **kwargs):
-    conn = None
-    try:
-        conn = get_mysql_conn()
-        with conn.cursor() as cursor:
-            update_fields = ["status = %s", "update_time = CURRENT_TIMESTAMP"]
-            update_values = [status]
-
-            for key, value in kwargs.items():
-                if key == "region_verify_status":
-                    update_fields.append("region_verify_status = %s")
-                    update_values.append(value)
-                elif key == "region_verify_result":
-                    update_fields.append("region_verify_result = %s")
-                    update_values.append(json.dumps(value))
-                elif key == "collect_status":
-                    update_fields.append("collect_status = %s")
-                    update_values.append(value)
-                elif key == "collect_total":
-                    update_fields.append("collect_total = %s")
-                    update_values.append(value)
-                elif key == "collect_completed":
-                    update_fields.append("collect_completed = %s")
-                    update_values.append(value)
-                elif key == "collect_page":
-                    update_fields.append("collect_page = %s")
-                    update_values.append(value)
-                elif key == "analysis_status":
-                    update_fields.append("analysis_status = %s")
-                    update_values.append(value)
-                elif key == "analysis_result":
-                    update_fields.append("analysis_result = %s")
-                    update_values.append(json.dumps(value))
-                elif key == "error_msg":
-                    update_fields.append("error_msg = %s")
-                    update_values.append(value)
-                elif key == "region_retry_count":
-                    update_fields.append("region_retry_count = %s")
-                    update_values.append(value)
+    return result
 
-            update_sql = f"UPDATE tasks SET {', '.join(update_fields)} WHERE task_id = %s"
-            update_values.append(task_id)
-            cursor.execute(update_sql, tuple(update_values))
-        conn.commit()
-    except Exception as e:
-        print(f"failed to update task status: {e}")
-    finally:
-        if conn:
-            conn.close()
-
-    # update Redis cache
-    redis_key = settings.TASK_STATUS_KEY.format(task_id=task_id)
-    redis_client.hset(redis_key, mapping={
-        "status": status,
-        "update_time": str(time.time()),
-        **kwargs
-    })
-
-# update collection progress
-def update_collect_progress(task_id, page, collected_count):
-    conn = None
-    try:
-        conn = get_mysql_conn()
-        with conn.cursor() as cursor:
-            # update collected count and page
-            cursor.execute("""
-                UPDATE tasks SET collect_page = %s, collect_completed = collect_completed + %s,
-                            update_time = CURRENT_TIMESTAMP
-                WHERE task_id = %s
-            """, (page, collected_count, task_id))
-            
-            # check if collection is completed
-            cursor.execute("""
-                SELECT collect_total, collect_completed FROM tasks WHERE task_id = %s
-            """, (task_id,))
-            progress = cursor.fetchone()
-            is_completed = progress["collect_completed"] >= progress["collect_total"]
-            
-            if is_completed:
-                cursor.execute("""
-                    UPDATE tasks SET collect_status = 'completed', update_time = CURRENT_TIMESTAMP
-                    WHERE task_id = %s
-                """, (task_id,))
-        conn.commit()
-
-        # update Redis cache
-        redis_key = settings.TASK_STATUS_KEY.format(task_id=task_id)
-        redis_client.hincrby(redis_key, "collect_completed", collected_count)
-        redis_client.hset(redis_key, "collect_page", page)
-        
-        if progress["collect_total"] > 0:
-            progress_percent = round(progress["collect_completed"]/progress["collect_total"]*100, 2)
-            redis_client.hset(redis_key, "collect_progress", f"{progress_percent}%")
-        
-        if is_completed:
-            redis_client.hset(redis_key, "collect_status", "completed")
-            # enqueue analysis task
-            redis_client.lpush(settings.TASK_QUEUE_ANALYZE, json.dumps({"task_id": task_id}))
-        
-        return is_completed
-    except Exception as e:
-        print(f"failed to update collection progress: {e}")
-        raise e
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+# update task status in DB and Redis, buffered and coalesced by the state writer
+def update_task_status(task_id, status, flush=False, **kwargs):
+    state_writer.submit(task_id, {"status": status, **kwargs}, flush=flush)
@@ -7,8 +7,8 @@ import sys
 from app.core.config import settings
 from app.core.database import redis_client, get_task_lock, get_mysql_conn
 from app.core.utils import update_task_status, call_api_with_retry
-from app.models.task import update_verify_task_status
-from app.models.user import update_user_available
+from app.models.task import update_verify_task_status_async
+from app.models.user import update_user_available_async
 from app.core.archive_client import ArchiveClient
 
 archive_client = ArchiveClient()
@@ -37,7 +37,7 @@ async def verify_user_region(user, task_id = None, auto_enqueue=True):
     print(redis_resp)
     if user['is_watch_history_available'] != "yes" and auto_enqueue:
         user['is_watch_history_available'] = "no"    
-    update_user_available(user['app_user_id'], user['is_watch_history_available'])
+    await update_user_available_async(user['app_user_id'], user['is_watch_history_available'])
     if task_id:
-        update_verify_task_status(task_id)
+        await update_verify_task_status_async(task_id)
     return user.get('is_watch_history_available'), result, ""
@@ -0,0 +1,132 @@
+"""Materialized wrapped documents.
+
+When a task completes, the analyze worker assembles the user's
+``WrappedStatusResponse`` once, from ``analysis_result`` and the summary in
+the task payload, and stores it gzip-compressed under ``WRAPPED_CACHE_KEY``
+together with a hash of the uncompressed JSON. ``/link/tiktok/wrapped``
+serves those bytes as they are, with the hash as ETag, so reads touch
+neither MySQL nor the serializer. The URL is per user and a new run
+replaces its document, so clients revalidate every time (a 304 while the
+hash holds), and the document is deleted as soon as a new run starts.
+"""
+import gzip
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.core.accessories import select_accessory_set
+from app.core.config import settings
+from app.core.database import get_redis_bytes_client
+from app.core.etag import CACHE_CONTROL
+from app.core.schema import WrappedStatusResponse
+
+logger = logging.getLogger("wrapped_cache")
+
+BODY_FIELD = "b"
+HASH_FIELD = "h"
+TASK_FIELD = "t"
+
+# payload fields that only the analysis needs
+_SKIP_FIELDS = {"_sample_texts", "top_hashtags"}
+
+
+def _key(app_user_id: str) -> str:
+    return settings.WRAPPED_CACHE_KEY.format(app_user_id=app_user_id)
+
+
+def _etag(content_hash: str) -> str:
+    # weak: the same document is sent gzip-encoded or not
+    return f'W/"{content_hash}"'
+
+
+def _accessory_set() -> Dict[str, Any]:
+    try:
+        return select_accessory_set()
+    except OSError as e:
+        logger.warning(f"accessory items unavailable, using the default set: {e}")
+        default = {"item_id": "unknown", "set_series": "unknown", "quality": "Common", "reason": "Default accessory set"}
+        return {slot: dict(default, display_name=slot.title()) for slot in ("head", "body", "other")}
+
+
+def build_wrapped(task_id: str, summary: Dict[str, Any], analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+    """The ready response for a completed task; raises ValueError when a field is missing."""
+    wrapped = {k: v for k, v in (summary or {}).items() if k not in _SKIP_FIELDS}
+    wrapped.update(analysis_result or {})
+    if not wrapped.get("accessory_set"):
+        wrapped["accessory_set"] = _accessory_set()
+    document = WrappedStatusResponse(status="ready", wrapped_run_id=task_id, wrapped=wrapped)
+    return document.model_dump(mode="json")
+
+
+def encode_wrapped(document: Dict[str, Any]) -> Tuple[bytes, str]:
+    """(gzip body, content hash) of a document."""
+    raw = json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    # mtime=0 keeps the compressed bytes identical for identical documents
+    return gzip.compress(raw, compresslevel=9, mtime=0), hashlib.sha256(raw).hexdigest()[:32]
+
+
+def store_wrapped(app_user_id: str, task_id: str, document: Dict[str, Any]) -> Tuple[bytes, str]:
+    """Store a document for ``app_user_id``; returns (gzip body, ETag)."""
+    body, content_hash = encode_wrapped(document)
+    pipe = get_redis_bytes_client().pipeline(transaction=True)
+    pipe.hset(_key(app_user_id), mapping={BODY_FIELD: body, HASH_FIELD: content_hash, TASK_FIELD: task_id})
+    pipe.expire(_key(app_user_id), settings.WRAPPED_CACHE_TTL)
+    pipe.execute()
+    return body, _etag(content_hash)
+
+
+def materialize_wrapped(
+    task_id: str, app_user_id: str, summary: Dict[str, Any], analysis_result: Dict[str, Any]
+) -> Optional[Tuple[bytes, str]]:
+    """Build and store the document of a completed task; None when it could not be built."""
+    if not app_user_id:
+        return None
+    try:
+        return store_wrapped(app_user_id, task_id, build_wrapped(task_id, summary, analysis_result))
+    except Exception as e:
+        # the request path rebuilds it from MySQL
+        logger.warning(f"task:{task_id} wrapped document not materialized: {e}")
+        return None
+
+
+def invalidate_wrapped(app_user_id: str, task_id: Optional[str] = None) -> None:
+    """Drop the user's document when a new run starts; with ``task_id``, only that run's."""
+    if not app_user_id:
+        return
+    try:
+        client = get_redis_bytes_client()
+        if task_id is not None:
+            stored = client.hget(_key(app_user_id), TASK_FIELD)
+            if stored is None or stored.decode() != task_id:
+                return
+        client.delete(_key(app_user_id))
+    except Exception as e:
+        logger.warning(f"invalidate wrapped document of {app_user_id} failed: {e}")
+
+
+def get_wrapped(app_user_id: str) -> Optional[Tuple[bytes, str]]:
+    """(gzip body, ETag) of the stored document."""
+    body, content_hash = get_redis_bytes_client().hmget(_key(app_user_id), [BODY_FIELD, HASH_FIELD])
+    if not body or not content_hash:
+        return None
+    return body, _etag(content_hash.decode())
+
+
+def load_wrapped(app_user_id: str) -> Optional[Dict[str, Any]]:
+    cached = get_wrapped(app_user_id)
+    if cached is None:
+        return None
+    return json.loads(gzip.decompress(cached[0]))
+
+
+def wrapped_response(request: Request, body: bytes, etag: str) -> Response:
+    """The stored bytes as they are, decompressed only for clients that do not accept gzip."""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        body = gzip.decompress(body)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,16 +1,43 @@
-from app.core.database import get_mysql_conn
+from app.core.database import get_mysql_conn, get_async_mysql_conn
 
-# query task API call logs
-def get_task_api_logs(task_id):
+# columns a log query may project; bodies are only read when asked for
+API_LOG_FIELDS = (
+    "log_id", "api_type", "request_url", "request_params", "response_code", "response_data",
+    "cost_time", "status", "error_detail", "retry_count", "call_time",
+)
+API_LOG_BODY_FIELDS = ("request_params", "response_data")
+API_LOG_DEFAULT_FIELDS = tuple(f for f in API_LOG_FIELDS if f not in API_LOG_BODY_FIELDS)
+
+def _logs_query(task_id, before_id=None, limit=None, api_type=None, status=None, fields=None):
+    fields = [f for f in API_LOG_FIELDS if f in (fields or API_LOG_DEFAULT_FIELDS)]
+    if "log_id" not in fields:
+        # the page cursor
+        fields.insert(0, "log_id")
+    sql = f"SELECT {', '.join(fields)} FROM api_call_logs WHERE task_id = %s"
+    params = [task_id]
+    if before_id is not None:
+        sql += " AND log_id < %s"
+        params.append(before_id)
+    if api_type:
+        sql += " AND api_type = %s"
+        params.append(api_type)
+    if status:
+        sql += " AND status = %s"
+        params.append(status)
+    # keyset order on idx_task_log_id, newest first
+    sql += " ORDER BY log_id DESC"
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, tuple(params)
+
+# query task API call logs; newest first, pass the last log_id as before_id for the next page
+def get_task_api_logs(task_id, before_id=None, limit=None, api_type=None, status=None, fields=None):
     conn = None
     try:
-        conn = get_mysql_conn()
+        conn = get_mysql_conn(readonly=True)
         with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT log_id, api_type, request_url, request_params, response_data,
-                    cost_time, status, error_detail, retry_count, call_time
-                FROM api_call_logs WHERE task_id = %s ORDER BY call_time DESC
-            """, (task_id,))
+            cursor.execute(*_logs_query(task_id, before_id, limit, api_type, status, fields))
             logs = cursor.fetchall()
     except Exception as e:
         print(f"query task API logs failed: {e}")
@@ -19,4 +46,15 @@ def get_task_api_logs(task_id):
     finally:
         if conn:
             conn.close()
-    return logs
\ No newline at end of file
+    return logs
+
+async def get_task_api_logs_async(task_id, before_id=None, limit=None, api_type=None, status=None, fields=None):
+    try:
+        async with get_async_mysql_conn(readonly=True) as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(*_logs_query(task_id, before_id, limit, api_type, status, fields))
+                logs = await cursor.fetchall()
+    except Exception as e:
+        print(f"query task API logs failed: {e}")
+        raise e
+    return logs
@@ -1,5 +1,5 @@
 
-from app.core.database import get_mysql_conn
+from app.core.database import get_mysql_conn, get_async_mysql_conn, redis_client
 import hashlib
 import secrets
 from datetime import datetime, timedelta, timezone
@@ -9,12 +9,56 @@ from fastapi import HTTPException, status
 
 from app.core.crypto import encrypt
 from app.core.config import Settings
+from app.core.row_codec import dump_row, load_row
 
 def parse_bearer(auth_header: str) -> str:
     if not auth_header.lower().startswith("bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="missing_bearer")
     return auth_header.split(" ", 1)[1]
 
+def _as_utc(value: datetime) -> datetime:
+    # pymysql returns naive datetimes; the columns are written in UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def _session_cache_key(token_hash: str) -> str:
+    return Settings.SESSION_CACHE_KEY.format(token_hash=token_hash)
+
+def _cached_session(token_hash: str, device_id: str, now: datetime):
+    try:
+        raw = redis_client.get(_session_cache_key(token_hash))
+    except Exception as e:
+        print(f"read session cache failed: {e}")
+        return None
+    if not raw:
+        return None
+    rec = load_row(raw)
+    if rec.get("device_id") != device_id or _as_utc(rec["expires_at"]) <= now:
+        return None
+    return rec
+
+def _cache_session(token_hash: str, rec: dict, now: datetime):
+    ttl = min(Settings.SESSION_CACHE_TTL, int((_as_utc(rec["expires_at"]) - now).total_seconds()))
+    if ttl <= 0:
+        return
+    try:
+        cached = {k: v for k, v in rec.items() if k != "token_encrypted"}
+        redis_client.set(_session_cache_key(token_hash), dump_row(cached), ex=ttl)
+    except Exception as e:
+        print(f"write session cache failed: {e}")
+
+def purge_session_cache(token_hash: str):
+    if not token_hash:
+        return
+    try:
+        redis_client.delete(_session_cache_key(token_hash))
+    except Exception as e:
+        print(f"purge session cache failed: {e}")
+
+# the sliding expiry is only written once it has fallen SESSION_REFRESH_INTERVAL behind
+def _needs_refresh(rec: dict, now: datetime) -> bool:
+    full_expiry = now + timedelta(days=Settings.SESSION_TTL_DAYS)
+    return _as_utc(rec["expires_at"]) < full_expiry - timedelta(seconds=Settings.SESSION_REFRESH_INTERVAL)
+
 def create_or_rotate(app_user_id: str, device_id: str, platform: str, app_version: str, os_version: str) -> tuple[str, str]:
     conn = None
     now = datetime.now(timezone.utc)
@@ -44,7 +88,9 @@ def create_or_rotate(app_user_id: str, device_id: str, platform: str, app_versio
                     WHERE session_id = %s
                 """, (token_hash, token_encrypted, now,  expires_at, platform, app_version, os_version, session_id))
         conn.commit()
-      
+        # after the commit, so a concurrent validate can't cache the old row again
+        if session:
+            purge_session_cache(session.get("token_hash"))
     except Exception as e:
         print(f"create or rotate session failed: {e}")
         raise e
@@ -53,31 +99,153 @@ def create_or_rotate(app_user_id: str, device_id: str, platform: str, app_versio
             conn.close()
     return session_id, expires_at
 
+async def create_or_rotate_async(app_user_id: str, device_id: str, platform: str, app_version: str, os_version: str) -> tuple[str, str]:
+    now = datetime.now(timezone.utc)
+    token = secrets.token_urlsafe(32)
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    expires_at = now + timedelta(days=Settings.SESSION_TTL_DAYS)
+    token_encrypted = encrypt(token, Settings.SECRET_KEY)
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    SELECT * FROM app_sessions WHERE app_user_id = %s AND device_id = %s AND revoked_at IS NULL
+                """, (app_user_id, device_id))
+                session = await cursor.fetchone()
+                if not session:
+                    session_id = secrets.token_urlsafe(16)
+                    await cursor.execute("""
+                        INSERT INTO app_sessions (session_id, app_user_id, device_id, platform, app_version, os_version, expires_at)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """, (session_id, app_user_id, device_id, platform, app_version, os_version, expires_at))
+                else:
+                    session_id = session["session_id"]
+                    await cursor.execute("""
+                        UPDATE app_sessions
+                        SET token_hash = %s, token_encrypted = %s, issued_at = %s, expires_at = %s, platform = %s, app_version = %s, os_version = %s
+                        WHERE session_id = %s
+                    """, (token_hash, token_encrypted, now,  expires_at, platform, app_version, os_version, session_id))
+            await conn.commit()
+        if session:
+            purge_session_cache(session.get("token_hash"))
+    except Exception as e:
+        print(f"create or rotate session failed: {e}")
+        raise e
+    return session_id, expires_at
+
 def validate(token: str, device_id: str) -> dict:
     token_hash = hashlib.sha256(token.encode()).hexdigest()
+    now = datetime.now(timezone.utc)
+    rec = _cached_session(token_hash, device_id, now)
+    if rec and not _needs_refresh(rec, now):
+        return rec
+    conn = None
     try:
         conn = get_mysql_conn()
         with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT * FROM app_sessions WHERE token_hash = %s AND device_id = %s AND revoked_at IS NULL AND expires_at > %s
-            """, (token_hash, device_id, datetime.now(timezone.utc)))
-            rec = cursor.fetchone()
             if not rec:
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid_session")
+                cursor.execute("""
+                    SELECT * FROM app_sessions WHERE token_hash = %s AND device_id = %s AND revoked_at IS NULL AND expires_at > %s
+                """, (token_hash, device_id, now))
+                rec = cursor.fetchone()
+                if not rec:
+                    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid_session")
 
             # sliding TTL
-            rec['expires_at'] = datetime.now(timezone.utc) + timedelta(days=Settings.SESSION_TTL_DAYS)
-            with conn.cursor() as cursor:
+            if _needs_refresh(rec, now):
+                rec['expires_at'] = now + timedelta(days=Settings.SESSION_TTL_DAYS)
                 cursor.execute("""
                     UPDATE app_sessions
                     SET expires_at = %s
-                    WHERE session_id = %s
-                """, (rec['expires_at'], rec["session_id"]))
-        conn.commit()
+                    WHERE session_id = %s AND token_hash = %s AND revoked_at IS NULL
+                """, (rec['expires_at'], rec["session_id"], token_hash))
+                conn.commit()
+                # a cached record whose session was revoked or rotated since
+                if cursor.rowcount == 0:
+                    purge_session_cache(token_hash)
+                    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid_session")
     except Exception as e:
         print(f"validate session failed: {e}")
         raise e
     finally:
         if conn:    
             conn.close()
-    return rec
\ No newline at end of file
+    _cache_session(token_hash, rec, now)
+    return rec
+
+async def validate_async(token: str, device_id: str) -> dict:
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    now = datetime.now(timezone.utc)
+    rec = _cached_session(token_hash, device_id, now)
+    if rec and not _needs_refresh(rec, now):
+        return rec
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                if not rec:
+                    await cursor.execute("""
+                        SELECT * FROM app_sessions WHERE token_hash = %s AND device_id = %s AND revoked_at IS NULL AND expires_at > %s
+                    """, (token_hash, device_id, now))
+                    rec = await cursor.fetchone()
+                    if not rec:
+                        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid_session")
+
+                # sliding TTL
+                if _needs_refresh(rec, now):
+                    rec['expires_at'] = now + timedelta(days=Settings.SESSION_TTL_DAYS)
+                    await cursor.execute("""
+                        UPDATE app_sessions
+                        SET expires_at = %s
+                        WHERE session_id = %s AND token_hash = %s AND revoked_at IS NULL
+                    """, (rec['expires_at'], rec["session_id"], token_hash))
+                    await conn.commit()
+                    # a cached record whose session was revoked or rotated since
+                    if cursor.rowcount == 0:
+                        purge_session_cache(token_hash)
+                        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid_session")
+    except Exception as e:
+        print(f"validate session failed: {e}")
+        raise e
+    _cache_session(token_hash, rec, now)
+    return rec
+
+# revoke a session; its cached validation is purged so the token stops working immediately
+def revoke(session_id: str):
+    conn = None
+    try:
+        conn = get_mysql_conn()
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT token_hash FROM app_sessions WHERE session_id = %s
+            """, (session_id,))
+            rec = cursor.fetchone()
+            cursor.execute("""
+                UPDATE app_sessions SET revoked_at = %s WHERE session_id = %s AND revoked_at IS NULL
+            """, (datetime.now(timezone.utc), session_id))
+        conn.commit()
+    except Exception as e:
+        print(f"revoke session failed: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+    if rec:
+        purge_session_cache(rec["token_hash"])
+
+async def revoke_async(session_id: str):
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    SELECT token_hash FROM app_sessions WHERE session_id = %s
+                """, (session_id,))
+                rec = await cursor.fetchone()
+                await cursor.execute("""
+                    UPDATE app_sessions SET revoked_at = %s WHERE session_id = %s AND revoked_at IS NULL
+                """, (datetime.now(timezone.utc), session_id))
+            await conn.commit()
+    except Exception as e:
+        print(f"revoke session failed: {e}")
+        raise e
+    if rec:
+        purge_session_cache(rec["token_hash"])
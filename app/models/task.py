@@ -1,6 +1,9 @@
 import json
-from app.core.database import get_mysql_conn
+from app.core.database import get_mysql_conn, get_async_mysql_conn, mark_written
 from app.core.utils import generate_task_id
+from app.core.state_writer import state_writer
+from app.core.status_cache import set_user_task_id
+from app.core.wrapped_cache import invalidate_wrapped
 
 # create task
 def create_task(archive_job_id:str, device_id:str="") -> str:
@@ -20,6 +23,7 @@ def create_task(archive_job_id:str, device_id:str="") -> str:
                 VALUES (%s, %s, 'pending')
             """, (archive_job_id, device_id))
         conn.commit()
+        mark_written(f"task:{archive_job_id}")
     except Exception as e:
         print(f"create task failed: {e}")
         raise e
@@ -29,30 +33,106 @@ def create_task(archive_job_id:str, device_id:str="") -> str:
 
     return archive_job_id
 
+async def create_task_async(archive_job_id: str, device_id: str = "") -> str:
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                # an archived task_id is not created again
+                await cursor.execute("""
+                    INSERT INTO tasks (task_id, device_id, status)
+                    SELECT %s, %s, 'pending' FROM DUAL
+                    WHERE NOT EXISTS (SELECT 1 FROM tasks_archive WHERE task_id = %s)
+                """, (archive_job_id, device_id, archive_job_id))
+                if cursor.rowcount == 0:
+                    raise ValueError(f"task {archive_job_id} is archived")
+            await conn.commit()
+            mark_written(f"task:{archive_job_id}")
+    except Exception as e:
+        print(f"create task failed: {e}")
+        raise e
+    return archive_job_id
+
+# create many tasks with one multi-row INSERT; returns the task ids that did not exist yet
+async def create_tasks_async(tasks) -> list:
+    tasks = list(dict(tasks).items())
+    if not tasks:
+        return []
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                task_ids = [task_id for task_id, _ in tasks]
+                # archived ids count as existing, a task_id must not live in both tables
+                placeholders = ", ".join(["%s"] * len(task_ids))
+                await cursor.execute(f"""
+                    SELECT task_id FROM tasks WHERE task_id IN ({placeholders})
+                    UNION ALL
+                    SELECT task_id FROM tasks_archive WHERE task_id IN ({placeholders})
+                """, tuple(task_ids) * 2)
+                existing = {row["task_id"] for row in await cursor.fetchall()}
+                new_tasks = [(task_id, device_id, "pending") for task_id, device_id in tasks if task_id not in existing]
+                if new_tasks:
+                    # every value a placeholder, or aiomysql sends executemany row by row
+                    insert_sql = """
+                        INSERT IGNORE INTO tasks (task_id, device_id, status)
+                        VALUES (%s, %s, %s)
+                    """
+                    await conn.begin()
+                    # aiomysql rewrites executemany on INSERT ... VALUES into one multi-row INSERT;
+                    # IGNORE skips a task_id created concurrently (uk_task_id)
+                    await cursor.executemany(insert_sql, new_tasks)
+                    if cursor.rowcount != len(new_tasks):
+                        # some were created concurrently: redo row by row to know which ones are ours
+                        await conn.rollback()
+                        await conn.begin()
+                        inserted = []
+                        for row in new_tasks:
+                            await cursor.execute(insert_sql, row)
+                            if cursor.rowcount:
+                                inserted.append(row)
+                        new_tasks = inserted
+            await conn.commit()
+        mark_written(*(f"task:{task_id}" for task_id, _, _ in new_tasks))
+    except Exception as e:
+        print(f"create tasks failed: {e}")
+        raise e
+    return [task_id for task_id, _, _ in new_tasks]
+
+# undo create_tasks_async for tasks nothing has been queued for yet
+async def delete_pending_tasks_async(task_ids) -> None:
+    task_ids = list(task_ids)
+    if not task_ids:
+        return
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(f"""
+                    DELETE FROM tasks WHERE task_id IN ({", ".join(["%s"] * len(task_ids))}) AND status = 'pending'
+                """, tuple(task_ids))
+            await conn.commit()
+        mark_written(*(f"task:{task_id}" for task_id in task_ids))
+    except Exception as e:
+        print(f"delete pending tasks failed: {e}")
+        raise e
+
 # query task status
 def get_task_status(task_id):
     conn = None
     try: 
-        conn = get_mysql_conn()
+        conn = get_mysql_conn(readonly=True, sticky_key=f"task:{task_id}")
         with conn.cursor() as cursor:
             cursor.execute("""
                 SELECT *
                 FROM tasks WHERE task_id = %s
             """, (task_id,))
             task = cursor.fetchone()
-        
-        if task:
-            # parse JSON fields
-            if task.get("region_verify_result"):
-                task["region_verify_result"] = json.loads(task["region_verify_result"])
-            if task.get("analysis_result"):
-                task["analysis_result"] = json.loads(task["analysis_result"])
-            # calculate collection progress
-            if task["collect_total"] > 0:
-                task["collect_progress"] = f"{round(task['collect_completed']/task['collect_total']*100, 2)}%"
-            else:
-                task["collect_progress"] = "0%"
-        return task
+            if not task:
+                # finished tasks are moved to tasks_archive by the archive worker
+                cursor.execute("""
+                    SELECT *
+                    FROM tasks_archive WHERE task_id = %s
+                """, (task_id,))
+                task = cursor.fetchone()
+        return _parse_task_row(task)
     except Exception as e:
         print(f"query task status failed: {e}")
         raise e
@@ -60,6 +140,64 @@ def get_task_status(task_id):
         if conn:
             conn.close()
 
+async def get_task_status_async(task_id):
+    try:
+        async with get_async_mysql_conn(readonly=True, sticky_key=f"task:{task_id}") as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    SELECT *
+                    FROM tasks WHERE task_id = %s
+                """, (task_id,))
+                task = await cursor.fetchone()
+                if not task:
+                    await cursor.execute("""
+                        SELECT *
+                        FROM tasks_archive WHERE task_id = %s
+                    """, (task_id,))
+                    task = await cursor.fetchone()
+        return _parse_task_row(task)
+    except Exception as e:
+        print(f"query task status failed: {e}")
+        raise e
+
+# query many tasks with one IN query per table; returns {task_id: task}
+async def get_tasks_status_async(task_ids, readonly: bool = False) -> dict:
+    task_ids = list(dict.fromkeys(task_ids))
+    tasks = {}
+    if not task_ids:
+        return tasks
+    try:
+        async with get_async_mysql_conn(readonly=readonly) as conn:
+            async with conn.cursor() as cursor:
+                for table in ("tasks", "tasks_archive"):
+                    missing = [t for t in task_ids if t not in tasks]
+                    if not missing:
+                        break
+                    await cursor.execute(f"""
+                        SELECT *
+                        FROM {table} WHERE task_id IN ({", ".join(["%s"] * len(missing))})
+                    """, tuple(missing))
+                    for task in await cursor.fetchall():
+                        tasks[task["task_id"]] = _parse_task_row(task)
+    except Exception as e:
+        print(f"query tasks status failed: {e}")
+        raise e
+    return tasks
+
+def _parse_task_row(task):
+    if task:
+        # parse JSON fields
+        if task.get("region_verify_result"):
+            task["region_verify_result"] = json.loads(task["region_verify_result"])
+        if task.get("analysis_result"):
+            task["analysis_result"] = json.loads(task["analysis_result"])
+        # calculate collection progress
+        if task["collect_total"] > 0:
+            task["collect_progress"] = f"{round(task['collect_completed']/task['collect_total']*100, 2)}%"
+        else:
+            task["collect_progress"] = "0%"
+    return task
+
 # get task user info
 def get_task_user(task_id):
     conn = None
@@ -78,6 +216,36 @@ def get_task_user(task_id):
             conn.close()
     return task
 
+async def get_task_user_async(task_id):
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    SELECT user_id, ip_address FROM tasks WHERE task_id = %s
+                """, (task_id,))
+                task = await cursor.fetchone()
+    except Exception as e:
+        print(f"get task user info failed: {e}")
+        raise e
+    return task
+
+async def get_task_users_async(task_ids) -> dict:
+    task_ids = list(dict.fromkeys(task_ids))
+    if not task_ids:
+        return {}
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(f"""
+                    SELECT task_id, user_id, ip_address FROM tasks
+                    WHERE task_id IN ({", ".join(["%s"] * len(task_ids))})
+                """, tuple(task_ids))
+                rows = await cursor.fetchall()
+    except Exception as e:
+        print(f"get task user info failed: {e}")
+        raise e
+    return {row.pop("task_id"): row for row in rows}
+
 def update_verify_task_status(task_id):
     conn = None
     try:
@@ -94,6 +262,7 @@ def update_verify_task_status(task_id):
                 WHERE task_id = %s
             """, (new_status, new_status, task_id))
         conn.commit()
+        mark_written(f"task:{task_id}")
     except Exception as e:
         print(f"update task status failed: {e}")
         raise e
@@ -101,6 +270,27 @@ def update_verify_task_status(task_id):
         if conn:
             conn.close()
     return new_status
+
+async def update_verify_task_status_async(task_id):
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    SELECT region_retry_count FROM tasks WHERE task_id = %s
+                """, (task_id,))
+                current_retry = (await cursor.fetchone())["region_retry_count"]
+                new_status = "retrying" if current_retry > 0 else "verifying"
+                await cursor.execute("""
+                    UPDATE tasks SET region_verify_status = %s, status = %s, update_time = CURRENT_TIMESTAMP
+                    WHERE task_id = %s
+                """, (new_status, new_status, task_id))
+            await conn.commit()
+            mark_written(f"task:{task_id}")
+    except Exception as e:
+        print(f"update task status failed: {e}")
+        raise e
+    return new_status
+
 def update_task_status_user_id(task_id: str, status: str, app_user_id: str = ""):
     conn = None
     try:
@@ -110,6 +300,10 @@ def update_task_status_user_id(task_id: str, status: str, app_user_id: str = "")
             params = [status, app_user_id, task_id]
             cursor.execute(sql, tuple(params))
         conn.commit()
+        mark_written(f"task:{task_id}", f"user:{app_user_id}")
+        set_user_task_id(app_user_id, task_id)
+        # the user's wrapped now follows this task
+        invalidate_wrapped(app_user_id)
     except Exception as e:
         print(f"update task failed: {e}")
         raise e
@@ -117,36 +311,63 @@ def update_task_status_user_id(task_id: str, status: str, app_user_id: str = "")
         if conn:
             conn.close()
 
-
-def update_task_email_status(task_id: str, status: str):
-    conn = None
+async def update_task_status_user_id_async(task_id: str, status: str, app_user_id: str = ""):
     try:
-        conn = get_mysql_conn()
-        with conn.cursor() as cursor:
-            cursor.execute("""
-                UPDATE tasks SET email_status = %s WHERE task_id = %s
-            """, (status, task_id))
-        conn.commit()
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    "UPDATE tasks SET status = %s, app_user_id = %s WHERE task_id = %s",
+                    (status, app_user_id, task_id),
+                )
+            await conn.commit()
+            mark_written(f"task:{task_id}", f"user:{app_user_id}")
+            set_user_task_id(app_user_id, task_id)
+            invalidate_wrapped(app_user_id)
     except Exception as e:
-        print(f"update task email status failed: {e}")
+        print(f"update task failed: {e}")
         raise e
-    finally:
-        if conn:
-            conn.close()
+
+
+# written through at once: raises when MySQL rejects it, so the email worker can retry
+def update_task_email_status(task_id: str, status: str):
+    state_writer.write(task_id, {"email_status": status})
 
 def get_task_by_user_id(app_user_id: str):
     conn = None
     try:
-        conn = get_mysql_conn()
+        conn = get_mysql_conn(readonly=True, sticky_key=f"user:{app_user_id}")
         with conn.cursor() as cursor:
             cursor.execute("""
-                SELECT * FROM tasks WHERE app_user_id = %s ORDER BY create_time DESC
+                SELECT * FROM tasks WHERE app_user_id = %s ORDER BY create_time DESC LIMIT 1
             """, (app_user_id,))
             task = cursor.fetchone()
+            if not task:
+                cursor.execute("""
+                    SELECT * FROM tasks_archive WHERE app_user_id = %s ORDER BY create_time DESC LIMIT 1
+                """, (app_user_id,))
+                task = cursor.fetchone()
     except Exception as e:
         print(f"get tasks by user id failed: {e}")
         raise e
     finally:
         if conn:
             conn.close()
-    return task
\ No newline at end of file
+    return task
+
+async def get_task_by_user_id_async(app_user_id: str):
+    try:
+        async with get_async_mysql_conn(readonly=True, sticky_key=f"user:{app_user_id}") as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    SELECT * FROM tasks WHERE app_user_id = %s ORDER BY create_time DESC LIMIT 1
+                """, (app_user_id,))
+                task = await cursor.fetchone()
+                if not task:
+                    await cursor.execute("""
+                        SELECT * FROM tasks_archive WHERE app_user_id = %s ORDER BY create_time DESC LIMIT 1
+                    """, (app_user_id,))
+                    task = await cursor.fetchone()
+    except Exception as e:
+        print(f"get tasks by user id failed: {e}")
+        raise e
+    return task
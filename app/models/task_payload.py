@@ -1,28 +1,33 @@
 
-from app.core.database import get_mysql_conn
+from app.core.database import get_mysql_conn, get_async_mysql_conn
+from app.core.payload_codec import encode_payload, decode_payload
 import json
 
-def update_or_create_task_payload(tasK_id: str, payload: str, app_user_id: str):
+# kept in its own column: the bulkiest field, and only the analysis prompts need it
+SAMPLE_TEXTS_FIELD = "_sample_texts"
+
+def update_or_create_task_payload(task_id: str, payload, app_user_id: str):
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+    payload = dict(payload)
+    sample_texts = payload.pop(SAMPLE_TEXTS_FIELD, None)
     conn = None
-    print(payload)
     try:
         conn = get_mysql_conn()
         with conn.cursor() as cursor:
+            # uk_task_id turns this into a single-statement upsert; the legacy JSON column is cleared
             cursor.execute("""
-                select task_id from task_payload WHERE task_id = %s
-            """, (tasK_id))
-            task_payload = cursor.fetchone()
-            if not task_payload:
-                print("task_id",tasK_id)
-                print("payload", payload)
-                cursor.execute("""
-                    INSERT INTO task_payload (task_id, app_user_id, payload)
-                    VALUES (%s, %s, %s)
-                """, (tasK_id, app_user_id, payload))
-            else:
-                cursor.execute("""
-                    UPDATE task_payload SET payload = %s WHERE task_id = %s
-                """, (payload,  tasK_id))
+                INSERT INTO task_payload (task_id, app_user_id, payload_blob, samples_blob)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    app_user_id = VALUES(app_user_id),
+                    payload = NULL,
+                    payload_blob = VALUES(payload_blob),
+                    samples_blob = VALUES(samples_blob)
+            """, (
+                task_id, app_user_id, encode_payload(payload),
+                encode_payload(sample_texts) if sample_texts is not None else None,
+            ))
         conn.commit()
     except Exception as e:
         print(f"update task payload failed: {e}")
@@ -31,26 +36,84 @@ def update_or_create_task_payload(tasK_id: str, payload: str, app_user_id: str):
         if conn:
             conn.close()
 
-# query task status
-def get_task_payload(task_id):
+# query task payload; include_samples=False skips reading and decoding _sample_texts
+def get_task_payload(task_id, include_samples: bool = True):
+    columns = "task_id, app_user_id, payload, payload_blob"
+    if include_samples:
+        columns += ", samples_blob"
     conn = None
-    try: 
+    try:
         conn = get_mysql_conn()
         with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT *
+            cursor.execute(f"""
+                SELECT {columns}
                 FROM task_payload WHERE task_id = %s
             """, (task_id,))
             task_payload = cursor.fetchone()
-        
-        if task_payload:
-            # parse JSON fields
-            if task_payload.get("payload"):
-                task_payload["payload"] = json.loads(task_payload["payload"])
-        return task_payload
+        return _parse_payload_row(task_payload, include_samples)
     except Exception as e:
-        print(f"query task status failed: {e}")
+        print(f"query task payload failed: {e}")
         raise e
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+async def get_task_payload_async(task_id, include_samples: bool = False):
+    columns = "task_id, app_user_id, payload, payload_blob"
+    if include_samples:
+        columns += ", samples_blob"
+    try:
+        async with get_async_mysql_conn(readonly=True) as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(f"""
+                    SELECT {columns}
+                    FROM task_payload WHERE task_id = %s
+                """, (task_id,))
+                task_payload = await cursor.fetchone()
+    except Exception as e:
+        print(f"query task payload failed: {e}")
+        raise e
+    return _parse_payload_row(task_payload, include_samples)
+
+def get_task_sample_texts(task_id):
+    conn = None
+    try:
+        conn = get_mysql_conn()
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT samples_blob, payload
+                FROM task_payload WHERE task_id = %s
+            """, (task_id,))
+            row = cursor.fetchone()
+    except Exception as e:
+        print(f"query task sample texts failed: {e}")
+        raise e
+    finally:
+        if conn:
+            conn.close()
+    if not row:
+        return None
+    if row.get("samples_blob"):
+        return decode_payload(row["samples_blob"])
+    if row.get("payload"):
+        return json.loads(row["payload"]).get(SAMPLE_TEXTS_FIELD)
+    return None
+
+def _parse_payload_row(task_payload, include_samples: bool):
+    if not task_payload:
+        return task_payload
+    blob = task_payload.pop("payload_blob", None)
+    samples = task_payload.pop("samples_blob", None)
+    if blob:
+        payload = decode_payload(blob)
+        if include_samples and samples:
+            payload[SAMPLE_TEXTS_FIELD] = decode_payload(samples)
+    elif task_payload.get("payload"):
+        # rows written before payload_blob existed
+        payload = json.loads(task_payload["payload"])
+        if not include_samples:
+            payload.pop(SAMPLE_TEXTS_FIELD, None)
+    else:
+        payload = {}
+    task_payload["payload"] = payload
+    return task_payload
@@ -1,11 +1,18 @@
 import json
-from app.core.database import get_mysql_conn
+from app.core.database import get_mysql_conn, get_async_mysql_conn, mark_written
+from app.core.user_cache import user_cache
 
-# get user info
-def get_user(app_user_id: str):
+# get user info, consistent=True skips the cache and reads MySQL
+def get_user(app_user_id: str, consistent: bool = False):
+    if consistent:
+        user_cache.bypass()
+    else:
+        user = user_cache.get(app_user_id)
+        if user is not None:
+            return user
     conn = None
     try:
-        conn = get_mysql_conn()
+        conn = get_mysql_conn(readonly=True, sticky_key=f"user:{app_user_id}")
         with conn.cursor() as cursor:
             cursor.execute("""
                 SELECT * FROM users WHERE app_user_id = %s
@@ -17,6 +24,27 @@ def get_user(app_user_id: str):
     finally:        
         if conn:    
             conn.close()
+    user_cache.set(app_user_id, user)
+    return user
+
+async def get_user_async(app_user_id: str, consistent: bool = False):
+    if consistent:
+        user_cache.bypass()
+    else:
+        user = user_cache.get(app_user_id)
+        if user is not None:
+            return user
+    try:
+        async with get_async_mysql_conn(readonly=True, sticky_key=f"user:{app_user_id}") as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    SELECT * FROM users WHERE app_user_id = %s
+                """, (app_user_id,))
+                user = await cursor.fetchone()
+    except Exception as e:
+        print(f"get user info failed: {e}")
+        raise e
+    user_cache.set(app_user_id, user)
     return user
 
 def create_user(user_id: str, email: str) -> str:
@@ -29,6 +57,8 @@ def create_user(user_id: str, email: str) -> str:
                 VALUES (%s, %s)
             """, (user_id, ))
         conn.commit()
+        user_cache.invalidate(user_id)
+        mark_written(f"user:{user_id}")
     except Exception as e:
         print(f"create user failed: {e}")
         raise e
@@ -46,12 +76,28 @@ def update_user_email(app_user_id: str, email: str):
                 UPDATE users SET email = %s WHERE app_user_id = %s
             """, (email, app_user_id))
         conn.commit()
+        user_cache.invalidate(app_user_id)
+        mark_written(f"user:{app_user_id}")
     except Exception as e:
         print(f"update user email failed: {e}")
         raise e
     finally:
         if conn:
             conn.close()
+
+async def update_user_email_async(app_user_id: str, email: str):
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    UPDATE users SET email = %s WHERE app_user_id = %s
+                """, (email, app_user_id))
+            await conn.commit()
+            user_cache.invalidate(app_user_id)
+            mark_written(f"user:{app_user_id}")
+    except Exception as e:
+        print(f"update user email failed: {e}")
+        raise e
 def update_user_available(app_user_id: str, is_available: str):
     conn = None
     try:
@@ -61,12 +107,28 @@ def update_user_available(app_user_id: str, is_available: str):
                 UPDATE users SET is_watch_history_available = %s WHERE app_user_id = %s
             """, (is_available, app_user_id))
         conn.commit()
+        user_cache.invalidate(app_user_id)
+        mark_written(f"user:{app_user_id}")
     except Exception as e:
         print(f"update user available failed: {e}")
         raise e
     finally:
         if conn:
             conn.close()
+
+async def update_user_available_async(app_user_id: str, is_available: str):
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    UPDATE users SET is_watch_history_available = %s WHERE app_user_id = %s
+                """, (is_available, app_user_id))
+            await conn.commit()
+            user_cache.invalidate(app_user_id)
+            mark_written(f"user:{app_user_id}")
+    except Exception as e:
+        print(f"update user available failed: {e}")
+        raise e
 def update_user(app_user_id: str, time_zone: str, ):
     conn = None
     try:
@@ -76,6 +138,8 @@ def update_user(app_user_id: str, time_zone: str, ):
                 UPDATE users SET time_zone = %s WHERE app_user_id = %s
             """, (time_zone, app_user_id))
         conn.commit()
+        user_cache.invalidate(app_user_id)
+        mark_written(f"user:{app_user_id}")
     except Exception as e:
         print(f"update user failed: {e}")
         raise e
@@ -106,6 +170,8 @@ def update_user(app_user_id,archive_user_id: str, provider_unique_id: str, platf
                 app_user_id
             ))
         conn.commit()
+        user_cache.invalidate(app_user_id)
+        mark_written(f"user:{app_user_id}")
     except Exception as e:
         print(f"update user failed: {e}")
         raise e
@@ -113,6 +179,35 @@ def update_user(app_user_id,archive_user_id: str, provider_unique_id: str, platf
         if conn:
             conn.close()
 
+async def update_user_async(app_user_id, archive_user_id: str, provider_unique_id: str, platform_username: str, time_zone: str, anchor_token: str, is_watch_history_available: str):
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    UPDATE users SET 
+                        archive_user_id = %s,
+                        latest_sec_user_id = %s,
+                        platform_username = %s,
+                        time_zone = %s,
+                        latest_anchor_token = %s,
+                        is_watch_history_available = %s
+                    WHERE app_user_id = %s
+                """, (
+                    archive_user_id,
+                    provider_unique_id,
+                    platform_username,
+                    time_zone,
+                    anchor_token,
+                    is_watch_history_available,
+                    app_user_id
+                ))
+            await conn.commit()
+            user_cache.invalidate(app_user_id)
+            mark_written(f"user:{app_user_id}")
+    except Exception as e:
+        print(f"update user failed: {e}")
+        raise e
+
 def update_user_waitlist(app_user_id: str, waitlist_opt_in: bool, waitlist_opt_in_at):
     conn = None
     try:
@@ -129,9 +224,32 @@ def update_user_waitlist(app_user_id: str, waitlist_opt_in: bool, waitlist_opt_i
                 app_user_id
             ))
         conn.commit()
+        user_cache.invalidate(app_user_id)
+        mark_written(f"user:{app_user_id}")
     except Exception as e:
         print(f"update user waitlist failed: {e}")
         raise e
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+async def update_user_waitlist_async(app_user_id: str, waitlist_opt_in: bool, waitlist_opt_in_at):
+    try:
+        async with get_async_mysql_conn() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    UPDATE users SET 
+                        waitlist_opt_in = %s,
+                        waitlist_opt_in_at = %s
+                    WHERE app_user_id = %s
+                """, (
+                    waitlist_opt_in,
+                    waitlist_opt_in_at,
+                    app_user_id
+                ))
+            await conn.commit()
+            user_cache.invalidate(app_user_id)
+            mark_written(f"user:{app_user_id}")
+    except Exception as e:
+        print(f"update user waitlist failed: {e}")
+        raise e
@@ -4,7 +4,6 @@ import os
 import sys
 import multiprocessing
 import asyncio
-import httpx
 import re
 from typing import Any, Dict, List, Optional
 import logging
@@ -16,8 +15,15 @@ sys.path.insert(0, PROJECT_ROOT)
 from app.core.config import settings
 from app.core.database import redis_client, get_task_lock, get_mysql_conn
 from app.models.task import get_task_status
-from app.models.task_payload import get_task_payload
+from app.models.task_payload import get_task_payload, get_task_sample_texts
 from app.core.utils import call_api_with_retry, update_task_status
+from app.core.llm_cache import LLMCache
+from app.core.llm_client import llm_client
+from app.core.sampler import pack_texts
+from app.core.analysis_checkpoint import load_checkpoint, save_checkpoint, clear_checkpoint
+from app.core.progress import collect_completed_in_cache
+from app.core.heuristics import local_analysis
+from app.core.wrapped_cache import materialize_wrapped
 from app.core.prompt import (
     PERSONALITY_PROMPT,
     PERSONALITY_EXPLANATION_PROMPT,
@@ -30,111 +36,127 @@ from app.core.prompt import (
 )
 logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 logger = logging.getLogger("analyz_worker")
-async def _call_llm(prompt: str, sample_texts: List[str]) -> str:
-    api_key = settings.OPENROUTER_API_KEY
-    model =settings.OPENROUTER_MODEL
-    api_url = settings.OPENROUTER_URL
-    if not api_key or not model:
+
+LLM_TEMPERATURE = 0.7
+llm_cache = LLMCache()
+
+def _context_texts(sample_texts: List[str]) -> List[str]:
+    # payloads are already packed by the collector; this also bounds older, larger payloads
+    return pack_texts(sample_texts, settings.LLM_CONTEXT_TOKEN_BUDGET)
+
+def _llm_cache_key(prompt: str, sample_texts: List[str]) -> str:
+    return LLMCache.make_key(llm_client.model, prompt, _context_texts(sample_texts), LLM_TEMPERATURE)
+
+async def _call_llm(prompt: str, sample_texts: List[str], prompt_type: Optional[str] = None) -> str:
+    if not llm_client.configured:
         return ""
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        messages = [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": "\n".join(sample_texts[:20])},
-        ]
-        backoff = 1.0
-        for _ in range(3):
-            try:
-                resp = await client.post(
-                    api_url,
-                    headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
-                    json={"model": model, "messages": messages, "temperature": 0.7},
-                )
-                if resp.status_code == 200:
-                    data = resp.json()
-                    return data["choices"][0]["message"]["content"].strip()
-            except Exception:
-                pass
-            await asyncio.sleep(backoff)
-            backoff = min(backoff * 2, 4.0)
-    return ""
-# analyze browse records
-async def analyze_browse_records(task_id, user_id, sample_texts):
-    api_url = settings.BROWSE_ANALYSIS_API_URL
-    api_key = settings.OPENROUTER_API_KEY
-    model = settings.OPENROUTER_MODEL
+    # only validated outputs are stored, see analyze_browse_records
+    cached = llm_cache.get(_llm_cache_key(prompt, sample_texts))
+    if cached is not None:
+        return cached
+    return await llm_client.complete(
+        prompt, _context_texts(sample_texts), LLM_TEMPERATURE, prompt_type=prompt_type
+    )
+ANALYSIS_PROMPTS = [
+    ("personality_type", PERSONALITY_PROMPT, "llm_personality"),
+    ("personality_explanation", PERSONALITY_EXPLANATION_PROMPT, "llm_personality_explanation"),
+    ("niche_journey", NICHE_JOURNEY_PROMPT, "llm_niche_journey"),
+    ("top_niche_percentile", TOP_NICHES_PROMPT, "llm_top_niche_percentile"),
+    ("brain_rot_score", BRAINROT_SCORE_PROMPT, "llm_brainrot"),
+    ("brain_rot_explanation", BRAINROT_EXPLANATION_PROMPT, "llm_brainrot_explanation"),
+    ("keyword_2026", KEYWORD_2026_PROMPT, "llm_keyword_2026"),
+    ("thumb_roast", ROAST_THUMB_PROMPT, "llm_thumb_roast"),
+]
+# prompts whose output fills more than its own field
+PROMPT_OUTPUT_FIELDS = {
+    "llm_top_niche_percentile": ["top_niches", "top_niche_percentile"],
+}
 
-    prompts = [
-        ("personality_type", PERSONALITY_PROMPT, "llm_personality"),
-        ("personality_explanation", PERSONALITY_EXPLANATION_PROMPT, "llm_personality_explanation"),
-        ("niche_journey", NICHE_JOURNEY_PROMPT, "llm_niche_journey"),
-        ("top_niche_percentile", TOP_NICHES_PROMPT, "llm_top_niche_percentile"),
-        ("brain_rot_score", BRAINROT_SCORE_PROMPT, "llm_brainrot"),
-        ("brain_rot_explanation", BRAINROT_EXPLANATION_PROMPT, "llm_brainrot_explanation"),
-        ("keyword_2026", KEYWORD_2026_PROMPT, "llm_keyword_2026"),
-        ("thumb_roast", ROAST_THUMB_PROMPT, "llm_thumb_roast"),
-    ]
-    payload = {}
-    for field, prompt, task_name in prompts:
-        content = await _call_llm(prompt, sample_texts)
-        if task_name == "llm_brainrot":
-            try:
-                payload[field] = max(0, min(100, int(float(content.strip().split()[0]))))
-            except Exception as e:
-                logging.error(f"llm_brainrot error", e)
-                return "failed", payload, ""
-        elif task_name == "llm_niche_journey":
-            parsed = []
-            try:
-                pattern = r'^```json\s*(.*?)\s*```$'
-                match = re.search(pattern, content, re.DOTALL)
-                if match:
-                    pure_json_str = match.group(1)
-                    parsed = json.loads(pure_json_str)
-                else:
-                    parsed = json.loads(content)
-             
-                if not isinstance(parsed, list):
-                    return "failed", payload, "not list"
-            except Exception as e:
-                logging.error(f"llm_niche_journey error", e)
-                return "failed", payload, ""
-            payload[field] = parsed[:5]
-        elif task_name == "llm_top_niche_percentile":
-            try:
-                pattern = r'^```json\s*(.*?)\s*```$'
-                match = re.search(pattern, content, re.DOTALL)
-                if match:
-                    pure_json_str = match.group(1)
-                    parsed = json.loads(pure_json_str)
-                else:
-                    parsed = json.loads(content)
-                if isinstance(parsed, dict):
-                    tn = parsed.get("top_niches")
-                    if not isinstance(tn, list):
-                        return False
-                    payload["top_niches"] = [str(x).strip() for x in tn if str(x).strip()]
-                    pct = parsed.get("top_niche_percentile")
-                    if not pct:
-                        return False
-                    payload["top_niche_percentile"] = str(pct).strip()
-                else:
-                    logging.error(f"llm_top_niche_percentile error", e)
-                    return "failed", payload, ""
-            except Exception as e:
-                logging.error(f"llm_top_niche_percentile error", e)
-                return "failed", payload, ""
-        elif task_name == "llm_personality":
-            if not content:
-                logging.error(f"llm_personality not content error")
-                return "failed", payload, ""
-            payload[field] = content.strip().split()[0].lower().replace(" ", "_")
-        elif task_name == "llm_keyword_2026":
-            if not content:
-                logging.error(f"llm_keyword_2026 not content error")
-                return "failed", payload, ""
-            payload[field] = content.strip().splitlines()[0]
-        else:
-            payload[field] = content
+def _load_json_content(content: str) -> Any:
+    pattern = r'^```json\s*(.*?)\s*```$'
+    match = re.search(pattern, content, re.DOTALL)
+    if match:
+        return json.loads(match.group(1))
+    return json.loads(content)
+
+# parse one LLM output into payload fields, raises ValueError when it is unusable
+def _parse_llm_output(task_name: str, field: str, content: str) -> Dict[str, Any]:
+    if task_name == "llm_brainrot":
+        return {field: max(0, min(100, int(float(content.strip().split()[0]))))}
+    if task_name == "llm_niche_journey":
+        parsed = _load_json_content(content)
+        if not isinstance(parsed, list):
+            raise ValueError("not list")
+        return {field: parsed[:5]}
+    if task_name == "llm_top_niche_percentile":
+        parsed = _load_json_content(content)
+        if not isinstance(parsed, dict):
+            raise ValueError("not dict")
+        tn = parsed.get("top_niches")
+        if not isinstance(tn, list):
+            raise ValueError("top_niches not list")
+        pct = parsed.get("top_niche_percentile")
+        if not pct:
+            raise ValueError("top_niche_percentile missing")
+        return {
+            "top_niches": [str(x).strip() for x in tn if str(x).strip()],
+            "top_niche_percentile": str(pct).strip(),
+        }
+    if task_name == "llm_personality":
+        if not content:
+            raise ValueError("not content")
+        return {field: content.strip().split()[0].lower().replace(" ", "_")}
+    if task_name == "llm_keyword_2026":
+        if not content:
+            raise ValueError("not content")
+        return {field: content.strip().splitlines()[0]}
+    return {field: content}
+
+# analyze browse records
+async def analyze_browse_records(task_id, user_id, sample_texts, resume=True, summary=None):
+    # resume from fields parsed by a previous attempt, only missing prompts are called
+    payload = load_checkpoint(task_id) if resume else {}
+    if payload:
+        logger.info(f"task:{task_id} resuming analysis with {sorted(payload)}")
+    # with a summary, fields the LLM does not deliver within the budget are filled locally
+    use_fallback = settings.ANALYSIS_LOCAL_FALLBACK and summary is not None
+    fallback = local_analysis(summary) if use_fallback else {}
+    fallback_fields = []
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.ANALYSIS_LATENCY_BUDGET
+    for field, prompt, task_name in ANALYSIS_PROMPTS:
+        output_fields = PROMPT_OUTPUT_FIELDS.get(task_name, [field])
+        if all(f in payload for f in output_fields):
+            continue
+        remaining = deadline - loop.time()
+        content = ""
+        error = "latency budget exhausted"
+        try:
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            content = await asyncio.wait_for(_call_llm(prompt, sample_texts, task_name), remaining)
+            parsed = _parse_llm_output(task_name, field, content)
+            if use_fallback and not content:
+                raise ValueError("not content")
+        except Exception as e:
+            if not isinstance(e, asyncio.TimeoutError):
+                error = str(e)
+            if not use_fallback:
+                logger.error(f"{task_name} error: {error}")
+                return "failed", payload, f"{task_name}: {error}"
+            logger.warning(f"task:{task_id} {task_name} filled locally: {error}")
+            payload.update({f: fallback[f] for f in output_fields})
+            fallback_fields.extend(output_fields)
+            continue
+        payload.update(parsed)
+        if not content:
+            # free-text fields tolerate an empty answer, but it is not worth keeping
+            continue
+        save_checkpoint(task_id, parsed)
+        # reaching here means the output parsed, so it is safe to reuse
+        llm_cache.set(_llm_cache_key(prompt, sample_texts), content)
+    if fallback_fields:
+        payload["fallback_fields"] = fallback_fields
     return "success", payload, ""
 
 # process analyze task
@@ -144,13 +166,13 @@ async def process_analyze_task(task_data):
 
     # check task status
     task = get_task_status(task_id)
-    task_payload = get_task_payload(task_id)
+    # sample texts are decoded separately, once the task is known to be analyzable
+    task_payload = get_task_payload(task_id, include_samples=False)
     if not task or not task_payload:
         print(f"task:{task_id} is not exist, skip")
         return 
 
     payload = task_payload['payload']
-    sample_texts = payload['_sample_texts']
     # get distributed lock
     lock = get_task_lock(task_id)
     if not lock.acquire(blocking=False):
@@ -165,7 +187,8 @@ async def process_analyze_task(task_data):
             print(f"task:{task_id}status is {task['status']}, stop analysis")
             return
         
-        if task["collect_status"] != "completed":
+        # the progress script marks Redis completed before its MySQL flush lands
+        if task["collect_status"] != "completed" and not collect_completed_in_cache(task_id):
             print(f"task:{task_id} collection not completed, cannot analyze")
             update_task_status(
                 task_id, "failed",
@@ -188,7 +211,10 @@ async def process_analyze_task(task_data):
             return
 
         # analyze browse records
-        analysis_status, analysis_result, analysis_error = await analyze_browse_records(task_id, user_id, sample_texts)
+        sample_texts = get_task_sample_texts(task_id) or []
+        analysis_status, analysis_result, analysis_error = await analyze_browse_records(
+            task_id, user_id, sample_texts, summary=payload
+        )
         if analysis_status != "success":
             update_task_status(
                 task_id, "failed",
@@ -198,16 +224,21 @@ async def process_analyze_task(task_data):
             print(f"task:{task_id} error: {analysis_error}")
             return
 
+        # stored before the status flips, so a client that sees completed finds the document
+        # keyed by app_user_id; a task without one has no wrapped page
+        materialize_wrapped(task_id, task_payload.get("app_user_id"), payload, analysis_result)
         # update task status to completed
         update_task_status(
             task_id, "completed",
             analysis_status="success",
-            analysis_result=json.dumps(analysis_result)
+            analysis_result=analysis_result
         )
+        clear_checkpoint(task_id)
         redis_client.lpush(settings.TASK_QUEUE_EMAIL_SEND, json.dumps({
             "task_id": task_id, "user_id": user_id
         }))
         print(f"task {task_id} analysis completed")
+        logger.info(f"llm cache stats: {llm_cache.stats()}")
     except Exception as e:
         update_task_status(task_id, "failed", error_msg=f" analyze failed: {e}")
         print(f"task {task_id} analyze failed: {e}")
@@ -219,26 +250,30 @@ async def analyze_worker():
     print(f"analyze Worker  started")
     analyze_queue = settings.TASK_QUEUE_ANALYZE
     retry_queue = settings.TASK_QUEUE_RETRY
+    await llm_client.start()
 
-    while True:
-        try:
-            # wait for analyze or retry task
-            task_data_str = redis_client.brpop([retry_queue, analyze_queue], timeout=5)
-            if not task_data_str:
-                continue
+    try:
+        while True:
+            try:
+                # wait for analyze or retry task
+                task_data_str = redis_client.brpop([retry_queue, analyze_queue], timeout=5)
+                if not task_data_str:
+                    continue
 
-            queue_name, task_data_str = task_data_str
-            task_data = json.loads(task_data_str)
+                queue_name, task_data_str = task_data_str
+                task_data = json.loads(task_data_str)
 
-            # if from retry queue and retry_type is analyze, only task_id is needed
-            if queue_name == retry_queue and task_data.get("retry_type") == "analyze":
-                task_data = {"task_id": task_data["task_id"]}
+                # if from retry queue and retry_type is analyze, only task_id is needed
+                if queue_name == retry_queue and task_data.get("retry_type") == "analyze":
+                    task_data = {"task_id": task_data["task_id"]}
 
-            # process analyze task
-            await process_analyze_task(task_data)
-        except Exception as e:
-            print(f"analyze Worker error: {e}")
-        time.sleep(0.1)
+                # process analyze task
+                await process_analyze_task(task_data)
+            except Exception as e:
+                print(f"analyze Worker error: {e}")
+            time.sleep(0.1)
+    finally:
+        await llm_client.aclose()
 
 if __name__ == "__main__":
     # start multiple analyze workers
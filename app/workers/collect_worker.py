@@ -7,7 +7,7 @@ sys.path.insert(0, PROJECT_ROOT)
 
 from app.core.config import settings
 from app.core.database import redis_client, get_task_lock, get_mysql_conn
-from app.core.utils import call_api_with_retry, update_task_status, update_collect_progress
+from app.core.utils import call_api_with_retry, update_task_status
 from app.models.user import get_user
 from app.models.task_payload import update_or_create_task_payload
 from datetime import datetime
@@ -18,6 +18,9 @@ from app.core.archive_client import ArchiveClient
 import asyncio
 from collections import Counter, defaultdict
 from app.core import accessories
+from app.core.sampler import SampleSelector
+from app.core.analysis_checkpoint import clear_checkpoint
+from app.core.progress import start_collect_progress, report_collect_progress
 import logging
 logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 logger = logging.getLogger("collect_worker")
@@ -44,66 +47,90 @@ def _to_dt(val: Optional[str]) -> Optional[datetime]:
     except Exception:
         return None
 
-def summarize_rows(rows: List[Dict[str, Any]], time_zone: Optional[str]) -> Dict[str, Any]:
-    tz = _safe_zone(time_zone)
-    total_videos = len(rows)
-    total_hours = 0.0
-    night_seconds = 0.0
-    hour_buckets: Dict[int, float] = defaultdict(float)
-    music_counter: Counter = Counter()
-    creator_counter: Counter = Counter()
-    sample_texts: List[str] = []
-    source_spans: List[Dict[str, Any]] = []
+class WatchSummary:
+    """Incremental version of summarize_rows, fed while months are being collected."""
+
+    def __init__(self, time_zone: Optional[str], months: int = 12) -> None:
+        self.tz = _safe_zone(time_zone)
+        self.total_videos = 0
+        self.total_hours = 0.0
+        self.night_seconds = 0.0
+        self.hour_buckets: Dict[int, float] = defaultdict(float)
+        self.music_counter: Counter = Counter()
+        self.creator_counter: Counter = Counter()
+        self.hashtag_counter: Counter = Counter()
+        self.sampler = SampleSelector(months=months)
+        self.source_spans: List[Dict[str, Any]] = []
 
-    for row in rows:
+    def add(self, row: Dict[str, Any]) -> None:
+        self.total_videos += 1
         dur_ms = row.get("duration_ms") or 0
         approx_times = row.get("approx_times_watched") or 1
         watched_at_dt = _to_dt(row.get("watched_at"))
         seconds = (dur_ms / 1000.0) * approx_times
-        total_hours += seconds / 3600.0
+        self.total_hours += seconds / 3600.0
+        local = None
         if watched_at_dt:
-            local = watched_at_dt.astimezone(tz)
-            hour_buckets[local.hour] += seconds
+            local = watched_at_dt.astimezone(self.tz)
+            self.hour_buckets[local.hour] += seconds
             if local.hour >= 22 or local.hour < 4:
-                night_seconds += seconds
+                self.night_seconds += seconds
         music = row.get("music") or row.get("sound_title") or ""
         if music:
             music_title = music.get('title')
-            music_counter[music_title] += 1
+            self.music_counter[music_title] += 1
         author = row.get("author") or row.get("author_id") or ""
         if author:
-            creator_counter[author] += 1
+            self.creator_counter[author] += 1
+        for tag in row.get("hashtags") or []:
+            if tag:
+                self.hashtag_counter[tag] += 1
         txt_parts = [
             str(row.get("title") or ""),
             str(row.get("description") or ""),
             " ".join(row.get("hashtags") or []),
-            str(music.get("title")),
+            str(music.get("title")) if music else "",
             str(author),
         ]
         sample = " ".join([p for p in txt_parts if p]).strip()
         if sample:
-            sample_texts.append(sample[:300])
-        source_spans.append({"video_id": row.get("video_id"), "reason": "aggregate"})
+            self.sampler.add(sample[:300], local, author)
+        if len(self.source_spans) < 200:
+            self.source_spans.append({"video_id": row.get("video_id"), "reason": "aggregate"})
+
+    def add_rows(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            self.add(row)
+
+    def result(self) -> Dict[str, Any]:
+        total_hours = self.total_hours
+        night_pct = (self.night_seconds / (total_hours * 3600) * 100) if total_hours > 0 else 0.0
+        peak_hour = max(self.hour_buckets.items(), key=lambda x: x[1])[0] if self.hour_buckets else None
+        top_music = {}
+        if self.music_counter:
+            music, count = self.music_counter.most_common(1)[0]
+            top_music = {"name": music, "count": count}
+        top_creators = [c for c, _ in self.creator_counter.most_common(5)]
+        top_hashtags = [h for h, _ in self.hashtag_counter.most_common(10)]
+
+        return {
+            "total_videos": self.total_videos,
+            "total_hours": total_hours,
+            "night_pct": night_pct,
+            "peak_hour": peak_hour,
+            "top_music": top_music,
+            "top_creators": top_creators,
+            "top_hashtags": top_hashtags,
+            "sample_texts": self.sampler.select(),
+            "source_spans": self.source_spans,
+        }
 
-    night_pct = (night_seconds / (total_hours * 3600) * 100) if total_hours > 0 else 0.0
-    peak_hour = max(hour_buckets.items(), key=lambda x: x[1])[0] if hour_buckets else None
-    top_music = {}
-    if music_counter:
-        music, count = music_counter.most_common(1)[0]
-        top_music = {"name": music, "count": count}
-    top_creators = [c for c, _ in creator_counter.most_common(5)]
 
-    return {
-        "total_videos": total_videos,
-        "total_hours": total_hours,
-        "night_pct": night_pct,
-        "peak_hour": peak_hour,
-        "top_music": top_music,
-        "top_creators": top_creators,
-        "sample_texts": sample_texts[:50],
-        "source_spans": source_spans[:200],
-    }
-async def _fetch_month(sec_user_id: str, month_start_ms: int, month_end_ms: int) -> List[Dict[str, Any]]:
+def summarize_rows(rows: List[Dict[str, Any]], time_zone: Optional[str]) -> Dict[str, Any]:
+    summary = WatchSummary(time_zone)
+    summary.add_rows(rows)
+    return summary.result()
+async def _fetch_month(sec_user_id: str, month_start_ms: int, month_end_ms: int, task_id: str, user_id: str) -> List[Dict[str, Any]]:
         cursor = str(month_start_ms)
         rows: List[Dict[str, Any]] = []
         start_resp, status_code = await archive_client.start_watch_history(
@@ -140,6 +167,8 @@ async def _fetch_month(sec_user_id: str, month_start_ms: int, month_end_ms: int)
             batch = resp.get("rows") or []
             if not batch:
                 break
+            page_start = len(rows)
+            reached_start = False
             for item in batch:
                 watched_at = _to_dt(item.get("watched_at"))
                 if watched_at:
@@ -148,14 +177,26 @@ async def _fetch_month(sec_user_id: str, month_start_ms: int, month_end_ms: int)
                         print("ts_ms > month_end_ms", ts_ms, month_end_ms)
                         continue
                     if ts_ms < month_start_ms:
-                        return rows
+                        reached_start = True
+                        break
                 rows.append(item)
+            report_collect_progress(task_id, user_id, rows=len(rows) - page_start, pages=1)
+            if reached_start:
+                return rows
             before = resp.get("next_before")
             if not before:
                 break
         return rows
 
 
+# folds the month into summary as soon as it arrives, so its raw rows are dropped before other months finish
+async def _collect_month(summary: WatchSummary, sec_user_id: str, month_start_ms: int, month_end_ms: int, task_id: str, user_id: str) -> int:
+    rows = await _fetch_month(sec_user_id, month_start_ms, month_end_ms, task_id, user_id)
+    summary.add_rows(rows)
+    report_collect_progress(task_id, user_id, units=1)
+    return len(rows)
+
+
 async def collect_worker():
     print("collect Worker started")
     collect_queue = settings.TASK_QUEUE_COLLECT
@@ -202,8 +243,11 @@ async def collect_worker():
                     logging.warning(f"collection task:{task_id} status is {task_status}, stop collection")
                     continue
 
-                rows: List[Dict[str, Any]] = []
+                # rows are folded into the summary as each month arrives
                 month_starts = [(2025, m, 1) for m in range(1, 13)]
+                summary = WatchSummary(user.get("time_zone"), months=len(month_starts))
+                # one unit per month plus one for the persisted payload
+                start_collect_progress(task_id, len(month_starts) + 1)
                 idx = 0
                 while idx < len(month_starts):
                     batch = month_starts[idx : idx + 10]  # cap to Archive per-account queue limit
@@ -213,18 +257,18 @@ async def collect_worker():
                         end_dt = datetime(year + (1 if month == 12 else 0), 1 if month == 12 else month + 1, 1)
                         start_ms = int(start_dt.timestamp() * 1000)
                         end_ms = int(end_dt.timestamp() * 1000)
-                        coros.append(_fetch_month(latest_sec_user_id, start_ms, end_ms))
+                        coros.append(_collect_month(summary, latest_sec_user_id, start_ms, end_ms, task_id, user_id))
                     # launch bounded concurrent fetches within the batch
-                    batch_rows = await asyncio.gather(*coros)
-                    for r in batch_rows:
-                        rows.extend(r)
+                    await asyncio.gather(*coros)
                     idx += len(batch)
                     await asyncio.sleep(1)  # 1 start/sec pacing between batches
 
-                if not rows:
+                if not summary.total_videos:
+                    # nothing to analyze; end the task instead of leaving it at "collecting"
                     logging.warning(f"collection task:{task_id} not rows, skip")
+                    update_task_status(task_id, "failed", flush=True, collect_status="failed", error_msg="collection returned no watch history")
                     continue
-                summary = summarize_rows(rows, user.get("time_zone"))
+                summary = summary.result()
                 payload = {
                     "total_hours": summary["total_hours"],
                     "total_videos": summary["total_videos"],
@@ -232,6 +276,7 @@ async def collect_worker():
                     "peak_hour": summary["peak_hour"],
                     "top_music": summary["top_music"],
                     "top_creators": summary["top_creators"],
+                    "top_hashtags": summary["top_hashtags"],
                     "platform_username": user.get("platform_username"),
                     "email": user.get("email"),
                     "source_spans": summary["source_spans"],
@@ -239,12 +284,11 @@ async def collect_worker():
                     "_sample_texts": summary["sample_texts"],
                   #  "accessory_set": accessories.select_accessory_set(),
                 }
-                redis_client.lpush(settings.TASK_QUEUE_ANALYZE, json.dumps({
-                    "task_id": task_id, "user_id": user_id
-                }))
-                
-                update_task_status(task_id, "analyzing", collect_status="completed")
-                update_or_create_task_payload(task_id, json.dumps(payload), user_id)
+                update_or_create_task_payload(task_id, payload, user_id)
+                # fields parsed from a previous collection's samples must not be resumed
+                clear_checkpoint(task_id)
+                # the last unit marks the collection completed and enqueues analysis exactly once
+                report_collect_progress(task_id, user_id, units=1)
             except Exception as e:
                 update_task_status(task_id, "failed", collect_status="failed", error_msg=f"collection exception: {e}")
                 logging.error(f"collection task {task_id} error", e)
@@ -0,0 +1,24 @@
+import asyncio
+import os
+import sys
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+from app.core.config import settings
+from app.core.log_retention import drop_expired_log_partitions, ensure_log_partitions
+
+RETENTION_INTERVAL = 3600
+
+
+async def log_retention_worker() -> None:
+    while True:
+        try:
+            created = ensure_log_partitions(settings.API_LOG_PARTITION_DAYS_AHEAD)
+            dropped = drop_expired_log_partitions(settings.API_LOG_RETENTION_DAYS)
+            if created or dropped:
+                print(f"api_call_logs partitions created: {created}, dropped: {dropped}")
+        except Exception as e:
+            print(f"api log retention run failed: {e}")
+        await asyncio.sleep(RETENTION_INTERVAL)
+
+if __name__ == "__main__":
+    asyncio.run(log_retention_worker())
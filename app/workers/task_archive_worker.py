@@ -0,0 +1,21 @@
+import asyncio
+import os
+import sys
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+from app.core.config import settings
+from app.core.task_archiver import archive_finished_tasks
+
+
+async def task_archive_worker() -> None:
+    while True:
+        try:
+            moved = archive_finished_tasks()
+            if moved:
+                print(f"archived {moved} finished tasks")
+        except Exception as e:
+            print(f"task archive run failed: {e}")
+        await asyncio.sleep(settings.TASK_ARCHIVE_INTERVAL)
+
+if __name__ == "__main__":
+    asyncio.run(task_archive_worker())
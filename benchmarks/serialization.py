@@ -0,0 +1,116 @@
+"""Serialization cost of large responses, before and after orjson rendering.
+
+Usage: python benchmarks/serialization.py [--rounds N]
+
+"stdlib" is the previous path: FastAPI's jsonable_encoder followed by the
+stdlib JSONResponse. "orjson" is FastJSONResponse on the same content, as
+json_response and the default response class render it. Sizes are shown
+raw and after the compression the middleware would apply.
+"""
+import argparse
+import os
+import sys
+import timeit
+import zlib
+from datetime import datetime, timedelta
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core import compression
+from app.core.config import settings
+from app.core.responses import FastJSONResponse, orjson
+from app.core.schema import WrappedPayload, WrappedStatusResponse
+
+
+def wrapped_document() -> WrappedStatusResponse:
+    wrapped = WrappedPayload(
+        total_hours=412.6,
+        total_videos=18342,
+        night_pct=37.4,
+        peak_hour=23,
+        top_music={"name": "original sound - creator", "count": 214},
+        top_creators=[f"creator_{i}" for i in range(5)],
+        personality_type="night_shift_scroller",
+        personality_explanation="37% of your watch time landed between 10pm and 4am.",
+        niche_journey=["cooking", "gym", "cats", "finance", "travel"],
+        top_niches=["cooking", "gym"],
+        top_niche_percentile="top 1%",
+        brain_rot_score=72,
+        brain_rot_explanation="Scored 72 from 413 hours watched, mostly at night.",
+        keyword_2026="locked in",
+        thumb_roast="Your thumb has run a marathon.",
+        platform_username="someone",
+        email="someone@example.com",
+        source_spans=[{"video_id": str(7300000000000000000 + i), "reason": "aggregate"} for i in range(200)],
+        data_jobs={"watch_history": {"id": "task-1", "status": "succeeded"}},
+        accessory_set={
+            slot: {"item_id": f"{slot}-1", "display_name": slot.title(), "set_series": "vlog", "quality": "Rare", "reason": "Matched"}
+            for slot in ("head", "body", "other")
+        },
+    )
+    return WrappedStatusResponse(status="ready", wrapped_run_id="task-1", wrapped=wrapped)
+
+
+def log_page(rows: int) -> dict:
+    start = datetime(2025, 11, 1, 12, 0, 0)
+    logs = [
+        {
+            "log_id": 100000 - i,
+            "task_id": "task-1",
+            "api_type": "collect_month",
+            "status": "success",
+            "call_time": start - timedelta(seconds=i),
+            "duration_ms": 130 + i % 50,
+            "request_body": '{"sec_user_id": "MS4wLjABAAAA", "start": 1730419200000, "cursor": %d}' % i,
+            "response_body": '{"code": 0, "has_more": true, "items": [' + ",".join(['{"id": %d}' % j for j in range(20)]) + "]}",
+        }
+        for i in range(rows)
+    ]
+    return {"code": 200, "msg": "success", "data": logs, "next_before_id": logs[-1]["log_id"]}
+
+
+def stdlib_render(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def orjson_render(content) -> bytes:
+    return FastJSONResponse(content).body
+
+
+def _per_call_ms(fn, content, rounds: int) -> float:
+    return min(timeit.repeat(lambda: fn(content), number=rounds, repeat=5)) / rounds * 1000
+
+
+def _compressed_sizes(body: bytes) -> str:
+    sizes = [f"gzip {len(zlib.compress(body, settings.RESPONSE_GZIP_LEVEL))}"]
+    if compression.brotli is not None:
+        sizes.append(f"br {len(compression.brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY))}")
+    return ", ".join(sizes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    cases = [
+        ("wrapped document", wrapped_document(), args.rounds),
+        ("log page, 100 rows", log_page(100), args.rounds),
+        ("log export, 1000 rows", log_page(1000), max(args.rounds // 10, 1)),
+    ]
+    for name, content, rounds in cases:
+        body = stdlib_render(content)
+        line = f"{name:24} {len(body):>8} bytes ({_compressed_sizes(body)})  stdlib {_per_call_ms(stdlib_render, content, rounds):8.3f} ms"
+        if orjson is None:
+            print(line + "  orjson not installed")
+            continue
+        assert orjson.loads(orjson_render(content)) == orjson.loads(body), name
+        print(line + f"  orjson {_per_call_ms(orjson_render, content, rounds):8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
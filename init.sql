@@ -19,7 +19,7 @@ CREATE TABLE `users` (
   `email` varchar(128) DEFAULT NULL,
   `verfied_at` datetime DEFAULT NULL,
   PRIMARY KEY (`id`),
-  KEY `idx_user_id` (`app_user_id`)
+  UNIQUE KEY `uk_app_user_id` (`app_user_id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=2 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
 
 -- tasks 
@@ -43,11 +43,43 @@ CREATE TABLE `tasks` (
   `device_id` varchar(64) DEFAULT NULL,
   `email_status` varchar(64) DEFAULT NULL,
   PRIMARY KEY (`id`),
-  KEY `idx_task_status` (`status`),
-  KEY `idx_user_id` (`app_user_id`),
-  KEY `idx_task_id` (`task_id`)
+  UNIQUE KEY `uk_task_id` (`task_id`),
+  KEY `idx_status_update_time` (`status`, `update_time`),
+  KEY `idx_user_create_time` (`app_user_id`, `create_time`)
 ) ENGINE=InnoDB AUTO_INCREMENT=10 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
 
+-- archived terminal tasks, filled by task_archive_worker
+CREATE TABLE IF NOT EXISTS `tasks_archive` (
+  `id` bigint NOT NULL,
+  `task_id` varchar(64) DEFAULT NULL COMMENT 'task ID',
+  `app_user_id` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci DEFAULT NULL COMMENT 'user ID',
+  `status` enum('pending','verifying','collecting','analyzing','completed','failed','paused','cancelled','rejected','finalized','email_send') DEFAULT 'pending',
+  `region_verify_status` enum('success','failed','timeout','retrying','verifying') DEFAULT NULL,
+  `region_verify_result` json DEFAULT NULL,
+  `region_retry_count` tinyint DEFAULT '0',
+  `collect_total` int DEFAULT '0',
+  `collect_completed` int DEFAULT '0',
+  `collect_page` int DEFAULT '0',
+  `collect_status` enum('not_started','collecting','completed','failed') DEFAULT 'not_started',
+  `analysis_status` enum('success','failed','timeout','not_executed') DEFAULT 'not_executed',
+  `analysis_result` json DEFAULT NULL,
+  `error_msg` text,
+  `create_time` datetime NOT NULL,
+  `update_time` datetime DEFAULT NULL,
+  `device_id` varchar(64) DEFAULT NULL,
+  `email_status` varchar(64) DEFAULT NULL,
+  `archived_at` datetime DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`, `create_time`),
+  KEY `idx_task_id` (`task_id`),
+  KEY `idx_user_create_time` (`app_user_id`, `create_time`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8
+PARTITION BY RANGE (YEAR(`create_time`)) (
+  PARTITION p2025 VALUES LESS THAN (2026),
+  PARTITION p2026 VALUES LESS THAN (2027),
+  PARTITION p2027 VALUES LESS THAN (2028),
+  PARTITION p_future VALUES LESS THAN MAXVALUE
+);
+
 -- API request logs
 CREATE TABLE `api_call_logs` (
   `log_id` bigint NOT NULL AUTO_INCREMENT,
@@ -62,11 +94,29 @@ CREATE TABLE `api_call_logs` (
   `status` enum('success','timeout','failed') NOT NULL COMMENT 'call status',
   `error_detail` text COMMENT 'error detail',
   `retry_count` tinyint DEFAULT '0' COMMENT 'number of retries',
-  `call_time` datetime DEFAULT CURRENT_TIMESTAMP,
-  PRIMARY KEY (`log_id`),
-  KEY `idx_task_id` (`task_id`),
+  `call_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`log_id`, `call_time`),
+  KEY `idx_task_log_id` (`task_id`, `log_id`),
   KEY `idx_api_type` (`api_type`)
-) ENGINE=InnoDB AUTO_INCREMENT=27 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
+-- daily partitions pYYYYMMDD are split off p_future and dropped by log_retention_worker
+PARTITION BY RANGE (TO_DAYS(`call_time`)) (
+  PARTITION p_future VALUES LESS THAN MAXVALUE
+);
+
+-- collected payload per task, blobs encoded by app/core/payload_codec.py
+CREATE TABLE `task_payload` (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `task_id` varchar(64) NOT NULL COMMENT 'task ID',
+  `app_user_id` varchar(64) DEFAULT NULL COMMENT 'user ID',
+  `payload` json DEFAULT NULL COMMENT 'legacy JSON payload, only read',
+  `payload_blob` mediumblob COMMENT 'format byte + compressed payload without _sample_texts',
+  `samples_blob` mediumblob COMMENT 'format byte + compressed _sample_texts',
+  `create_time` datetime DEFAULT CURRENT_TIMESTAMP,
+  `update_time` datetime DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_task_id` (`task_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
 -- browse records table
 CREATE TABLE IF NOT EXISTS browse_records (
@@ -105,7 +155,10 @@ CREATE TABLE `app_sessions` (
   `expires_at` datetime DEFAULT NULL,
   `revoked_at` datetime DEFAULT NULL,
   `session_id` varchar(64) DEFAULT NULL,
-  PRIMARY KEY (`id`)
+  PRIMARY KEY (`id`),
+  KEY `idx_token_device` (`token_hash`, `device_id`),
+  KEY `idx_user_device` (`app_user_id`, `device_id`),
+  KEY `idx_session_id` (`session_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
 
 -- Insert default retry strategies
@@ -113,4 +166,23 @@ INSERT IGNORE INTO retry_strategies (strategy_id, api_type, max_retry_count, ini
 VALUES 
 ('strategy_region', 'region_verify', 5, 1.0, 10.0, 2.0),
 ('strategy_collect', 'browse_collect', 3, 1.0, 5.0, 2.0),
-('strategy_analysis', 'browse_analysis', 3, 1.0, 5.0, 2.0);
\ No newline at end of file
+('strategy_analysis', 'browse_analysis', 3, 1.0, 5.0, 2.0);
+
+-- schema migrations, see app/core/migrate.py; a fresh install already includes these
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT NOT NULL PRIMARY KEY,
+    name VARCHAR(128) NOT NULL,
+    checksum CHAR(64) NOT NULL,
+    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO schema_version (version, name, checksum)
+VALUES
+(1, 'api_call_logs_partitioning', 'a0abf423f976659f9754d1290cffe5100e65074a2c71a54eb91904fe23826572'),
+(2, 'tasks_indexes', '1ecb3278aa381c4fa6e7c8690fd7f740537744bcfac54864615a45f6784b036d'),
+(3, 'app_sessions_indexes', '82a7f9e72c0420f67c6b7c43dcd1e7c9ad2411c41a6fbfa3370ae2d4f95db622'),
+(4, 'users_unique_app_user_id', '028fbf91637187d23b690bebb7a098a097a2e680724a1c621db876e2caa6b2a8'),
+(5, 'api_call_logs_task_time_index', '7795a271b8ecfde74353df271e68c9c54bfe396826a2c207158b320e4c171e02'),
+(6, 'tasks_archive', '8fc9979a71c61ade03acbadf772bd65ded13411173b91e150e3cb1f84e8ee169'),
+(7, 'task_payload_blobs', '04f5d88f12d2f443f9fc68c49f3e99ec3d20226f02caed2cddc0f0814fcba8b9'),
+(8, 'api_call_logs_task_log_index', '66817709969ef12bffb2df9b87e722b2fc81883015a42b375e2527137c169429');
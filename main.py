@@ -1,18 +1,52 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from app.api import auth, task,link
 from app.core.config import settings
+from app.core.database import close_async_mysql_pool, pool_stats
+from app.core.state_writer import state_writer
+from app.core.log_sink import api_log_sink
+from app.core.user_cache import request_scope, user_cache
+from app.core.task_events import task_event_hub
+from app.core.responses import JSON_RESPONSE_CLASS
+from app.core.compression import CompressionMiddleware
 
-app = FastAPI(title="Task Scheduler API", version="1.0")
+app = FastAPI(title="Task Scheduler API", version="1.0", default_response_class=JSON_RESPONSE_CLASS)
 
 app.include_router(auth.router, prefix="/auth", tags=["authentication"])
 app.include_router(task.router, prefix="/api/task", tags=["task management"])
 app.include_router(link.router, prefix="/link/tiktok", tags=["link tiktok"])
 
+# users rows are memoized for the duration of one request
+@app.middleware("http")
+async def user_cache_scope(request: Request, call_next):
+    with request_scope():
+        return await call_next(request)
+
+# added last so it wraps everything, including the middleware above
+if settings.RESPONSE_COMPRESSION:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.RESPONSE_COMPRESSION_MIN_SIZE,
+        gzip_level=settings.RESPONSE_GZIP_LEVEL,
+        brotli_quality=settings.RESPONSE_BROTLI_QUALITY,
+    )
+
+@app.on_event("shutdown")
+async def shutdown():
+    state_writer.flush()
+    api_log_sink.flush()
+    await close_async_mysql_pool()
+    await task_event_hub.close()
+
 @app.get("/")
 async def root():
     return {"msg": "Task Scheduler API is running"}
 
+# connection pool usage and user cache hit/miss counters of the serving process
+@app.get("/metrics/pools")
+async def pools():
+    return {**pool_stats(), "user_cache": user_cache.stats()}
+
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,22 @@
+-- Partition api_call_logs by day so log_retention_worker can drop old days.
+-- Partitioning rebuilds the table (ALGORITHM=COPY); run it in a quiet window or
+-- through pt-online-schema-change on large tables.
+
+-- migrate:up
+ALTER TABLE api_call_logs
+  MODIFY `call_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (`log_id`, `call_time`);
+
+ALTER TABLE api_call_logs
+  PARTITION BY RANGE (TO_DAYS(`call_time`)) (
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+  );
+
+-- migrate:down
+ALTER TABLE api_call_logs REMOVE PARTITIONING;
+
+ALTER TABLE api_call_logs
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (`log_id`),
+  MODIFY `call_time` datetime DEFAULT CURRENT_TIMESTAMP;
@@ -0,0 +1,26 @@
+-- tasks: every lookup is by task_id, get_task_by_user_id filters app_user_id and sorts by create_time.
+-- Duplicate task_ids keep their lowest id, the row reads have been returning all along.
+
+-- migrate:up
+DELETE t FROM tasks t JOIN tasks keep ON keep.task_id = t.task_id AND keep.id < t.id;
+
+ALTER TABLE tasks
+  ADD UNIQUE KEY `uk_task_id` (`task_id`),
+  ADD KEY `idx_user_create_time` (`app_user_id`, `create_time`),
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE tasks
+  DROP KEY `idx_task_id`,
+  DROP KEY `idx_user_id`,
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+-- migrate:down
+ALTER TABLE tasks
+  ADD KEY `idx_task_id` (`task_id`),
+  ADD KEY `idx_user_id` (`app_user_id`),
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE tasks
+  DROP KEY `uk_task_id`,
+  DROP KEY `idx_user_create_time`,
+  ALGORITHM=INPLACE, LOCK=NONE;
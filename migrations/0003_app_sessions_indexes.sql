@@ -0,0 +1,16 @@
+-- app_sessions: validate() looks up (token_hash, device_id), create_or_rotate() looks up
+-- (app_user_id, device_id) and both update by session_id.
+
+-- migrate:up
+ALTER TABLE app_sessions
+  ADD KEY `idx_token_device` (`token_hash`, `device_id`),
+  ADD KEY `idx_user_device` (`app_user_id`, `device_id`),
+  ADD KEY `idx_session_id` (`session_id`),
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+-- migrate:down
+ALTER TABLE app_sessions
+  DROP KEY `idx_token_device`,
+  DROP KEY `idx_user_device`,
+  DROP KEY `idx_session_id`,
+  ALGORITHM=INPLACE, LOCK=NONE;
@@ -0,0 +1,21 @@
+-- users: one row per app_user_id. Duplicates keep their lowest id, the row get_user has been returning.
+
+-- migrate:up
+DELETE u FROM users u JOIN users keep ON keep.app_user_id = u.app_user_id AND keep.id < u.id;
+
+ALTER TABLE users
+  ADD UNIQUE KEY `uk_app_user_id` (`app_user_id`),
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE users
+  DROP KEY `idx_user_id`,
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+-- migrate:down
+ALTER TABLE users
+  ADD KEY `idx_user_id` (`app_user_id`),
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE users
+  DROP KEY `uk_app_user_id`,
+  ALGORITHM=INPLACE, LOCK=NONE;
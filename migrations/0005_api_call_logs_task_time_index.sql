@@ -0,0 +1,19 @@
+-- api_call_logs: get_task_api_logs filters task_id and sorts by call_time DESC.
+
+-- migrate:up
+ALTER TABLE api_call_logs
+  ADD KEY `idx_task_call_time` (`task_id`, `call_time`),
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE api_call_logs
+  DROP KEY `idx_task_id`,
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+-- migrate:down
+ALTER TABLE api_call_logs
+  ADD KEY `idx_task_id` (`task_id`),
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE api_call_logs
+  DROP KEY `idx_task_call_time`,
+  ALGORITHM=INPLACE, LOCK=NONE;
@@ -0,0 +1,54 @@
+-- tasks_archive: terminal tasks moved out of the hot tasks table by task_archive_worker.
+-- Compressed rows, yearly partitions on create_time; lookups mirror the tasks indexes.
+-- tasks gets (status, update_time) for the archiver's scan, replacing idx_task_status.
+
+-- migrate:up
+CREATE TABLE IF NOT EXISTS `tasks_archive` (
+  `id` bigint NOT NULL,
+  `task_id` varchar(64) DEFAULT NULL COMMENT 'task ID',
+  `app_user_id` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci DEFAULT NULL COMMENT 'user ID',
+  `status` enum('pending','verifying','collecting','analyzing','completed','failed','paused','cancelled','rejected','finalized','email_send') DEFAULT 'pending',
+  `region_verify_status` enum('success','failed','timeout','retrying','verifying') DEFAULT NULL,
+  `region_verify_result` json DEFAULT NULL,
+  `region_retry_count` tinyint DEFAULT '0',
+  `collect_total` int DEFAULT '0',
+  `collect_completed` int DEFAULT '0',
+  `collect_page` int DEFAULT '0',
+  `collect_status` enum('not_started','collecting','completed','failed') DEFAULT 'not_started',
+  `analysis_status` enum('success','failed','timeout','not_executed') DEFAULT 'not_executed',
+  `analysis_result` json DEFAULT NULL,
+  `error_msg` text,
+  `create_time` datetime NOT NULL,
+  `update_time` datetime DEFAULT NULL,
+  `device_id` varchar(64) DEFAULT NULL,
+  `email_status` varchar(64) DEFAULT NULL,
+  `archived_at` datetime DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`, `create_time`),
+  KEY `idx_task_id` (`task_id`),
+  KEY `idx_user_create_time` (`app_user_id`, `create_time`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8
+PARTITION BY RANGE (YEAR(`create_time`)) (
+  PARTITION p2025 VALUES LESS THAN (2026),
+  PARTITION p2026 VALUES LESS THAN (2027),
+  PARTITION p2027 VALUES LESS THAN (2028),
+  PARTITION p_future VALUES LESS THAN MAXVALUE
+);
+
+ALTER TABLE tasks
+  ADD KEY `idx_status_update_time` (`status`, `update_time`),
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE tasks
+  DROP KEY `idx_task_status`,
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+-- migrate:down
+ALTER TABLE tasks
+  ADD KEY `idx_task_status` (`status`),
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE tasks
+  DROP KEY `idx_status_update_time`,
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+DROP TABLE IF EXISTS `tasks_archive`;
@@ -0,0 +1,30 @@
+-- task_payload: payloads are stored as compressed blobs (see app/core/payload_codec.py),
+-- with _sample_texts in their own column so it can be loaded without the rest.
+-- task_id becomes unique for the single-statement upsert. The table is rebuilt
+-- and swapped in; legacy JSON rows are copied as-is and still decoded on read.
+-- Run it in a quiet window: payloads written between the copy and the rename are lost.
+-- task_payload_legacy is kept for migrate:down and can be dropped once settled.
+
+-- migrate:up
+CREATE TABLE `task_payload_new` (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `task_id` varchar(64) NOT NULL COMMENT 'task ID',
+  `app_user_id` varchar(64) DEFAULT NULL COMMENT 'user ID',
+  `payload` json DEFAULT NULL COMMENT 'legacy JSON payload, only read',
+  `payload_blob` mediumblob COMMENT 'format byte + compressed payload without _sample_texts',
+  `samples_blob` mediumblob COMMENT 'format byte + compressed _sample_texts',
+  `create_time` datetime DEFAULT CURRENT_TIMESTAMP,
+  `update_time` datetime DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_task_id` (`task_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+INSERT IGNORE INTO task_payload_new (task_id, app_user_id, payload)
+SELECT task_id, app_user_id, payload FROM task_payload WHERE task_id IS NOT NULL;
+
+RENAME TABLE task_payload TO task_payload_legacy, task_payload_new TO task_payload;
+
+-- migrate:down
+DROP TABLE IF EXISTS task_payload;
+
+RENAME TABLE task_payload_legacy TO task_payload;
@@ -0,0 +1,20 @@
+-- api_call_logs: task logs are paged by log_id (keyset), so the task index
+-- follows log_id instead of call_time.
+
+-- migrate:up
+ALTER TABLE api_call_logs
+  ADD KEY `idx_task_log_id` (`task_id`, `log_id`),
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE api_call_logs
+  DROP KEY `idx_task_call_time`,
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+-- migrate:down
+ALTER TABLE api_call_logs
+  ADD KEY `idx_task_call_time` (`task_id`, `call_time`),
+  ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE api_call_logs
+  DROP KEY `idx_task_log_id`,
+  ALGORITHM=INPLACE, LOCK=NONE;
@@ -11,16 +11,19 @@ def main():
     print("=== Worker start ===")
     base_path = BASE_DIR
     worker_paths = [
-        ("region-Worker", os.path.join(base_path, "app/workers/verify_worker.py")),
-        ("collection-Worker", os.path.join(base_path, "app/workers/collect_worker.py")),
-        ("analyze-Worker", os.path.join(base_path, "app/workers/analyze_worker.py")),
-        ("email-send-Worker", os.path.join(base_path, "app/workers/email_worker.py"))
+        ("region-Worker", "verify", os.path.join(base_path, "app/workers/verify_worker.py")),
+        ("collection-Worker", "collect", os.path.join(base_path, "app/workers/collect_worker.py")),
+        ("analyze-Worker", "analyze", os.path.join(base_path, "app/workers/analyze_worker.py")),
+        ("email-send-Worker", "email", os.path.join(base_path, "app/workers/email_worker.py")),
+        ("log-retention-Worker", "log_retention", os.path.join(base_path, "app/workers/log_retention_worker.py")),
+        ("task-archive-Worker", "archive", os.path.join(base_path, "app/workers/task_archive_worker.py"))
      ]
 
     processes = []
-    for name, path in worker_paths:
+    for name, role, path in worker_paths:
         try:
-            p = subprocess.Popen([sys.executable, path])
+            # PROCESS_ROLE picks the connection pool sizes for the worker
+            p = subprocess.Popen([sys.executable, path], env={**os.environ, "PROCESS_ROLE": role})
             processes.append((name, p))
             print(f"✅ {name} start success (PID: {p.pid})")
             time.sleep(1)